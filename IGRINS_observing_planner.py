@@ -1,18 +1,18 @@
 import tkinter as tk
 from tkinter import ttk
-from tkinter.filedialog import asksaveasfile, askopenfilename, askdirectory
+from tkinter.filedialog import asksaveasfile, asksaveasfilename, askopenfilename, askdirectory
 import warnings
 import json
+import os
 import numpy as np
-from astroquery.simbad import Simbad
 import ds9_lib
+import planner_lib #Planning core that works on plain values, the GUI below just reads and writes tk variables around it
+import reactive
+import task_runner
+import project_file
+import target_model
 from coordfuncs import *
 
-#Add thing to grab from simbad
-Simbad.add_votable_fields('pmra', 'pmdec')
-
-rotator_zero_point = 193.0       #Instrument rotator zero point (Default East-West setting has PA = 90 deg.)
-
 #Set up window for GUI
 window = tk.Tk()
 window.title("IGRINS Observing Planner")
@@ -23,40 +23,20 @@ gs_index = 0 #Index of the current selected guide star
 gs_index_tk = tk.StringVar(value='1')
 n_guide_stars = tk.StringVar(value='20')
 
-#Open ds9
-ds9_lib.ds9.open()
-
-def update_gs_index(a=0, b=0, c=0): #Update gs_index when user sets the guide star index to a different number in the menu
+def update_gs_index(a=0, b=0, c=0): #Show the guide star the user picked in the menu, keeping what was typed in for the one shown before
 	global gs_index
-	print('it is working')
-	print(int(gs_index_tk.get()) - 1 )
-	gs_index = int(gs_index_tk.get()) - 1 
-	print(gs_index)
-
-	# Update dG widgets
-	dg_sl_entry.config(textvariable=guidestars[gs_index].dG[0])
-	dg_sw_entry.config(textvariable=guidestars[gs_index].dG[1])
-	# Update survey menu
-	guide_star_survey_menu.config(textvariable=guidestars[gs_index].survey)
-	# Update proper motion widgets
-	guide_starpm_checkbox.config(variable=guidestars[gs_index].use_proper_motion)
-	# Update dra and ddec (RA/Dec offsets) widgets
-	guide_star_dra_entry.config(textvariable=guidestars[gs_index].dra)
-	guide_star_ddec_entry.config(textvariable=guidestars[gs_index].ddec)
-	# Update RA and Dec entries
-	guide_star_ra_entry.config(textvariable=guidestars[gs_index].ra)
-	guide_star_dec_entry.config(textvariable=guidestars[gs_index].dec)
-	# Update name field
-	guide_star_simbad_name_entry.config(textvariable=guidestars[gs_index].name)
-	guide_star_simbad_button.config(command=guidestars[gs_index].simbad_lookup)
-
-	window.update_idletasks()
-	frame.update_idletasks()
-
-
-
-
-#Class holds all info needed to observe a target
+	new_gs_index = int(gs_index_tk.get()) - 1
+	if new_gs_index == gs_index:
+		return
+	guidestars[gs_index] = shown_guidestar.store()
+	gs_index = new_gs_index
+	shown_guidestar.load(guidestars[gs_index])
+
+
+
+
+#Class holds all info needed to observe a target, as tkinter variables for the widgets
+#Only the target and the guide star shown have one, the guide stars are kept as target_model.TargetData
 class Target:
 	def __init__(self):
 		self.ra = tk.StringVar(value='')
@@ -91,22 +71,24 @@ class Target:
 		self.scan_finder_pos = tk.StringVar(value=0)
 		self.scan_script_targetshortname = tk.StringVar(value='') #Short name of target for generating observing scripts
 		self.scan_script_off = (tk.StringVar(value='0.0'), tk.StringVar(value='0.0')) #OFF position (dRA, dDec)
-	def simbad_lookup(self): #Lookup RA and Dec from from simbad
-		result = Simbad.query_object(self.name.get()) #Lookup information from simbad
-		# breakpoint()
-		#coords = name_query(self.name.get())
-		#self.ra.set(str(result["ra"].value.data[0]))
-		#self.dec.set(str(result["dec"].value.data[0]))
-		coord_obj = coords(result['ra'].item(), result['dec'].item())		
-		ra, dec = coord_obj.showcoords().split()
-		self.ra.set(ra)
-		self.dec.set(dec)
-		self.proper_motion[0].set(str(result['pmra'].value.data[0]))
-		self.proper_motion[1].set(str(result['pmdec'].value.data[0]))
+	def simbad_lookup(self): #Lookup RA and Dec from from simbad, on a worker thread so the GUI doesn't freeze while waiting for the answer
+		name = self.name.get()
+		def set_coordinates(result):
+			if name not in result:
+				print('ERROR: Simbad could not find "'+name+'"')
+				return
+			ra, dec, pmra, pmdec = result[name]
+			self.ra.set(ra)
+			self.dec.set(dec)
+			self.proper_motion[0].set(pmra)
+			self.proper_motion[1].set(pmdec)
+		def lookup_failed(e):
+			print('ERROR: Simbad lookup of "'+name+'" failed: '+str(e))
+		key = ('simbad', id(self), name)
+		if tasks.running(key) is None: #Clicking again while waiting for the answer just keeps waiting for it
+			tasks.track(key, planner_lib.get_name_resolver().resolve_async([name]), label='Looking up '+name, on_done=set_coordinates, on_error=lookup_failed)
 	def update_rotator_setting(self, a=0, b=0, c=0): #When PA changes, update rotator setting (note: tkinter trace_add is weird and passes three variables a,b,c for some reason, just ignore them)
-		delta_PA = 90.0 - float(self.PA.get())  #Default instrument East-west setting is 90 degrees in PA
-		rotator_setting = rotator_zero_point - delta_PA  #Calculate setting to put the rotator at for a given PA
-		if rotator_setting > rotator_zero_point + 180.0: rotator_setting = rotator_setting - 360.0  #Force rotator to be +/- 180 deg from the default PA
+		rotator_setting = planner_lib.calculate_rotator_setting(self.PA.get())
 		self.rotator_setting.set(str(rotator_setting))
 	def generate_dictionary(self): #Create dictionary for saving
 		dictionary = { #Construction dictionary
@@ -115,6 +97,7 @@ class Target:
 			'dra': self.dra.get(),
 			'ddec': self.ddec.get(),
 			'proper_motion': (self.proper_motion[0].get(), self.proper_motion[1].get()),
+			'use_proper_motion': self.use_proper_motion.get(),
 			'epoch': self.epoch.get(),
 			'PA': self.PA.get(),
 			'dA': (self.dA[0].get(), self.dA[1].get()),
@@ -154,8 +137,9 @@ class Target:
 			warnings.warn('Warning: Having trouble reading in "dra" and "ddec".  JSON file being read in might not be correct, or could be created by an older version of the observing planner')
 		try:
 			self.proper_motion[0].set(dictionary['proper_motion'][0])
-			self.proper_motion[1].set(dictionary['proper_motion'][0])
+			self.proper_motion[1].set(dictionary['proper_motion'][1])
 			self.epoch.set(dictionary['epoch'])
+			self.use_proper_motion.set(dictionary.get('use_proper_motion', False)) #Older save files do not store this
 		except:
 			warnings.warn('Warning: Having trouble reading in epoch or proper motion.  JSON file being read in might not be correct, or could be created by an older version of the observing planner')
 		try:	
@@ -209,449 +193,297 @@ class Target:
 			self.scan_script_off[1].set(dictionary['scan_script_off'][1])
 		except:
 			warnings.warn('Warning: Having trouble reading in slitscan variables.  JSON file being read in might not be correct, or could be created by an older version of the observing planner')		
+	def load(self, data): #Show a target_model.TargetData
+		self.read_dictionary(data.to_dictionary())
+	def store(self): #Return what is shown as a target_model.TargetData
+		return target_model.TargetData.from_dictionary(self.generate_dictionary())
 	def generate_slitscan_blocks(self):
-		global guidestars, gs_index
-		dg_sl = float(guidestars[gs_index].dG[0].get())
-		dg_sw = float(guidestars[gs_index].dG[1].get())
-		total_steps = int(self.scan_Nstep.get()) #Number of steps, rows, and cols
-		perNod = int(self.scan_perNod.get()) #Number of steps per nod between offs
-		nrows = int(self.scan_Nrow.get())
-		ncols = int(self.scan_Ncol.get())
-		drow = float(self.scan_drow.get()) #Distance between center of each step, row, col, or  in arcsec
-		dcol = float(self.scan_dcol.get())
-		dstep = float(self.scan_dstep.get())
-		if self.scan_rotation.get() != 'Default PA': #Swap number and distance traveled for rows and columns if in perpeindicular rotation
-			temp_nrows = nrows
-			temp_ncols = ncols
-			temp_drow = drow
-			temp_dcol = dcol
-			nrows = temp_ncols
-			ncols = temp_nrows
-			drow = temp_dcol
-			dcol = temp_drow
-		rows_start = ((nrows-1)/2) * drow #Calculate starting coordinate offsets
-		cols_start = -((ncols-1)/2) * dcol
-		steps_start = -((total_steps-1)/2) * dstep
-
-		rows = []
-		cols = []
-		steps = []
-		steps_centers = []
-		#Generate block rows and columns pattern
-		if nrows >= 2 and ncols >=2: #Need at least 2x2 rows and cols to do the zig zag pattern
-			i=0
-			while i+1 < nrows:
-				j=0
-				while j+1 < ncols:
-					print(i, j)
-					rows.append(i) #Do the zigzag between chunks of 4 rows and columns
-					cols.append(j)
-					rows.append(i+1)
-					cols.append(j+1)
-					rows.append(i+1)
-					cols.append(j)
-					rows.append(i)
-					cols.append(j+1)
-					j=j+2
-				i=i+2
-		if nrows % 2 == 1: #If there are an odd number of rows, fill out the last row by alternating columns, pattern is 1-3-0-2
-			j=0
-			while j < ncols:
-				if ncols - j >= 4: #if 4 or more left
-					cols.append(j+2)
-					cols.append(j+0)
-					cols.append(j+3)
-					cols.append(j+1)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-				elif ncols - j == 3: #if 3 left
-					cols.append(j+1)
-					cols.append(j+0)
-					cols.append(j+2)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-				elif ncols - j == 2: #If 2 left
-					cols.append(j+1)
-					cols.append(j+0)
-					rows.append(nrows-1)
-					rows.append(nrows-1)
-				elif ncols - j == 1: #If 1 left
-					cols.append(j+0)
-					rows.append(nrows-1)
-				j = j + 4
-			nrows = nrows-1 #Note the last row is filled out now so no need to repeat it for the last column so we subtract 1 here
-		if ncols % 2 == 1:
-			i=0
-			while i < nrows: #1
-				if nrows - i >= 4:  #if 4 or more left
-					rows.append(i+2)
-					rows.append(i+0)
-					rows.append(i+3)
-					rows.append(i+1)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-				elif nrows - i == 3:
-					rows.append(i+1)
-					rows.append(i+0)
-					rows.append(i+2)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-				elif nrows - i == 2:
-					rows.append(i+1)
-					rows.append(i+0)
-					cols.append(ncols-1)
-					cols.append(ncols-1)
-				elif nrows - i == 1:
-					rows.append(i+0)
-					cols.append(ncols-1)
-				i = i+4
-		#Generate step pattern within blocks
-		n_sets = int(total_steps / perNod)
-		for i in range(n_sets):
-			set_of_steps = []
-			for j in range(perNod):
-				set_of_steps.append(i+n_sets*j)
-			for j in range(perNod, 0, -1):
-				set_of_steps.append(i+n_sets*(j-1))
-			steps.append(set_of_steps)
-			steps_centers.append(steps_start + np.array(set_of_steps)*dstep)
-		#Organize into list of offs, blocks, and positions into "chunks" between offs
-		n_blocks = len(rows)
-		blocks = []
-		for i in range(0, n_blocks, 2):
-			for j in range(n_sets):
-				row_center = rows_start - rows[i]*drow
-				col_center = cols_start + cols[i]*dcol
-				sw = dg_sw + row_center + steps_centers[j]
-				sl = dg_sl + col_center
-				block1 = {"row":rows[i], "col":cols[i], "pos":steps[j], "sl":sl, "sw":sw}
-				blocks.append(block1)
-				if n_blocks > 1: #Error catch for when their is only one black
-					row_center = rows_start - rows[i+1]*drow
-					col_center = cols_start + cols[i+1]*dcol
-					sw = dg_sw + row_center + steps_centers[j]
-					sl = dg_sl + col_center
-					block2 = {"row":rows[i+1], "col":cols[i+1],"pos":steps[j], "sl":sl, "sw":sw}
-					blocks.append(block2)
-					if i+2 == n_blocks-1: #Handle an odd number of blocks to nod between by mixing 3 instead of 2 blocks
-						row_center = rows_start - rows[i+2]*drow
-						col_center = cols_start + cols[i+2]*dcol
-						sw = dg_sw + row_center + steps_centers[j]
-						sl = dg_sl + col_center
-						block3 = {"row":rows[i+2], "col":cols[i+2], "pos":steps[j], "sl":sl, "sw":sw}
-						blocks.append(block3)
-			if i+2 == n_blocks-1: #Handle an odd number of blocks to nod between by mixing 3 instead of 2 blocks
-				break #and end the loop
-		for block in blocks:
-			block['row'] = nrows - block['row'] - 1
-			block['col'] = ncols - block['col'] - 1
-		if self.scan_rotation.get() == '+90 deg PA': #If perpendicular scan with PA at +90 deg compared to default (e.g. PA 90 is default so this would be PA of 180 deg)
-			for block in blocks:
-				#block['row'] = nrows - block['row'] - 1
-				block['col'] = ncols - block['col'] - 1
-				swap_row = block['row']
-				swap_col = block['col']
-				block['row'] = swap_col
-				block['col'] = swap_row
-				# for position in block['pos']:
-				# 	position = 14 - position
-		# elif self.scan_rotation.get() == '-90 deg PA':
-		# 	for block in blocks:
-		# 		block['row'] = nrows - block['row'] - 1
-		# 		block['row'] = ncols - temp_col -1 #order inverted
-		self.scan_blocks = blocks
+		self.scan_blocks = planner_lib.generate_slitscan_blocks_from_dictionary(self.generate_dictionary(), shown_guidestar.dG[0].get(), shown_guidestar.dG[1].get())
 	def generate_slitscan_table(self):
-
 		self.generate_slitscan_blocks()
-
-		#Test creating csv file
-		print('Test making CSV file that can be imported into google sheets')
-		lines = []
-		#Define header line
-		blank_line = ', , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , '
-		#blank_line = ''
-		header_line = 'PA, Night, Exp. time, Block 1, Block 2,'
-		n_positions = int(len(self.scan_blocks[0]['pos'])/2)
-		for j in range(n_positions):
-			header_line += 'Pos '+str(j+1)+', '
-		header_line += 'OFF, , '
-		for j in range(n_positions):
-			header_line += 'Block 1 Pos '+str(j)+', , '
-		for j in range(n_positions, 0, -1):
-			header_line += 'Block 1 Pos '+str(j)+', , '	
-		header_line += 'OFF, , '	
-		for j in range(n_positions):
-			header_line += 'Block 2 Pos '+str(j+1)+', , '
-		for j in range(n_positions, 0, -1):
-			header_line += 'Block 2 Pos '+str(j)+', , '
-		header_line += 'OFF, , Airmass, UT, Comments'
-		lines.append(header_line)
-		#Define observing plan
-		for i in range(0, len(self.scan_blocks), 2):
-			line = '' #start line to output
-			line += self.PA.get() +', ' #PA
-			line += ', ' #Date of night, leave blank
-			line += ', ' #Exp time., leave blank
-			line += str(self.scan_blocks[i]['row'])+'-'+str(self.scan_blocks[i]['col'])+', ' #Block 1
-			line += str(self.scan_blocks[i+1]['row'])+'-'+str(self.scan_blocks[i+1]['col'])+', ' #Block 2
-			for j in range(n_positions):
-				line += str(self.scan_blocks[i]['pos'][j])+', ' #Position J (usually 1 2 3 for example)
-			line += ', , ' #OFF
-			for j in range(2*n_positions):
-				line += '%0.2f'%self.scan_blocks[i]['sl']+', %0.2f'%self.scan_blocks[i]['sw'][j]+', ' #Block 1 Pos J
-			line += ', , ' #OFF
-			if i+1 < len(self.scan_blocks): #Catch if last "chunk" then just leave blanks
-				for j in range(2*n_positions):
-					line += '%0.2f'%self.scan_blocks[i+1]['sl']+', %0.2f'%self.scan_blocks[i+1]['sw'][j]+', ' #Block 2 Pos J			
-			else:
-				for j in range(2*n_positions):
-					line += ', , '
-			line += ', , ' #OFF	
-			line += ', ' #Airmass, leave blank
-			line += ', ' #UT, leave blank
-			line += ', ' #Comments, leave blank
-			lines.append(line) #Store line in list
-			lines.append(blank_line) #Insert blank line for later data entry
-		# for line in lines:
-		# 	print(line)
-		f = asksaveasfile(initialfile = 'slitscan.csv', #Save table for import into google sheet as an observing log plan
-				defaultextension=".csv",filetypes=[("All Files","*.*"),("CSV Documents","*.csv")])
-		if f is None: #Error catch if no file is found
+		filename = asksaveasfilename(initialfile = 'slitscan.csv', #Save table for import into google sheet as an observing log plan, or as parquet for analysis
+				defaultextension=".csv",filetypes=[("All Files","*.*"),("CSV Documents","*.csv"),("Parquet Files","*.parquet")])
+		if filename is None or filename == '' or filename == (): #Error catch if no file is found
 			return
-		for line in lines:
-			f.write(f"{line}\n")
-		f.close()
-		# for i in range(rows):
-		# 	for j in range(cols):
-		# 		for k in range(steps):
-		# 			label = '%02i'%i + '_' + '%02i'%j + '_' + '%02i'%k
-		# 			print(label)
-		# 			row_center = rows_start + i*drow
-		# 			col_center = cols_start + j*dcol
-		# 			step_center = steps_start + k*dstep
-		# 			print(row_center, col_center, step_center)
+		planner_lib.write_slitscan_table(self.scan_blocks, self.PA.get(), filename)
 	def get_scan_sl_sw(self, row=0, col=0, pos=0): #Return guidestar sl and sw for a given row, column, and position in a slitscan
-		blocks_with_match_rows = [element for element in self.scan_blocks if element['row'] == row]
-		blocks_with_matched_row_and_col = [element for element in blocks_with_match_rows if element['col'] == col]
-		for block in blocks_with_matched_row_and_col:
-			sl = block['sl']
-			if block['pos'][0] == pos: #Check all three possible positions
-				sw = block['sw'][0]
-				return sl, sw
-			if block['pos'][1] == pos:
-				sw = block['sw'][1]
-				return sl, sw
-			if block['pos'][2] == pos:
-				sw = block['sw'][2]
-				return sl, sw
+		return planner_lib.get_scan_sl_sw(self.scan_blocks, row=row, col=col, pos=pos)
 	def generate_slitscan_scripts(self):
 		self.generate_slitscan_blocks()
 		parent_dir = askdirectory()
-		if parent_dir is None: #Error catch if no dir is found
+		if parent_dir is None or parent_dir == '': #Error catch if no dir is found
 			return
-		off_lines = [] #Generate instrucitons to go to off which will form an independent script but also be appended to the end of a set of positions
-		off_lines.append('SetObjName '+self.scan_script_targetshortname.get()+'_OFF')
-		dra = float(self.scan_script_off[0].get()) #Moving telescope to off (requires <= 300 arcsec for some reason so we do it in increments if we move further)
-		ddec = float(self.scan_script_off[1].get())
-		while dra > 300.0:		
-			off_lines.append('MoveTelescope 300 0')
-			off_lines.append('WaitForSeconds 3')
-			dra = dra - 300.0
-		while dra < -300.0:		
-			off_lines.append('MoveTelescope -300 0')
-			off_lines.append('WaitForSeconds 3')
-			dra = dra + 300.0
-		while ddec > 300.0:		
-			off_lines.append('MoveTelescope 0 300')
-			off_lines.append('WaitForSeconds 3')
-			ddec = ddec - 300.0
-		while ddec < -300.0:		
-			off_lines.append('MoveTelescope 0 -300')
-			off_lines.append('WaitForSeconds 3')
-			ddec = ddec + 300.0				
-		off_lines.append('MoveTelescope '+str(dra)+' '+str(ddec))
-		off_lines.append('WaitForSeconds 3')
-		off_lines.append('StartGuideBox') #Start and stop guiding to take a single image
-		off_lines.append('WaitForSeconds 1')
-		off_lines.append('StopAG')
-		off_lines.append('StartExposure')
-		off_lines.append('WaitForExposureEnds')	
-		dra = -float(self.scan_script_off[0].get()) #Moving telescope back to on position (requires <= 300 arcsec for some reason so we do it in increments if we move further)
-		ddec = -float(self.scan_script_off[1].get())
-		while dra > 300.0:		
-			off_lines.append('MoveTelescope 300 0')
-			off_lines.append('WaitForSeconds 3')
-			dra = dra - 300.0
-		while dra < -300.0:		
-			off_lines.append('MoveTelescope -300 0')
-			off_lines.append('WaitForSeconds 3')
-			dra = dra + 300.0
-		while ddec > 300.0:		
-			off_lines.append('MoveTelescope 0 300')
-			off_lines.append('WaitForSeconds 3')
-			ddec = ddec - 300.0
-		while ddec < -300.0:		
-			off_lines.append('MoveTelescope 0 -300')
-			off_lines.append('WaitForSeconds 3')
-			ddec = ddec + 300.0	
-		off_lines.append('MoveTelescope '+str(dra)+' '+str(ddec))
-		off_lines.append('WaitForSeconds 3')
-		off_lines.append('StartGuideBox') #Start and stop guiding to take a single image
-		off_lines.append('WaitForSeconds 1')
-		off_lines.append('StopAG')
-		f = open(parent_dir+'/'+self.scan_script_targetshortname.get()+'_OFF.script', "w") #Save the OFF script
-		for line in off_lines:
-			f.write(f"{line}\n")
-		f.close()
-		scripts = [] #Store all scripts for later combining two block sets
-		for scan_block in self.scan_blocks: #Now generate scrips for each set of block positions 123321 and append an off at the end
-			lines = []
-			lines.append('SetObjType TAR')
-			sl = scan_block['sl']
-			sw = scan_block['sw'][0]
-			lines.append('SetAGPos %0.2f'%sl +' %0.2f'%sw)
-			label = self.scan_script_targetshortname.get()+'_'+str(scan_block['row'])+'-'+str(scan_block['col'])+'-'+str(scan_block['pos'][0])
-			lines.append('SetObjName '+label)
-			text_to_say = 'To start the script for '+str(scan_block['row'])+'-'+str(scan_block['col'])+'-'+str(scan_block['pos'][0])+' (row-col-position), center the guide star on the autoguide position then click OK.'
-			text_to_say = text_to_say.replace(' ', r'\ ') #Note needed to replace spaces with \[space] for script to use full sentence
-			lines.append('WaitForYes '+text_to_say) 
-			lines.append('StartGuideBox')
-			lines.append('WaitForSeconds 15')
-			lines.append('StartExposure')
-			lines.append('WaitForExposureEnds')
-			lines.append('StopAG')
-			lines.append('WaitForSeconds 3')
-			n_pos = len(scan_block['pos'])
-			previous_sl = sl
-			previous_sw = sw
-			i = 1
-			while i < n_pos:
-				sw = scan_block['sw'][i]
-				dra, ddec = ds9_lib.convert_from_sl_sw_to_dra_ddec(sl-previous_sl, sw-previous_sw, float(self.PA.get()))
-				previous_sl = sl
-				previous_sw = sw
-				lines.append('SetObjName '+self.scan_script_targetshortname.get()+'_'+str(scan_block['row'])+'-'+str(scan_block['col'])+'-'+str(scan_block['pos'][i]))
-				lines.append('SetAGPos %0.2f'%sl +' %0.2f'%sw)
-				if not target.scan_rotation.get()=='+90 deg PA':
-					lines.append('MoveTelescope %0.2f'%-dra +' %0.2f'%-ddec)
-				else:
-					lines.append('MoveTelescope %0.2f'%dra +' %0.2f'%ddec)
-				lines.append('WaitForSeconds 3')
-				lines.append('StartGuideBox')
-				lines.append('StartExposure')
-				lines.append('WaitForExposureEnds')
-				if i < n_pos-1:
-					if scan_block['pos'][i] == scan_block['pos'][i+1]:
-						lines.append('StartExposure')
-						lines.append('WaitForExposureEnds')	
-						i = i+1
-				lines.append('StopAG')
-				lines.append('WaitForSeconds 3')
-				i = i+1
-			lines.extend(off_lines) #Add going to the off to the end of the script
-			f = open(parent_dir+'/'+label+'.script', "w") #Save the block positions script
-			for line in lines:
-				f.write(f"{line}\n")
-			f.close()
-			scripts.append(lines)
-		for i in range(0, len(scripts), 2): #Now generate scripts that can run two sets of scan blocks, for convenience
-			lines = []
-			lines.extend(scripts[i])
-			lines.extend(scripts[i+1])
-			scan_block_1 = self.scan_blocks[i]
-			scan_block_2 = self.scan_blocks[i+1]
-			label = self.scan_script_targetshortname.get()+'_'+str(scan_block_1['row'])+'-'+str(scan_block_1['col'])+'-'+str(scan_block_1['pos'][0])+'_'+str(scan_block_2['row'])+'-'+str(scan_block_2['col'])+'-'+str(scan_block_2['pos'][0])
-			f = open(parent_dir+'/'+label+'.script', "w") #Save the block positions script
-			for line in lines:
-				f.write(f"{line}\n")
-			f.close()			
+		scripts = planner_lib.iterate_slitscan_scripts(self.scan_blocks, self.PA.get(), self.scan_script_targetshortname.get(),
+			self.scan_script_off[0].get(), self.scan_script_off[1].get(), scan_rotation=self.scan_rotation.get())
+		planner_lib.write_slitscan_scripts(scripts, parent_dir)
 
 
 
 
 
 target = Target()
-guidestars = [Target(), Target(), Target(), Target(), Target(), Target(), Target(), Target(), Target(), Target()]
-guidestars[gs_index].survey.set('Gaia DR2') #Set guidetar survey default
+guidestars = [target_model.TargetData() for i in range(10)] #Guide star slots
+guidestars[gs_index].survey = 'Gaia DR2' #Set guidetar survey default
+shown_guidestar = Target() #The guide star slot shown (gs_index), copied back into guidestars when another one is picked
+shown_guidestar.load(guidestars[gs_index])
 
 
+#Runs DS9, survey, catalog, and SIMBAD work off the GUI thread, with what is running shown in the status line
+status_text = tk.StringVar(value='')
+tasks = task_runner.TaskRunner(window.after, poll_interval=50, on_status=status_text.set)
+
+#Values derived from the GUI state, each only recomputed when its inputs change, and while typing only once typing pauses
+graph = reactive.Graph(delay=250, schedule=window.after, cancel=window.after_cancel)
+graph.source('PA', lambda: target.PA.get())
+graph.source('guidestar_dra_ddec', lambda: (shown_guidestar.dra.get(), shown_guidestar.ddec.get()))
+graph.source('guidestar_dG', lambda: (shown_guidestar.dG[0].get(), shown_guidestar.dG[1].get()))
+graph.source('target_dictionary', lambda: target.generate_dictionary())
+graph.derived('rotator_setting', ['PA'], planner_lib.calculate_rotator_setting)
+graph.derived('dG', ['guidestar_dra_ddec', 'PA'], lambda dra_ddec, PA: ds9_lib.convert_from_dra_ddec_to_sl_sw(float(dra_ddec[0]), float(dra_ddec[1]), float(PA)))
+graph.derived('scan_blocks', ['target_dictionary', 'guidestar_dG'], lambda dictionary, dG: planner_lib.generate_slitscan_blocks_from_dictionary(dictionary, dG[0], dG[1]))
+
+def set_guidestar_dG(dG):
+	shown_guidestar.dG[0].set(str(dG[0]))
+	shown_guidestar.dG[1].set(str(dG[1]))
+
+graph.watch('rotator_setting', lambda rotator_setting: target.rotator_setting.set(str(rotator_setting)))
+graph.watch('dG', set_guidestar_dG)
+
+
+
+#Everything that talks to DS9 (or waits on SkyView and the catalog servers through it) runs in the "ds9" lane of the task
+#runner, one thing at a time, so the window stays live.  The tk variables are read here on the GUI thread and the results are
+#set back in on_done, since tkinter can only be used from the GUI thread.
+#DS9 is not opened at startup, it is started (if it isn't running already) the first time something is sent to it.
+def submit_to_ds9(key, function, label, on_done=None):
+	def run(task):
+		ds9_lib.ds9.ensure_open()
+		return function(task)
+	return tasks.submit(key, run, lane='ds9', label=label, on_done=on_done)
 
 def make_finder_chart(grab_image=True):
-	target.generate_slitscan_blocks()
-	ds9_lib.make_finder_chart_in_ds9(target, guidestars[gs_index], grab_image=grab_image)
+	target.scan_blocks = graph.get('scan_blocks') #Only regenerated if the slitscan settings or guide star changed since last time
+	guidestar = shown_guidestar
+	settings = (target.ra.get(), target.dec.get(), target.PA.get(), guidestar.dra.get(), guidestar.ddec.get(), guidestar.dG[0].get(), guidestar.dG[1].get(),
+		target.use_proper_motion.get(), target.proper_motion[0].get(), target.proper_motion[1].get(), target.epoch.get(),
+		target.use_slitscan.get(), target.scan_finder_row.get(), target.scan_finder_col.get(), target.scan_finder_pos.get(), target.scan_rotation.get(),
+		target.survey.get(), target.fov.get(), json.dumps(target.generate_dictionary(), sort_keys=True))
+	key = ('finder chart', grab_image, settings)
+	if tasks.running(key) is not None: #Same chart already on its way
+		return
+	obj_coords, delta_PA, guidestar_dra, guidestar_ddec, guidestar_sl, guidestar_sw = planner_lib.calculate_finder_chart_center(
+		target.ra.get(), target.dec.get(), target.PA.get(),
+		guidestar_dra=float(guidestar.dra.get()), guidestar_ddec=float(guidestar.ddec.get()),
+		guidestar_sl=float(guidestar.dG[0].get()), guidestar_sw=float(guidestar.dG[1].get()),
+		use_proper_motion=target.use_proper_motion.get(), proper_motion=(target.proper_motion[0].get(), target.proper_motion[1].get()), epoch=target.epoch.get(),
+		use_slitscan=target.use_slitscan.get(), scan_blocks=target.scan_blocks,
+		scan_finder_row=target.scan_finder_row.get(), scan_finder_col=target.scan_finder_col.get(), scan_finder_pos=target.scan_finder_pos.get(),
+		scan_rotation=target.scan_rotation.get())
+	survey, fov, show_scan, scan_blocks, scan_plus_90_deg = target.survey.get(), target.fov.get(), target.use_slitscan.get(), target.scan_blocks, target.scan_rotation.get()=='+90 deg PA'
+	submit_to_ds9(key, lambda task: ds9_lib.make_finder_chart_in_ds9(obj_coords, delta_PA, survey=survey, fov=fov,
+		guidestar_dra=guidestar_dra, guidestar_ddec=guidestar_ddec, guidestar_sl=guidestar_sl, guidestar_sw=guidestar_sw,
+		show_scan=show_scan, scan_blocks=scan_blocks, scan_plus_90_deg=scan_plus_90_deg,
+		grab_image=grab_image), 'Making finder chart' if grab_image else 'Updating finder chart')
 
 
 def remake_regions():
 	make_finder_chart(grab_image=False)
 
-def change_PA(a=0, b=0, c=0):
-	target.update_rotator_setting()
-	guideStarConvertDraDdecToSlSw()
+def change_PA(a=0, b=0, c=0): #Update the rotator setting and guide star sl and sw once the PA stops changing
+	graph.changed()
 	#remake_regions()
 
 def search_for_guide_stars():
-	ds9_lib.search_for_guide_stars(target.ra.get(), target.dec.get(), int(n_guide_stars.get()), float(target.PA.get()), guidestars[gs_index].survey.get(), guidestars[gs_index].use_proper_motion.get(), float(target.epoch.get()))
+	survey = shown_guidestar.survey.get()
+	arguments = (target.ra.get(), target.dec.get(), int(n_guide_stars.get()), float(target.PA.get()), survey, shown_guidestar.use_proper_motion.get(), float(target.epoch.get()))
+	def fill_guide_stars(ranked):
+		guidestars[gs_index] = shown_guidestar.store()
+		for guidestar, star in zip(guidestars, ranked): #Fill the guide star slots with the best stars first
+			guidestar.ra = star['ra']
+			guidestar.dec = star['dec']
+			guidestar.dra = star['dra']
+			guidestar.ddec = star['ddec']
+			guidestar.dG = (star['sl'], star['sw'])
+			guidestar.survey = survey
+		shown_guidestar.load(guidestars[gs_index])
+	submit_to_ds9(('guide star search',) + arguments, lambda task: ds9_lib.search_for_guide_stars(*arguments), 'Searching for guide stars', on_done=fill_guide_stars)
 
 def grab_guide_star():
-	result = ds9_lib.grab_guide_star() #Use xpaget to grab information about the selected region
-	if type(result) is bytes: #Catch in case result is a byte string
-		result = result.decode()
-	result = result.split('(')[1].split(')')[0] #Do some string shenanigans to get the RA and Dec in the right format
-	ra, dec = result.split(',')
-	guidestars[gs_index].ra.set(ra)
-	guidestars[gs_index].dec.set(dec)
-	guideStarConvertRaDecToSlSw() #Update everything about the selected guide star
-	remake_regions() #Remake the regions in the finder chart
+	def set_guide_star(result):
+		if type(result) is bytes: #Catch in case result is a byte string
+			result = result.decode()
+		result = result.split('(')[1].split(')')[0] #Do some string shenanigans to get the RA and Dec in the right format
+		ra, dec = result.split(',')
+		shown_guidestar.ra.set(ra)
+		shown_guidestar.dec.set(dec)
+		guideStarConvertRaDecToSlSw() #Update everything about the selected guide star
+		remake_regions() #Remake the regions in the finder chart
+	submit_to_ds9('grab guide star', lambda task: ds9_lib.grab_guide_star(), 'Grabbing guide star', on_done=set_guide_star) #Use xpaget to grab information about the selected region
 
 def guideStarConvertDraDdecToSlSw():
-	sl, sw = ds9_lib.convert_from_dra_ddec_to_sl_sw(float(guidestars[gs_index].dra.get()), float(guidestars[gs_index].ddec.get()), float(target.PA.get()))
-	guidestars[gs_index].dG[0].set(str(sl))
-	guidestars[gs_index].dG[1].set(str(sw))
+	sl, sw = ds9_lib.convert_from_dra_ddec_to_sl_sw(float(shown_guidestar.dra.get()), float(shown_guidestar.ddec.get()), float(target.PA.get()))
+	shown_guidestar.dG[0].set(str(sl))
+	shown_guidestar.dG[1].set(str(sw))
 
 def guideStarConvertRaDecToSlSw():
-	dra, ddec = ds9_lib.convert_guide_star_from_ra_dec_to_dra_ddec(guidestars[gs_index].ra.get(), guidestars[gs_index].dec.get(), target.ra.get(), target.dec.get())
-	guidestars[gs_index].dra.set(str(dra))
-	guidestars[gs_index].ddec.set(str(ddec))
+	dra, ddec = ds9_lib.convert_guide_star_from_ra_dec_to_dra_ddec(shown_guidestar.ra.get(), shown_guidestar.dec.get(), target.ra.get(), target.dec.get())
+	shown_guidestar.dra.set(str(dra))
+	shown_guidestar.ddec.set(str(ddec))
 	guideStarConvertDraDdecToSlSw() #Then convert dRa and dDec to sl and sw
 
 
-def menusave():
-	f = asksaveasfile(initialfile = 'save.json',
-		defaultextension=".json",filetypes=[("All Files","*.*"),("Json Documents","*.json")])
-	if f is None: #Error catch if no file is found
-		return
-	target_dictionary = target.generate_dictionary() #Generate dictionaries for each object and combine them into one
-	guidestar_dictionaries = []
-	for i in range(len(guidestars)): #Loop through each guidestar
-		guidestar_dictionaries.append(guidestars[i].generate_dictionary())		
-	dictionary = {
-		"target": target_dictionary,
-		"guidestar": guidestar_dictionaries
+#Projects (project_file.py) hold many targets, each saved as a record like the JSON save files: {"target": ..., "guidestar": [...]}
+#While a project is open, the target shown is saved into the project's journal every autosave_ms (only if it changed), when
+#switching targets, and on Save and Exit.
+project = None #Open project_file.Project, None if not working in a project
+project_target_id = None #Id in the project of the target being shown
+autosave_ms = 30000 #How often to save the target into the open project (ms)
+file_types = [("All Files","*.*"),("Project Files","*"+project_file.project_extension),("Json Documents","*.json")]
+
+def generate_record(): #Combine the target and guide star dictionaries into one record for saving
+	guidestars[gs_index] = shown_guidestar.store()
+	return {
+		"target": target.generate_dictionary(),
+		"guidestar": [guidestar.to_dictionary() for guidestar in guidestars]
 	}
-	json_obj = json.dumps(dictionary, indent=4) #Serialize json
-	f.write(json_obj)
-	f.close()
 
+def read_record(record): #Show a saved record, replacing the target and every guide star slot
+	global gs_index
+	target.read_dictionary(record['target'])
+	input_guidestars = record.get('guidestar', [])
+	if len(input_guidestars) > len(guidestars):
+		warnings.warn('Warning: Only the first '+str(len(guidestars))+' of the '+str(len(input_guidestars))+' guide stars saved are shown.')
+	for i in range(len(guidestars)):
+		guidestars[i] = target_model.TargetData.from_dictionary(input_guidestars[i]) if i < len(input_guidestars) else target_model.TargetData() #Clear slots with no saved guide star
+	gs_index = 0
+	gs_index_tk.set('1')
+	shown_guidestar.load(guidestars[gs_index])
+
+def update_title():
+	if project is None:
+		window.title("IGRINS Observing Planner")
+	else:
+		position = project.ids().index(project_target_id) + 1
+		window.title("IGRINS Observing Planner - "+os.path.basename(project.filename)+" ("+str(position)+"/"+str(len(project))+": "+target.name.get()+")")
+
+def save_to_project(): #Save the target shown into the open project, if it changed
+	if project is not None and project_target_id is not None:
+		project.put(project_target_id, generate_record())
+		update_title()
+
+def show_project_target(id):
+	global project_target_id
+	save_to_project()
+	project_target_id = id
+	read_record(project.get(id))
+	project.set_current(id)
+	update_title()
+
+def open_project(filename):
+	global project, project_target_id
+	close_project()
+	project = project_file.Project(filename)
+	if len(project) == 0: #Start a new project with the target already shown
+		project_target_id = project.add(generate_record())
+		project.set_current(project_target_id)
+		update_title()
+	else:
+		show_project_target(project.current if project.current in project else project.ids()[0])
+
+def close_project():
+	global project, project_target_id
+	if project is not None:
+		save_to_project()
+		project.close()
+	project = None
+	project_target_id = None
+	update_title()
+
+def menusave():
+	if project is not None: #Only the target shown can have changed, so only it is saved
+		save_to_project()
+	else:
+		menusaveas()
+
+def menusaveas():
+	filename = asksaveasfilename(initialfile = 'save.json',
+		defaultextension=".json",filetypes=file_types)
+	if filename is None or filename == '' or filename == (): #Error catch if no file is found
+		return
+	if filename.endswith(project_file.project_extension): #Save as a project, with all the targets of the project already open
+		save_to_project()
+		records = [generate_record()] if project is None else [project.get(id) for id in project.ids()]
+		current = '0' if project is None else str(project.ids().index(project_target_id))
+		close_project()
+		project_file.write_project(filename, records, current=current)
+		open_project(filename)
+		return
+	with open(filename, 'w') as f: #Save the target shown as a JSON save file
+		f.write(json.dumps(generate_record(), indent=4)) #Serialize json
 
 def menuload():
 	filename = askopenfilename(initialfile = 'save.json',
-		defaultextension=".json",filetypes=[("All Files","*.*"),("Json Documents","*.json")])
-	if filename == '': #Error catch if no file is found
+		defaultextension=".json",filetypes=file_types)
+	if filename is None or filename == '' or filename == (): #Error catch if no file is found
+		return
+	if project_file.is_project_file(filename):
+		open_project(filename)
 		return
 	with open(filename, 'r') as openfile: 		# Reading from json file
 		json_object = json.load(openfile)
-	target.read_dictionary(json_object['target'])
-	gs_index = 0
-	input_guidestars = json_object['guidestar']
-	for i in range(len(json_object['guidestar'])):
-		guidestars.append(Target())
-		guidestars[i].read_dictionary(json_object['guidestar'][i])
+	close_project()
+	read_record(json_object)
+
+def menunewproject():
+	filename = asksaveasfilename(initialfile = 'targets'+project_file.project_extension,
+		defaultextension=project_file.project_extension,filetypes=file_types)
+	if filename is None or filename == '' or filename == (): #Error catch if no file is found
+		return
+	if os.path.exists(filename): #asksaveasfilename already asked before replacing it
+		os.remove(filename)
+	open_project(filename)
+
+def menuaddtarget(): #Add a new target to the project, starting from the guide star and slitscan settings of the one shown
+	if project is None:
+		return
+	save_to_project()
+	record = generate_record()
+	for key in ('ra', 'dec', 'name', 'proper_motion', 'scan_script_targetshortname'):
+		record['target'][key] = planner_lib.default_target_dictionary[key]
+	show_project_target(project.add(record))
+
+def menudeletetarget():
+	global project_target_id
+	if project is None or len(project) <= 1:
+		return
+	ids = project.ids()
+	i = ids.index(project_target_id)
+	project.delete(project_target_id)
+	project_target_id = None #Nothing to save for the deleted target
+	show_project_target(ids[i + 1] if i + 1 < len(ids) else ids[i - 1])
+
+def menunexttarget(step=1):
+	if project is None:
+		return
+	ids = project.ids()
+	show_project_target(ids[(ids.index(project_target_id) + step) % len(ids)])
+
+def menuprevioustarget():
+	menunexttarget(-1)
+
+def menucompact():
+	if project is not None:
+		save_to_project()
+		project.compact()
+
+def menuexit():
+	close_project()
+	tasks.shutdown()
+	window.destroy()
+
+def autosave():
+	save_to_project()
+	window.after(autosave_ms, autosave)
 
 
 def break_debugger():
@@ -662,10 +494,20 @@ menubar = tk.Menu(window)
 filemenu = tk.Menu(menubar, tearoff=0)
 menubar.add_cascade(label ='File', menu = filemenu)
 filemenu.add_command(label='Save', command=menusave)
+filemenu.add_command(label='Save As...', command=menusaveas)
 filemenu.add_command(label='Load', command=menuload)
+filemenu.add_command(label='New Project', command=menunewproject)
 filemenu.add_command(label='Break', command=break_debugger)
 filemenu.add_separator() 
-filemenu.add_command(label ='Exit', command=window.destroy)
+filemenu.add_command(label ='Exit', command=menuexit)
+projectmenu = tk.Menu(menubar, tearoff=0)
+menubar.add_cascade(label ='Project', menu = projectmenu)
+projectmenu.add_command(label='Next Target', command=menunexttarget)
+projectmenu.add_command(label='Previous Target', command=menuprevioustarget)
+projectmenu.add_command(label='Add Target', command=menuaddtarget)
+projectmenu.add_command(label='Delete Target', command=menudeletetarget)
+projectmenu.add_separator()
+projectmenu.add_command(label='Compact Project File', command=menucompact)
 
 #RA, Dec, and PA for target
 ra_label = tk.Label(frame, text='RA (J2000):', font=("Arial", 12), anchor=tk.NE)
@@ -791,8 +633,8 @@ da_sl_entry = tk.Entry(frame, font=("Arial", 12), textvariable=target.dA[0])
 da_sw_entry = tk.Entry(frame, font=("Arial", 12), textvariable=target.dA[1])
 db_sl_entry = tk.Entry(frame, font=("Arial", 12), textvariable=target.dB[0])
 db_sw_entry = tk.Entry(frame, font=("Arial", 12), textvariable=target.dB[1])
-dg_sl_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].dG[0])
-dg_sw_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].dG[1])
+dg_sl_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.dG[0])
+dg_sw_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.dG[1])
 da_sl_entry.place(relx=0.06, rely=0.60, relwidth=0.08)
 da_sw_entry.place(relx=0.15, rely=0.60, relwidth=0.08)
 db_sl_entry.place(relx=0.06, rely=0.63, relwidth=0.08)
@@ -847,10 +689,10 @@ n_guide_stars_label.place(relx=0.61, rely=0.642, relwidth=0.08)
 n_guide_stars_entry.place(relx=0.7, rely=0.642, relwidth=0.08)
 
 guide_star_survey_label = tk.Label(frame, text='Survey:', font=("Arial", 12), anchor=tk.NE)
-guide_star_survey_menu = ttk.Combobox(frame, textvariable=guidestars[gs_index].survey, values=('Gaia DR2', '2MASS point source'), state='readonly')
+guide_star_survey_menu = ttk.Combobox(frame, textvariable=shown_guidestar.survey, values=('Gaia DR2', '2MASS point source'), state='readonly')
 guide_star_survey_label.place(relx=0.54, rely=0.68, relwidth=0.15)
 guide_star_survey_menu.place(relx=0.7, rely=0.677, relwidth=0.19)
-guide_starpm_checkbox = tk.Checkbutton(frame, text="Use proper motion?", variable=guidestars[gs_index].use_proper_motion)
+guide_starpm_checkbox = tk.Checkbutton(frame, text="Use proper motion?", variable=shown_guidestar.use_proper_motion)
 guide_starpm_checkbox.place(relx=0.635, rely=0.71)
 
 
@@ -861,8 +703,8 @@ guide_star_ddec_label = tk.Label(frame, text='dDec', font=("Arial", 12), anchor=
 guide_star_label.place(relx=0.08, rely=0.72)
 guide_star_dra_label.place(relx=0.06, rely=0.76)
 guide_star_ddec_label.place(relx=0.15, rely=0.76)
-guide_star_dra_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].dra)
-guide_star_ddec_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].ddec)
+guide_star_dra_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.dra)
+guide_star_ddec_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.ddec)
 guide_star_dra_entry.place(relx=0.04, rely=0.80, relwidth=0.08)
 guide_star_ddec_entry.place(relx=0.15, rely=0.80, relwidth=0.08)
 
@@ -874,16 +716,16 @@ gs_index_tk.trace('w',update_gs_index) #Run function update_gs_index when gs_ind
 
 #RA, Dec, and PA for guide star
 guide_star_ra_label = tk.Label(frame, text='RA (J2000):', font=("Arial", 12), anchor=tk.NE)
-guide_star_ra_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].ra)
+guide_star_ra_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.ra)
 guide_star_ra_label.place(relx=0.03, rely=0.87)
 guide_star_ra_entry.place(relx=0.15, rely=0.87)
 guide_star_dec_label = tk.Label(frame, text='Dec (J2000):', font=("Arial", 12), anchor=tk.NE)
-guide_star_dec_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].dec)
+guide_star_dec_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.dec)
 guide_star_dec_label.place(relx=0.03, rely=0.93)
 guide_star_dec_entry.place(relx=0.15, rely=0.93)
 guide_star_simbad_name_label = tk.Label(frame, text='Simbad name:', font=("Arial", 12), anchor=tk.NE)
-guide_star_simbad_name_entry = tk.Entry(frame, font=("Arial", 12), textvariable=guidestars[gs_index].name)
-guide_star_simbad_button = tk.Button(frame, text='Lookup', command=guidestars[gs_index].simbad_lookup)
+guide_star_simbad_name_entry = tk.Entry(frame, font=("Arial", 12), textvariable=shown_guidestar.name)
+guide_star_simbad_button = tk.Button(frame, text='Lookup', command=shown_guidestar.simbad_lookup)
 guide_star_simbad_name_label.place(relx=0.42, rely=0.87)
 guide_star_simbad_name_entry.place(relx=0.56, rely=0.87)
 guide_star_simbad_button.place(relx=0.84, rely=0.865)
@@ -893,7 +735,17 @@ guide_star_convert_ra_dec_button = tk.Button(frame, text='Convert RA Dec (J200)
 guide_star_convert_dra_ddec_button.place(relx=0.26, rely=0.793)
 guide_star_convert_ra_dec_button.place(relx=0.43, rely=0.92)
 
+#Status of anything running in the background, and a button to cancel it
+status_label = tk.Label(frame, textvariable=status_text, font=("Arial", 10), anchor=tk.W)
+status_label.place(relx=0.02, rely=0.97, relwidth=0.8)
+cancel_button = tk.Button(frame, text='Cancel', command=tasks.cancel)
+cancel_button.place(relx=0.86, rely=0.96)
+
 #Main frame and loop
 window.config(menu=menubar)
+window.protocol("WM_DELETE_WINDOW", menuexit) #Save the project when the window is closed
+window.after(autosave_ms, autosave)
 frame.pack()
+if os.environ.get('IGRINS_PLANNER_EXIT_AFTER_STARTUP'): #Used by benchmarks.py to time startup, close as soon as the window is up
+	window.after_idle(window.destroy)
 window.mainloop()
@@ -0,0 +1,366 @@
+#Benchmarks for the IGRINS Observing Planner, run offline:
+#   python benchmarks.py                   run them all
+#   python benchmarks.py startup           run the ones with "startup" in their name
+#   python benchmarks.py --save-baseline   run them all and keep the results as the baseline to compare later runs to
+#
+#Startup benchmarks time importing the planner in a new python process (so nothing is already imported), and check that
+#nothing slow to import (astroquery, matplotlib, numpy's test tools, ...) gets imported just to start up.  The GUI startup
+#benchmark opens the GUI window and closes it as soon as it is up, it needs a display and is skipped without one.
+#The other benchmarks time the planning work in this process with canned inputs: slitscan blocks for several mosaic sizes,
+#region files, guide star searches (against a catalog export made up the same way every time, through the fake DS9 backend,
+#with the catalog cache turned off), sexagesimal conversions, JSON save files and project files, and slitscan scripts.
+#A benchmark fails if it takes longer than its limit (seconds), imports something it shouldn't, or is a regression: its median
+#is more than tolerance times the median in the baseline (kept per computer, since times from different computers can't be
+#compared).
+
+import sys
+import os
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+
+repeats = 5 #Times to run each benchmark, the median is reported
+directory = os.path.dirname(os.path.abspath(__file__))
+slow_imports = ('astroquery', 'astropy', 'matplotlib', 'pdb', 'numpy.testing', 'numpy.f2py', 'numpy.random', 'pyarrow', 'pyds9', 'sqlite3')
+startup_seconds = 1.0 #Limit for starting up
+baseline_filename = os.path.join(os.path.expanduser('~'), '.igrins_observing_planner', 'benchmark_baseline.json')
+tolerance = 1.5 #A benchmark is a regression if its median is more than this times the baseline median
+target_ra, target_dec = '05:35:00.00', '+22:00:00.0' #Target for the guide star search and region benchmarks
+n_catalog_stars = 200 #Stars in the canned catalog export
+
+
+#Run statement in a new python process, returns the seconds it took and the slow_imports it imported
+def time_in_new_process(statement, env=None):
+    code = '\n'.join([
+        'import sys, time, json',
+        'start = time.perf_counter()',
+        statement,
+        'seconds = time.perf_counter() - start',
+        'print(json.dumps([seconds, [name for name in '+repr(slow_imports)+' if name in sys.modules]]))',
+    ])
+    output = subprocess.run([sys.executable, '-c', code], cwd=directory, env=env, capture_output=True, text=True, check=True).stdout
+    seconds, imported = json.loads(output.strip().splitlines()[-1])
+    return seconds, imported
+
+
+def startup_planning_modules():
+    return time_in_new_process('import ds9_lib, planner_lib, reactive, task_runner, project_file, target_model')
+
+
+def startup_cli():
+    return time_in_new_process('import planner_cli')
+
+
+#Open the GUI and close it as soon as the window is up, returns None if there is no display
+def startup_gui():
+    if sys.platform.startswith('linux') and os.environ.get('DISPLAY', '') == '' and os.environ.get('WAYLAND_DISPLAY', '') == '':
+        return None
+    env = dict(os.environ, IGRINS_PLANNER_EXIT_AFTER_STARTUP='1')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(directory, 'IGRINS_observing_planner.py')], cwd=directory, env=env, capture_output=True, check=True)
+    return time.perf_counter() - start, [] #Slow imports are checked by startup_planning_modules, the GUI imports the same modules
+
+
+#Time function() called number times in this process, returns the seconds per call (and no slow modules imported, since
+#this process has imported everything already)
+def time_calls(function, number):
+    start = time.perf_counter()
+    for i in range(number):
+        function()
+    return (time.perf_counter() - start) / number, []
+
+
+#Run the planning benchmarks offline: in a temporary directory (for tmp.dat, region files, and scripts), through the fake DS9
+#backend, without the catalog and cutout caches, and without printing what would go to the command line
+@contextlib.contextmanager
+def offline():
+    import ds9
+    import ds9_lib
+    saved = (os.getcwd(), ds9.transport, ds9.verbose, ds9_lib.current_working_directory, ds9_lib.use_catalog_cache, ds9_lib.use_cutout_cache,
+        ds9_lib.guide_star_index_directories)
+    temporary_directory = tempfile.mkdtemp(prefix='igrins_benchmarks_')
+    try:
+        os.chdir(temporary_directory)
+        ds9.transport = None
+        ds9.use('fake')
+        ds9.verbose = False
+        ds9_lib.current_working_directory = temporary_directory + '/'
+        ds9_lib.use_catalog_cache = False
+        ds9_lib.use_cutout_cache = False
+        ds9_lib.guide_star_index_directories = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield temporary_directory
+    finally:
+        os.chdir(saved[0])
+        ds9.transport, ds9.verbose, ds9_lib.current_working_directory, ds9_lib.use_catalog_cache, ds9_lib.use_cutout_cache, \
+            ds9_lib.guide_star_index_directories = saved[1:]
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+#Text of a catalog DS9 would export (tmp.dat) for a guide star search around the target, sorted from brightest K-band mag.
+#The stars are made up from a fixed seed so every run gets the same ones.  The 2MASS export has RA, Dec., and K-mag in columns
+#0, 1, and 9, the Gaia export is Gaia matched to 2MASS with the columns read_guide_star_catalog and read_guide_star_details use
+def canned_catalog_export(survey, n_stars=n_catalog_stars):
+    import coordfuncs
+    import ds9_lib
+    generator = random.Random(2025)
+    ra_min, ra_max, dec_min, dec_max = ds9_lib.guide_star_search_box(coordfuncs.sex2deg(target_ra, units='hms'), coordfuncs.sex2deg(target_dec))
+    n_columns = 60 if survey == 'Gaia DR2' else 14
+    kmag = ds9_lib.kmag_column(survey)
+    rows = []
+    for i in range(n_stars):
+        row = [''] * n_columns
+        row[0] = repr(float(generator.uniform(ra_min, ra_max)))
+        row[1] = repr(float(generator.uniform(dec_min, dec_max)))
+        row[kmag] = '%.3f' % generator.uniform(6.0, ds9_lib.gstar_mag_limit)
+        if survey == 'Gaia DR2':
+            row[9], row[11] = '%.3f' % generator.gauss(0.0, 20.0), '%.3f' % generator.gauss(0.0, 20.0) #Proper motion
+            row[10], row[12] = '%.3f' % generator.uniform(0.01, 0.5), '%.3f' % generator.uniform(0.01, 0.5) #Proper motion errors
+            row[16] = '%.3f' % (float(row[kmag]) + generator.uniform(0.5, 3.0)) #G mag.
+            row[26] = '%.3f' % generator.uniform(0.5, 3.0) #BP-RP
+        rows.append(row)
+    rows.sort(key=lambda row: float(row[kmag]))
+    return '\n'.join('\t'.join(row) for row in [['c'+str(i) for i in range(n_columns)]] + rows) + '\n'
+
+
+def slitscan_blocks(nrows, ncols):
+    import planner_lib
+    generate = planner_lib.generate_slitscan_blocks.__wrapped__ #Time making the blocks, not the lru_cache
+    return time_calls(lambda: generate(5.0, -2.0, nrows=nrows, ncols=ncols), max(1, 2000 // (nrows * ncols)))
+
+
+#Make the region file for a 6 arcmin finder chart (with the SVC outline simplified like make_finder_chart_in_ds9 does)
+#Unless cached is set the SVC polygon caches are cleared every call, so building and simplifying the outline is timed too
+def create_region(show_scan, cached=False):
+    import planner_lib
+    import ds9_lib
+    import coordfuncs
+    obj_coords = coordfuncs.coord_query(target_ra+' '+target_dec)
+    scan_blocks = planner_lib.generate_slitscan_blocks(5.0, -2.0, nrows=5, ncols=5)
+    max_deviation = ds9_lib.svc_outline_tolerance_for_fov(6.0)
+    def make_region():
+        if not cached:
+            ds9_lib.get_simplified_scam_outline.cache_clear()
+            ds9_lib.get_svc_polygon.cache_clear()
+            ds9_lib.get_svc_polygon_string.cache_clear()
+        ds9_lib.create_region(obj_coords, 45.0, 0.119, guidestar_dra=10.0, guidestar_ddec=-20.0, guidestar_sl=5.0, guidestar_sw=-2.0,
+            show_scan=show_scan, scan_blocks=scan_blocks if show_scan else None, max_deviation=max_deviation)
+    with offline():
+        return time_calls(make_region, 200 if cached else 50)
+
+
+def search_for_guide_stars(survey):
+    import ds9
+    import ds9_lib
+    import guide_star_scoring #Imported by search_for_guide_stars the first time, import it here so that isn't timed
+    export = canned_catalog_export(survey)
+    with offline():
+        ds9.get_transport().backend.catalog_export = export
+        return time_calls(lambda: ds9_lib.search_for_guide_stars(target_ra, target_dec, ds9_lib.n_gstars, 45.0, survey, True, 2025.0), 20)
+
+
+def sex2deg():
+    import coordfuncs
+    inputs = ['%02i:%02i:%05.2f' % (i % 24, i % 60, (i * 0.37) % 60) for i in range(1000)]
+    return time_calls(lambda: [coordfuncs.sex2deg(input, units='hms') for input in inputs], 10)
+
+
+def deg2sex():
+    import coordfuncs
+    inputs = [i * 0.359 - 179.5 for i in range(1000)]
+    return time_calls(lambda: [coordfuncs.deg2sex(input) for input in inputs], 10)
+
+
+def sex2deg_array():
+    import coordfuncs
+    inputs = ['%02i:%02i:%05.2f' % (i % 24, i % 60, (i * 0.37) % 60) for i in range(10000)]
+    return time_calls(lambda: coordfuncs.sex2deg_array(inputs, units='hms'), 10)
+
+
+def deg2sex_array():
+    import coordfuncs
+    import numpy as np
+    inputs = np.linspace(-179.5, 179.5, 10000)
+    return time_calls(lambda: coordfuncs.deg2sex_array(inputs), 10)
+
+
+#A record like the GUI saves: a target with a slitscan and its guide star slots
+def canned_record():
+    import target_model
+    target = target_model.TargetData(ra=target_ra, dec=target_dec, name='Benchmark target', PA=45.0, use_slitscan=True, scan_Nrow=5, scan_Ncol=5,
+        scan_script_targetshortname='bench', scan_script_off=(120.0, 60.0))
+    guidestars = [target_model.TargetData(ra=target_ra, dec=target_dec, dra=10.0+i, ddec=-20.0, dG=(5.0, -2.0), survey='Gaia DR2') for i in range(10)]
+    return {'target': target.to_dictionary(), 'guidestar': [guidestar.to_dictionary() for guidestar in guidestars]}
+
+
+def json_save_load():
+    import target_model
+    record = canned_record()
+    def save_and_load():
+        with open('save.json', 'w') as f:
+            f.write(json.dumps(record, indent=4))
+        with open('save.json') as f:
+            loaded = json.load(f)
+        target_model.TargetData.from_dictionary(loaded['target'])
+        [target_model.TargetData.from_dictionary(guidestar) for guidestar in loaded['guidestar']]
+    with offline():
+        return time_calls(save_and_load, 200)
+
+
+#Open a project of 500 targets
+def project_open():
+    import project_file
+    record = canned_record()
+    with offline():
+        project_file.write_project('targets.igrins', [record] * 500)
+        return time_calls(lambda: project_file.Project('targets.igrins').close(), 200)
+
+
+#Save a change to one target of a project of 500 targets
+def project_save():
+    import project_file
+    record = canned_record()
+    with offline():
+        project_file.write_project('targets.igrins', [record] * 500)
+        with project_file.Project('targets.igrins') as project:
+            changed = project.get('250')
+            def save():
+                changed['target']['PA'] = repr(float(changed['target']['PA']) + 1.0)
+                project.put('250', changed)
+            return time_calls(save, 200)
+
+
+def slitscan_scripts(write):
+    import planner_lib
+    scan_blocks = planner_lib.generate_slitscan_blocks(5.0, -2.0, nrows=5, ncols=5)
+    scripts = lambda: planner_lib.iterate_slitscan_scripts(scan_blocks, 45.0, 'bench', 120.0, 60.0)
+    if not write:
+        return time_calls(lambda: planner_lib.generate_slitscan_scripts(scan_blocks, 45.0, 'bench', 120.0, 60.0), 50)
+    with offline() as temporary_directory:
+        return time_calls(lambda: planner_lib.write_slitscan_scripts(scripts(), temporary_directory), 20)
+
+
+#Name: (function returning (seconds, slow modules imported) or None to skip, limit in seconds or None for no limit)
+benchmarks = {
+    'startup_planning_modules': (startup_planning_modules, startup_seconds),
+    'startup_cli': (startup_cli, startup_seconds),
+    'startup_gui': (startup_gui, startup_seconds),
+    'slitscan_blocks_1x1': (lambda: slitscan_blocks(1, 1), None),
+    'slitscan_blocks_3x3': (lambda: slitscan_blocks(3, 3), None),
+    'slitscan_blocks_10x10': (lambda: slitscan_blocks(10, 10), None),
+    'slitscan_blocks_30x30': (lambda: slitscan_blocks(30, 30), None),
+    'create_region': (lambda: create_region(False), None),
+    'create_region_slitscan': (lambda: create_region(True), None),
+    'create_region_cached': (lambda: create_region(False, cached=True), None),
+    'search_for_guide_stars_2mass': (lambda: search_for_guide_stars('2MASS K-band'), None),
+    'search_for_guide_stars_gaia': (lambda: search_for_guide_stars('Gaia DR2'), None),
+    'sex2deg_1000': (sex2deg, None),
+    'deg2sex_1000': (deg2sex, None),
+    'sex2deg_array_10000': (sex2deg_array, None),
+    'deg2sex_array_10000': (deg2sex_array, None),
+    'json_save_load': (json_save_load, None),
+    'project_open': (project_open, None),
+    'project_save': (project_save, None),
+    'slitscan_scripts_generate': (lambda: slitscan_scripts(False), None),
+    'slitscan_scripts_write': (lambda: slitscan_scripts(True), None),
+}
+
+
+#Read the baseline, a dictionary of benchmark name: median seconds, empty if there isn't one
+def read_baseline(filename=baseline_filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+#Keep the medians of results as the baseline, replacing the benchmarks that were run and keeping the others
+def save_baseline(results, filename=baseline_filename):
+    baseline = read_baseline(filename)
+    baseline.update((result['name'], result['median']) for result in results)
+    directory = os.path.dirname(filename)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+
+
+#Run a benchmark repeats times, returns a dictionary of the results, or None if it was skipped
+#If baseline (a dictionary from read_baseline) has the benchmark, the results say if it is a regression
+def run_benchmark(name, repeats=repeats, baseline=None, tolerance=tolerance):
+    function, limit = benchmarks[name]
+    times = []
+    imported = set()
+    for i in range(repeats):
+        result = function()
+        if result is None:
+            return None
+        times.append(result[0])
+        imported.update(result[1])
+    times.sort()
+    median = times[len(times) // 2]
+    baseline_median = None if baseline is None else baseline.get(name)
+    regression = baseline_median is not None and median > tolerance * baseline_median
+    return {'name': name, 'median': median, 'min': times[0], 'limit': limit, 'slow_imports': sorted(imported), 'baseline': baseline_median,
+        'regression': regression, 'ok': (limit is None or median <= limit) and len(imported) == 0 and not regression}
+
+
+#Line describing a benchmark's results
+def format_result(result):
+    notes = []
+    if result['limit'] is not None:
+        notes.append('limit %.2f s' % result['limit'])
+    if result['baseline'] is not None:
+        notes.append('baseline %s, %.2fx' % (format_seconds(result['baseline']), result['median'] / result['baseline']))
+    return '%-30s %12s (min %s%s)%s%s%s' % (result['name'], format_seconds(result['median']), format_seconds(result['min']),
+        ''.join(', '+note for note in notes), '' if len(result['slow_imports']) == 0 else '  imports '+', '.join(result['slow_imports']),
+        '  REGRESSION' if result['regression'] else '', '' if result['ok'] else '  FAILED')
+
+
+def format_seconds(seconds):
+    if seconds >= 0.1:
+        return '%.3f s' % seconds
+    if seconds >= 1e-4:
+        return '%.3f ms' % (seconds * 1e3)
+    return '%.3f us' % (seconds * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the IGRINS Observing Planner benchmarks.')
+    parser.add_argument('names', nargs='*', help='Only run benchmarks with one of these in their name')
+    parser.add_argument('--repeats', '-r', type=int, default=repeats, help='Times to run each benchmark')
+    parser.add_argument('--json', action='store_true', help='Write the results as JSON lines')
+    parser.add_argument('--baseline', default=baseline_filename, help='Baseline file to compare to (default '+baseline_filename+')')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the baseline instead of comparing to it')
+    parser.add_argument('--tolerance', type=float, default=tolerance, help='Flag a regression if a median is more than this times the baseline')
+    args = parser.parse_args(argv)
+    baseline = None if args.save_baseline else read_baseline(args.baseline)
+    results = []
+    n_failed = 0
+    for name in benchmarks:
+        if len(args.names) > 0 and not any(part in name for part in args.names):
+            continue
+        result = run_benchmark(name, repeats=args.repeats, baseline=baseline, tolerance=args.tolerance)
+        if result is None:
+            print(json.dumps({'name': name, 'skipped': True}) if args.json else '%-30s skipped' % name)
+            continue
+        results.append(result)
+        n_failed += not result['ok']
+        print(json.dumps(result) if args.json else format_result(result))
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        if not args.json:
+            print('Saved the baseline for '+str(len(results))+' benchmarks to '+args.baseline)
+    return 1 if n_failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
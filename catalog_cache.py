@@ -0,0 +1,164 @@
+#On-disk cache of guide star catalog queries, so searching the same (or an overlapping) field again does not need the network
+#
+#The sky is split into tiles: bands in Dec. of tile_size degrees, each split in RA into bins about tile_size degrees wide
+#(so tiles are roughly equal area).  Each tile is stored as a tab seperated value file in the same format DS9 exports
+#catalogs in (header line then one line per star), under a directory for each catalog and magnitude limit.
+#A tile file only exists if the whole tile was covered by a query, so a search is answered from the cache only
+#if every tile it touches is cached.  When the cache gets bigger than max_bytes the least recently used tiles are removed.
+
+import os
+import math
+
+
+#Check if catalog lines (e.g. read from a catalog exported by DS9) start with the header line of column names, a query that
+#failed exports nothing (or DS9 leaves the file from an earlier query, which is why it should be removed before exporting)
+def has_header(lines):
+    if len(lines) == 0 or lines[0].strip() == '':
+        return False
+    try:
+        float(lines[0].split('\t', 1)[0])
+    except ValueError:
+        return True
+    return False #Starts with a star
+
+
+class CatalogCache:
+    def __init__(self, directory, max_bytes=100e6, tile_size=0.025):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size #Size of tiles in degrees (0.025 deg = 1.5 arcmin)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.n_bytes = self.size() #Running total of the size of the tiles, so the tile files are only all looked at here and in evict()
+
+    #Number of tiles in RA for a given Dec. band
+    def n_ra_tiles(self, band):
+        n_bands = int(math.ceil(180.0 / self.tile_size))
+        dec_center = -90.0 + (band + 0.5) * 180.0 / n_bands
+        return max(1, int(360.0 * math.cos(math.radians(dec_center)) / self.tile_size))
+
+    def dec_band(self, dec):
+        n_bands = int(math.ceil(180.0 / self.tile_size))
+        return min(n_bands - 1, max(0, int((dec + 90.0) / (180.0 / n_bands))))
+
+    #Return the (ra_min, ra_max, dec_min, dec_max) edges of a tile in degrees
+    def tile_box(self, band, i):
+        n_bands = int(math.ceil(180.0 / self.tile_size))
+        n_ra = self.n_ra_tiles(band)
+        return (i * 360.0 / n_ra, (i + 1) * 360.0 / n_ra, -90.0 + band * 180.0 / n_bands, -90.0 + (band + 1) * 180.0 / n_bands)
+
+    #Return the list of (band, i) tiles that overlap a box in RA and Dec. (degrees), or None if the box wraps around RA = 0
+    def tiles_for_box(self, ra_min, ra_max, dec_min, dec_max):
+        if ra_min < 0.0 or ra_max >= 360.0 or ra_min > ra_max:
+            return None
+        tiles = []
+        for band in range(self.dec_band(dec_min), self.dec_band(dec_max) + 1):
+            n_ra = self.n_ra_tiles(band)
+            for i in range(int(ra_min / 360.0 * n_ra), min(n_ra - 1, int(ra_max / 360.0 * n_ra)) + 1):
+                tiles.append((band, i))
+        return tiles
+
+    #Return the box covering all the tiles that overlap a box, this is what should be queried to fill the cache for that box
+    def covering_box(self, ra_min, ra_max, dec_min, dec_max):
+        tiles = self.tiles_for_box(ra_min, ra_max, dec_min, dec_max)
+        if tiles is None:
+            return None
+        boxes = [self.tile_box(band, i) for band, i in tiles]
+        return (min(box[0] for box in boxes), max(box[1] for box in boxes), min(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    def namespace_directory(self, catalog, mag_limit):
+        return os.path.join(self.directory, catalog.replace(' ', '_') + '_' + ('%.2f' % float(mag_limit)))
+
+    def tile_filename(self, catalog, mag_limit, band, i):
+        return os.path.join(self.namespace_directory(catalog, mag_limit), '%05i_%05i.tsv' % (band, i))
+
+    #Look up the catalog lines (header first) for stars inside a box, returns None if any part of the box is not cached
+    #Lines are in no particular order
+    def lookup(self, catalog, mag_limit, ra_min, ra_max, dec_min, dec_max):
+        tiles = self.tiles_for_box(ra_min, ra_max, dec_min, dec_max)
+        if tiles is None:
+            self.misses += 1
+            return None
+        filenames = [self.tile_filename(catalog, mag_limit, band, i) for band, i in tiles]
+        if not all(os.path.exists(filename) for filename in filenames):
+            self.misses += 1
+            return None
+        header = None
+        lines = []
+        for filename in filenames:
+            with open(filename) as f:
+                tile_lines = f.readlines()
+            os.utime(filename) #Mark tile as recently used
+            if len(tile_lines) == 0:
+                continue
+            header = tile_lines[0]
+            for line in tile_lines[1:]:
+                ra, dec = line.split('\t', 2)[0:2]
+                if ra_min <= float(ra) <= ra_max and dec_min <= float(dec) <= dec_max:
+                    lines.append(line)
+        self.hits += 1
+        if header is None: #Only empty tiles
+            return []
+        return [header] + lines
+
+    #Store the catalog lines (header first, as exported by DS9) from a query of a box, every tile fully inside the box gets cached
+    #Raises ValueError if lines doesn't start with a header line, since that is not an answer from the catalog (e.g. a failed query)
+    def store(self, catalog, mag_limit, lines, ra_min, ra_max, dec_min, dec_max):
+        if not has_header(lines):
+            raise ValueError('Catalog lines to cache have no header line')
+        tiles = self.tiles_for_box(ra_min, ra_max, dec_min, dec_max)
+        if tiles is None:
+            return
+        directory = self.namespace_directory(catalog, mag_limit)
+        os.makedirs(directory, exist_ok=True)
+        header = lines[0]
+        stars = []
+        for line in lines[1:]:
+            if line.strip() == '':
+                continue
+            ra, dec = line.split('\t', 2)[0:2]
+            stars.append((float(ra), float(dec), line if line.endswith('\n') else line + '\n'))
+        for band, i in tiles:
+            tile_ra_min, tile_ra_max, tile_dec_min, tile_dec_max = self.tile_box(band, i)
+            if tile_ra_min < ra_min or tile_ra_max > ra_max or tile_dec_min < dec_min or tile_dec_max > dec_max:
+                continue #Tile only partly covered by the query
+            tile_lines = [star[2] for star in stars if tile_ra_min <= star[0] < tile_ra_max and tile_dec_min <= star[1] < tile_dec_max]
+            filename = self.tile_filename(catalog, mag_limit, band, i)
+            if os.path.exists(filename): #Replacing a tile
+                self.n_bytes -= os.path.getsize(filename)
+            with open(filename, 'w') as f:
+                f.write(header if header.endswith('\n') else header + '\n')
+                f.writelines(tile_lines)
+                self.n_bytes += f.tell()
+        if self.n_bytes > self.max_bytes:
+            self.evict()
+
+    #Total size of the cache in bytes, from every tile file (stats() has the running total)
+    def size(self):
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for filename in files:
+                total += os.path.getsize(os.path.join(root, filename))
+        return total
+
+    #Remove least recently used tiles until the cache is under max_bytes
+    def evict(self):
+        tiles = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                tiles.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        tiles.sort()
+        for mtime, size, path in tiles:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+        self.n_bytes = total
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.n_bytes}
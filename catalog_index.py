@@ -0,0 +1,176 @@
+#Local spatial index of a guide star catalog (e.g. an extract of Gaia or 2MASS), so guide stars can be found without the network
+#
+#Stars are split into zones: bands in Dec. of zone_height degrees.  Inside each zone stars are sorted by RA, so a box
+#query only needs a binary search in RA for each zone it touches.  The index is saved as a directory of .npy files that
+#are memory-mapped when loaded, so opening even a large catalog is quick and only the zones queried are read from disk.
+#
+#Build an index from a catalog file (CSV, tab seperated like the catalogs DS9 exports, FITS or Parquet) with:
+#   python catalog_index.py gaia_extract.csv gaia_index/ --ra ra --dec dec --mag phot_rp_mean_mag --pmra pmra --pmdec pmdec
+#and then set ds9_lib.guide_star_index_directories['Gaia DR2'] = 'gaia_index/' to have search_for_guide_stars use it.
+
+import os
+import json
+import argparse
+import numpy as np
+
+
+columns = ('ra', 'dec', 'mag', 'pmra', 'pmdec')
+
+
+class CatalogIndex:
+    def __init__(self, ra, dec, mag, pmra=None, pmdec=None, zone_height=0.05, survey='', presorted=False, zone_start=None):
+        self.zone_height = zone_height #Height of zones in Dec. in degrees
+        self.n_zones = int(np.ceil(180.0 / zone_height))
+        self.survey = survey
+        ra = np.asarray(ra, dtype=float)
+        dec = np.asarray(dec, dtype=float)
+        mag = np.asarray(mag, dtype=float)
+        pmra = np.zeros(len(ra)) if pmra is None else np.asarray(pmra, dtype=float) #Proper motions in mas/yr
+        pmdec = np.zeros(len(ra)) if pmdec is None else np.asarray(pmdec, dtype=float)
+        if not presorted: #Sort stars by zone then RA
+            ra = ra % 360.0
+            zone = self.zone(dec)
+            order = np.lexsort((ra, zone))
+            ra, dec, mag, pmra, pmdec = ra[order], dec[order], mag[order], pmra[order], pmdec[order]
+            zone_start = np.searchsorted(zone[order], np.arange(self.n_zones + 1))
+        self.ra = ra
+        self.dec = dec
+        self.mag = mag
+        self.pmra = pmra
+        self.pmdec = pmdec
+        self.zone_start = zone_start #Stars in zone z are ra[zone_start[z]:zone_start[z+1]]
+
+    def __len__(self):
+        return len(self.ra)
+
+    def zone(self, dec):
+        return np.clip(((np.asarray(dec) + 90.0) / self.zone_height).astype(int), 0, self.n_zones - 1)
+
+    #Save index to a directory of .npy files
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for column in columns:
+            np.save(os.path.join(directory, column + '.npy'), getattr(self, column))
+        np.save(os.path.join(directory, 'zone_start.npy'), self.zone_start)
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({'zone_height': self.zone_height, 'survey': self.survey, 'n_stars': len(self)}, f)
+
+    #Load an index saved with save(), the arrays are memory-mapped
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'index.json')) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, column + '.npy'), mmap_mode='r') for column in columns]
+        zone_start = np.load(os.path.join(directory, 'zone_start.npy'))
+        return cls(*arrays, zone_height=meta['zone_height'], survey=meta['survey'], presorted=True, zone_start=zone_start)
+
+    #Return indices of stars inside a box in RA and Dec. (degrees) brighter than mag_limit, boxes can wrap around RA = 0
+    def box(self, ra_min, ra_max, dec_min, dec_max, mag_limit=None):
+        if ra_max - ra_min >= 360.0: #Whole circle in RA
+            ra_ranges = [(0.0, 360.0)]
+        else:
+            width = (ra_max - ra_min) % 360.0 if ra_max < ra_min else ra_max - ra_min #ra_max < ra_min also means the box wraps
+            ra_min = ra_min % 360.0
+            ra_max = ra_min + width
+            if ra_max > 360.0: #Box wraps around RA = 0
+                ra_ranges = [(ra_min, 360.0), (0.0, ra_max - 360.0)]
+            else:
+                ra_ranges = [(ra_min, ra_max)]
+        slices = []
+        for z in range(int(self.zone(dec_min)), int(self.zone(dec_max)) + 1):
+            start, end = int(self.zone_start[z]), int(self.zone_start[z + 1])
+            if start == end:
+                continue
+            zone_ra = self.ra[start:end]
+            for low, high in ra_ranges:
+                i = np.searchsorted(zone_ra, low, side='left')
+                j = np.searchsorted(zone_ra, high, side='right')
+                if j > i:
+                    slices.append(np.arange(start + i, start + j))
+        if len(slices) == 0:
+            return np.zeros(0, dtype=int)
+        indices = np.concatenate(slices)
+        dec = self.dec[indices]
+        keep = (dec >= dec_min) & (dec <= dec_max)
+        if mag_limit is not None:
+            keep &= self.mag[indices] <= mag_limit
+        return indices[keep]
+
+    #Return indices of stars within radius (degrees) of a position brighter than mag_limit
+    def cone(self, ra, dec, radius, mag_limit=None):
+        dec_min, dec_max = max(dec - radius, -90.0), min(dec + radius, 90.0)
+        if dec_min <= -90.0 or dec_max >= 90.0 or radius >= 90.0: #Cone includes a pole
+            indices = self.box(0.0, 360.0, dec_min, dec_max, mag_limit=mag_limit)
+        else:
+            ra_radius = np.degrees(np.arcsin(min(1.0, np.sin(np.radians(radius)) / np.cos(np.radians(max(abs(dec_min), abs(dec_max)))))))
+            indices = self.box(ra - ra_radius, ra + ra_radius, dec_min, dec_max, mag_limit=mag_limit)
+        ra1, dec1 = np.radians(ra), np.radians(dec)
+        ra2, dec2 = np.radians(self.ra[indices]), np.radians(self.dec[indices])
+        separation = 2.0 * np.arcsin(np.sqrt(np.sin((dec2 - dec1) / 2.0)**2 + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2.0)**2)) #Haversine
+        return indices[np.degrees(separation) <= radius]
+
+    #Sort indices of stars from brightest to dimmest and keep the first k (stars without a magnitude go last)
+    def brightest(self, indices, k=None):
+        order = np.argsort(self.mag[indices], kind='stable')
+        if k is not None:
+            order = order[:k]
+        return indices[order]
+
+    #Return the RA, Dec., mag and proper motion arrays of stars, in the same form as ds9_lib.read_guide_star_catalog
+    def stars(self, indices):
+        return (np.array(self.ra[indices]), np.array(self.dec[indices]), np.array(self.mag[indices]),
+            np.array(self.pmra[indices]), np.array(self.pmdec[indices]))
+
+
+#Read the columns of a catalog file, columns are given by name or by number (0 is the first column)
+#Returns a dictionary of ra, dec, mag, pmra, pmdec arrays (pmra and pmdec are None if not given)
+def read_catalog_file(filename, ra=0, dec=1, mag=2, pmra=None, pmdec=None):
+    names = {'ra': ra, 'dec': dec, 'mag': mag, 'pmra': pmra, 'pmdec': pmdec}
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.fits', '.fit', '.fz'):
+        from astropy.table import Table
+        table = Table.read(filename)
+        get = lambda column: np.asarray(table[column] if isinstance(column, str) else table.columns[column], dtype=float)
+    elif extension in ('.parquet', '.pq'):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(filename)
+        get = lambda column: np.asarray((table.column(column) if isinstance(column, str) else table.column(int(column))).to_numpy(zero_copy_only=False), dtype=float)
+    else: #Comma or tab seperated text with a header line, like the catalogs DS9 exports
+        with open(filename) as f:
+            header = f.readline()
+        delimiter = ',' if extension == '.csv' else '\t'
+        header = [name.strip() for name in header.split(delimiter)]
+        usecols = [header.index(column) if isinstance(column, str) else column for column in names.values() if column is not None]
+        data = np.genfromtxt(filename, delimiter=delimiter, skip_header=1, usecols=usecols, ndmin=2, filling_values=np.nan)
+        get = lambda column: data[:, usecols.index(header.index(column) if isinstance(column, str) else column)]
+    return {key: (None if column is None else get(column)) for key, column in names.items()}
+
+
+#Build an index from a catalog file and save it to a directory
+def build_index(filename, directory, ra=0, dec=1, mag=2, pmra=None, pmdec=None, zone_height=0.05, survey=''):
+    catalog = read_catalog_file(filename, ra=ra, dec=dec, mag=mag, pmra=pmra, pmdec=pmdec)
+    index = CatalogIndex(catalog['ra'], catalog['dec'], catalog['mag'], catalog['pmra'], catalog['pmdec'], zone_height=zone_height, survey=survey)
+    index.save(directory)
+    return index
+
+
+#Columns can be given on the command line as a name or a number
+def column_argument(value):
+    return int(value) if value.isdigit() else value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a local spatial index of a guide star catalog for the IGRINS Observing Planner.')
+    parser.add_argument('catalog', help='Catalog file (.csv, tab seperated .tsv/.dat, .fits or .parquet)')
+    parser.add_argument('directory', help='Directory to save the index in')
+    parser.add_argument('--ra', type=column_argument, default=0, help='RA column (degrees), name or number')
+    parser.add_argument('--dec', type=column_argument, default=1, help='Dec. column (degrees), name or number')
+    parser.add_argument('--mag', type=column_argument, default=2, help='Magnitude column used for the magnitude limit and sorting')
+    parser.add_argument('--pmra', type=column_argument, default=None, help='Proper motion in RA column (mas/yr)')
+    parser.add_argument('--pmdec', type=column_argument, default=None, help='Proper motion in Dec. column (mas/yr)')
+    parser.add_argument('--zone-height', type=float, default=0.05, help='Height of zones in Dec. (degrees)')
+    parser.add_argument('--survey', default='', help='Name of the survey, e.g. "Gaia DR2"')
+    args = parser.parse_args()
+    index = build_index(args.catalog, args.directory, ra=args.ra, dec=args.dec, mag=args.mag, pmra=args.pmra, pmdec=args.pmdec,
+        zone_height=args.zone_height, survey=args.survey)
+    print('Indexed', len(index), 'stars into', args.directory)
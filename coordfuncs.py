@@ -1,26 +1,44 @@
 #This library is for handling astronomical positions, RA, Dec, longitude, latitude, etc.
 
 #Import python libraries
-from pdb import set_trace as stop #Use stop() for debugging
+import sys
+import types
 #from scipy import *
-from numpy import * #Import numpy
+import numpy as np
+#Same names as "from numpy import *" (which this and the modules that import * from it use) but without numpy's submodules
+#(testing, f2py, random, ma, ...), which numpy otherwise only loads when they are used and were most of the import time
+globals().update({name: value for name, value in vars(np).items() if name in np.__all__ and not isinstance(value, types.ModuleType)})
 import urllib
 from six import string_types
 
 
-try:
-    from astroquery.simbad import Simbad
-    astroquery_import = True
-except ImportError:
-    astroquery_import = False
-    print('\n\nWARNING! astroquery not found! Falling back to urllib! ')
-    print('This is less reliable for parsing object name --> ra/dec!\n\n')
+#Use stop() for debugging, pdb is only imported when it is used
+def stop():
+    import pdb
+    pdb.Pdb().set_trace(sys._getframe().f_back)
+
+
+astroquery_import = None #If astroquery could be imported, only checked the first time a name is looked up since importing it is slow
+Simbad = None
+
+#Import astroquery's Simbad the first time it is needed, returns False if astroquery is missing
+def import_astroquery():
+    global astroquery_import, Simbad
+    if astroquery_import is None:
+        try:
+            from astroquery.simbad import Simbad
+            astroquery_import = True
+        except ImportError:
+            astroquery_import = False
+            print('\n\nWARNING! astroquery not found! Falling back to urllib! ')
+            print('This is less reliable for parsing object name --> ra/dec!\n\n')
+    return astroquery_import
 
 #Grab RA and Dec of object by looking up it's name
 #This function is a modified copy of https://gist.github.com/juandesant/5163782#file-sesame-py-L18
 def name_query(target_name):
     # target_name is a variable containing a source name, such as M31, Alpha Centauri, Sag A*, etc
-    if astroquery_import:
+    if import_astroquery():
         data = Simbad.query_object(target_name)
         ra = data['ra'].item()
         dec = data['dec'].item()
@@ -122,6 +140,54 @@ def deg2sex(input, precision=1, sign='', units='dms'):
     sexagesimal = fmt % (int(x), round(m)) #Save sexagesimal output string
   return sign + sexagesimal #Return sign (+/-) plus sexagesimal output s tring
 
+#Convert an array (or list) of sexigasimal strings to an array of decimal degrees all at once, need to speficy units as hours 'hms' or degrees 'dms'
+#Accepts the same formats as sex2deg and gives the same results, but joins all the strings together so each step is done once for all of them
+sex2deg_delimiters = {'+':None, 's':None, 'h':':', 'd':':', 'm':':', ' ':':'} #Get rid of plus signs and seconds, and set all delimiters to :
+def sex2deg_array(inputs, units='dms'):
+  if not isinstance(inputs, list):
+    inputs = [str(input) for input in inputs]
+  n = len(inputs)
+  if n == 0:
+    return zeros(0)
+  text = ('\n'.join(inputs).lower().translate(str.maketrans(sex2deg_delimiters)) + '\n').replace(':\n', ':0\n') #Set seconds to zero if user does not input seconds
+  if text.count(':') != 2*n or text.count('\n') != n:
+    raise ValueError('Not all coordinates are in the format "xx:xx:xx.x" "xx xx xx.x"  "xxhxxmxx.xs" or "xxHxxMxx.xS"')
+  x, m, s = array(text.replace('\n', ':').split(':')[:-1], dtype=float).reshape(n, 3).T #Split up degrees/hours, minutes, seconds into x,m,s
+  characters = np.frombuffer(text.encode(), dtype=uint8)
+  line_starts = concatenate([[0], flatnonzero(characters == ord('\n'))[:-1] + 1])
+  negative = characters[line_starts] == ord('-') #Check sign on the string so -00 is read as negative
+  deg = abs(x) + (m/60.0) + (s/3600.0) #Convert sexigasimal units to degrees
+  deg = where(negative, -deg, deg)
+  units = units.lower()
+  if units == 'hms' or units == 'h' or units == 'hour' or units == 'hr' or units == 'hours': #If units in hours, multipy by 15 to convert to degrees
+    deg = deg * 15.0
+  return deg
+
+#Convert an array of decimal degrees (or hours) to an array of sexagesimal strings all at once, same output as deg2sex
+def deg2sex_array(inputs, precision=1, sign='', units='dms'):
+  x = np.asarray(inputs, dtype=float)
+  signs = where(x < 0.0, '-', sign) #Make everything positive, but show sign as negative
+  x = abs(x)
+  m = (x % 1.0)*60.0 #Minutes
+  s = (m % 1.0)*60.0 #Seconds
+  fractional_s = np.round((s % 1.0)*10.0**precision) #fraction of seconds in precision number to decimal places
+  carry = fractional_s >= 10**precision #catch rounding issues and correct them, carrying up to seconds, minutes, and degrees/hours
+  fractional_s = where(carry, 0.0, fractional_s)
+  s = where(carry, s + 1.0, s)
+  carry = carry & (s >= 60.0)
+  s = where(carry, 0.0, s)
+  m = where(carry, m + 1.0, m)
+  carry = carry & (m >= 60.0)
+  m = where(carry, 0.0, m)
+  x = where(carry, x + 1.0, x)
+  if units == 'dm' or units == 'hm': #return everything in format "xx:xx", minutes rounded the same way as deg2sex (so can be 60)
+    return np.char.add(np.char.add(np.char.add(signs, np.char.zfill(x.astype(np.int64).astype(str), 2)), ':'),
+      np.char.zfill(np.round(m).astype(np.int64).astype(str), 2))
+  fields = [np.char.zfill(field.astype(np.int64).astype(str), 2) for field in (x, m, s)]
+  sexagesimal = np.char.add(np.char.add(np.char.add(np.char.add(fields[0], ':'), fields[1]), ':'), fields[2])
+  sexagesimal = np.char.add(np.char.add(sexagesimal, '.'), np.char.zfill(fractional_s.astype(np.int64).astype(str), int(precision)))
+  return np.char.add(signs, sexagesimal) #Return sign (+/-) plus sexagesimal output strings
+
 #Reads in two instances of the coordinate class storing RA and Dec., for two objects,
 #and calculates the angular seperation between the two
 #Formula can be seen at http://www.astronomycafe.net/qadir/q1890.html
@@ -165,9 +231,10 @@ def dec_seperation(obj1, obj2, units='deg'):
 	
 
 #Calculate altitude of target in the sky given target coords, observer location, and Local Siderial Time (LST)
+#LST is a sexagesimal string in hours or a number of hours, see observability.py for many targets and times at once
 def alt(tar, loc, LST):
   if isinstance(LST, string_types):
-    LST_deg = sex2deg(LST) #Convert local siderial time into degrees
+    LST_deg = sex2deg(LST, units='hms') #Convert local siderial time into degrees
   else:
     LST_deg = LST * 15.0
   sin_lat = loc.lat.sin()
@@ -177,15 +244,22 @@ def alt(tar, loc, LST):
   cos_HA = cos(radians(LST_deg - tar.ra.deg()))
   return degrees(arcsin(sin_lat*sin_dec + cos_lat*cos_dec*cos_HA)) #Equation from http://koti.mbnet.fi/jukaukor/Star_altitude_azimuth.pdf
 
-#Calculate azimuth of target in the sky given target coords, observer location, and Local Siderial Time (LST)
+#Calculate azimuth (north through east) of target in the sky given target coords, observer location, and Local Siderial Time (LST)
 def az(tar, loc, LST):
+  if isinstance(LST, string_types):
+    LST_deg = sex2deg(LST, units='hms') #Convert local siderial time into degrees
+  else:
+    LST_deg = LST * 15.0
   sin_lat = loc.lat.sin()
   sin_dec = tar.dec.sin()
   cos_lat = loc.lat.cos()
-  alt = alt(tar,loc,LST) #grab altiude in degrees
-  sin_alt = sin(radians(alt))
-  cos_alt = cos(radians(alt))
-  return degrees(arccos((sin_dec-sin_lat*sin_alt)/(cos_lat*cos_alt))) #Equation from http://koti.mbnet.fi/jukaukor/Star_altitude_azimuth.pdf  
+  altitude = alt(tar,loc,LST) #grab altiude in degrees (named so it doesn't hide the alt function)
+  sin_alt = sin(radians(altitude))
+  cos_alt = cos(radians(altitude))
+  azimuth = degrees(arccos(clip((sin_dec-sin_lat*sin_alt)/(cos_lat*cos_alt), -1.0, 1.0))) #Equation from http://koti.mbnet.fi/jukaukor/Star_altitude_azimuth.pdf
+  if sin(radians(LST_deg - tar.ra.deg())) > 0: #West of the meridian, arccos only gives the angle from north
+    azimuth = 360.0 - azimuth
+  return azimuth
 
 #Basic class for angles that will be used, parent class of latitude and longitude
 class angle:
@@ -284,3 +358,77 @@ class location():
     else:
       sign = '+'
     return self.lon.hms() + ' ' + sign + self.lat.dms()
+
+
+#Same as the angle class but stores an array of angles, the angle limits are checked once when it is made instead of on every access
+class angle_array(angle):
+  def __init__(self, input_angles, precision=2):
+    self.theta = array(input_angles, dtype=float)
+    self.precision = precision
+    self.limit_angles()
+  def limit_angles(self):
+    pass
+  def check_angle_limit(self): #Already checked when made
+    pass
+  def __len__(self):
+    return len(self.theta)
+  def dms(self):
+    return deg2sex_array(self.theta, units='dms', precision=self.precision)
+  def hms(self):
+    return deg2sex_array(self.hour(), precision=self.precision, units='hms')
+  def dm(self):
+    return deg2sex_array(self.theta, units='dm')
+  def hm(self):
+    return deg2sex_array(self.hour(), units='hm')
+
+#Array version of the latitude class, angles outside +/- 90 degrees are set to nan
+class latitude_array(angle_array):
+  def limit_angles(self):
+    out_of_range = abs(self.theta) > 90.0
+    if any(out_of_range):
+      print('ERROR: '+str(count_nonzero(out_of_range))+' latitude angle(s) > 90 degrees or < -90 degrees')
+      self.theta[out_of_range] = nan
+
+#Array version of the longitude class, angles are wrapped to 0 -> 360 degrees
+class longitude_array(angle_array):
+  def __init__(self, input_angles, units='deg', precision=2):
+    angle_array.__init__(self, input_angles, precision=precision)
+    if units == 'hms' or units == 'h' or units == 'hour' or units == 'hr' or units == 'hours': #If units in hours, multipy by 15 to convert to degrees
+      self.theta = self.theta * 15.0
+      self.limit_angles()
+  def limit_angles(self):
+    self.theta = where((self.theta > 360.0) | (self.theta < 0.0), self.theta % 360.0, self.theta)
+
+##Stores the RA and Dec. of many objects as arrays, use instead of a list of coords objects when dealing with lots of targets or catalog rows
+#Accessed the same way as the coords class, e.g. coords_array.ra.deg(), coords_array.dec.dms(), coords_array.showcoords() but returning arrays,
+#and can be used with angular_seperation, ra_seperation, dec_seperation, and alt
+class coords_array():
+  def __init__(self, input_ra=[], input_dec=[]):
+    input_ra = np.asarray(input_ra)
+    input_dec = np.asarray(input_dec)
+    if input_ra.dtype.kind in ('U', 'S', 'O'): #If units sexigasimal, convert to decimal degrees
+      [input_ra, input_dec] = [sex2deg_array(input_ra, units='hms'), sex2deg_array(input_dec, units='dms')]
+    self.ra = longitude_array(input_ra, precision=3) #Create RA object
+    self.dec = latitude_array(input_dec, precision=2) #Create Dec. object
+  def __len__(self):
+    return len(self.ra)
+  def __getitem__(self, index): #Returns a coords object for a single index, or a coords_array for a slice or mask
+    if isinstance(index, (int, integer)):
+      return coords(self.ra.theta[index], self.dec.theta[index])
+    return coords_array(self.ra.theta[index], self.dec.theta[index])
+  def showcoords(self): #Array of coordinates in sexigasimal units as strings
+    sign = where(self.dec.deg() < 0, '', '+') #Set sign to +/- for the declination
+    return np.char.add(np.char.add(np.char.add(self.ra.hms(), ' '), sign), self.dec.dms())
+
+#Make a coords_array from a list of sexigasimal coordinate strings, the array version of coord_query
+def coord_query_array(input_coords):
+  fields = ' '.join(input_coords).split(' ')
+  if len(fields) == 2*len(input_coords): #format for something like XX:XX:XX.XXX +XX:XX:XX.XX
+    ra, dec = fields[0::2], fields[1::2]
+  elif len(fields) == 6*len(input_coords): #format for something like XX XX XX.XX +XX XX XX.X
+    ra = [':'.join(fields[i:i+3]) for i in range(0, len(fields), 6)]
+    dec = [':'.join(fields[i+3:i+6]) for i in range(0, len(fields), 6)]
+  else: #Mixed formats, fall back on doing them one at a time
+    objs = [coord_query(input_coord) for input_coord in input_coords]
+    return coords_array([obj.ra.deg() for obj in objs], [obj.dec.deg() for obj in objs])
+  return coords_array(ra, dec)
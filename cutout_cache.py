@@ -0,0 +1,176 @@
+#On-disk cache of finder chart images, so making a finder chart again for the same (or a smaller) field does not need the network
+#
+#Each image is a FITS file saved from DS9 after it was retrieved from SkyView or the STScI DSS server.  The survey, center,
+#FOV and number of pixels are in the file name, so the cache needs no seperate index.  A request is answered by
+#  - an exact hit: an image with the same survey, center, FOV and pixels, loaded as is
+#  - a crop: a larger image of the same survey that covers the whole requested field with fine enough pixels, cut down
+#    locally to the requested field (needs astropy) and then kept in the cache as its own image
+#An image saved from DS9 only goes in the cache (add) if its WCS shows it is the field asked for, since when the image server
+#fails DS9 still has (and saves) the image of the last field.
+#When the cache gets bigger than max_bytes the least recently used images are removed.
+
+import os
+import math
+
+
+#Pixel scale (arcsec) of the original survey images, resampling finer than this does not show anything new
+native_pixel_scale = {
+    '2MASS K-band': 1.0,
+    'POSS2 IR': 1.0,
+}
+field_tolerance = 0.05 #How far off (as a fraction of the FOV) the center and size of an image saved from DS9 can be from the field asked for
+
+
+class CutoutCache:
+    def __init__(self, directory, max_bytes=500e6):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.crops = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    #File name for an image, survey, center (degrees), FOV (arcmin) and pixels on a side (0 if the server picks)
+    def filename(self, survey, ra, dec, fov, pixels=0):
+        return os.path.join(self.directory, '%s_%.6f_%+.6f_%.3f_%i.fits' % (survey.replace(' ', '~').replace('_', '~'), ra, dec, float(fov), pixels or 0))
+
+    #Return a list of (survey, ra, dec, fov, pixels, path) for every image in the cache
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.fits'):
+                continue
+            try:
+                survey, ra, dec, fov, pixels = name[:-len('.fits')].split('_')
+                entries.append((survey.replace('~', ' '), float(ra), float(dec), float(fov), int(pixels), os.path.join(self.directory, name)))
+            except ValueError: #Not a file made by the cache
+                continue
+        return entries
+
+    #Pixel scale in arcsec of an image, assuming about 1 arcsec when the server picks the number of pixels
+    def pixel_scale(self, survey, fov, pixels):
+        if not pixels:
+            return native_pixel_scale.get(survey, 1.0)
+        return 60.0 * float(fov) / pixels
+
+    #Check if an image centered on ra0, dec0 with FOV fov0 covers the whole field centered on ra, dec with FOV fov
+    def covers(self, ra0, dec0, fov0, ra, dec, fov):
+        dra = ((ra - ra0 + 180.0) % 360.0 - 180.0) * math.cos(math.radians(dec0)) * 60.0 #Offsets in arcmin
+        ddec = (dec - dec0) * 60.0
+        slack = 1e-4 #arcmin, centers in file names are rounded to 1e-6 degrees so a field cropped before needs a little room to cover itself
+        return abs(dra) + fov / 2.0 <= fov0 / 2.0 + slack and abs(ddec) + fov / 2.0 <= fov0 / 2.0 + slack
+
+    #Return the path to a cached image for the requested field (cropping a larger cached image if needed), or None on a miss
+    def lookup(self, survey, ra, dec, fov, pixels=0):
+        fov = round(float(fov), 3)
+        path = self.filename(survey, ra, dec, fov, pixels)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            os.utime(path) #Mark image as recently used
+            self.hits += 1
+            return path
+        #Pixels of the image to crop from need to be at least as fine as requested, or as fine as the survey itself is
+        needed_pixel_scale = max(self.pixel_scale(survey, fov, pixels), native_pixel_scale.get(survey, 0.0)) * 1.001
+        candidates = [entry for entry in self.entries() if entry[0] == survey and entry[3] >= fov
+            and self.pixel_scale(survey, entry[3], entry[4]) <= needed_pixel_scale and self.covers(entry[1], entry[2], entry[3], ra, dec, fov)]
+        for entry in sorted(candidates, key=lambda entry: entry[3]): #Crop from the smallest image that covers the field
+            os.utime(entry[5])
+            if entry[3] == fov and self.filename(survey, ra, dec, fov, entry[4]) == entry[5]: #Same field cropped before
+                self.hits += 1
+                return entry[5]
+            try:
+                path = self.crop(entry[5], survey, ra, dec, fov)
+            except ImportError: #No astropy so can't crop
+                break
+            except Exception as e: #E.g. an incomplete image or a WCS astropy can't read (like DSS plate solutions), try the next one
+                print('Could not crop cached image ' + entry[5] + ': ' + str(e))
+                continue
+            self.crops += 1
+            self.evict()
+            return path
+        self.misses += 1
+        self.evict() #Make room for the image about to be retrieved
+        return None
+
+    #Put an image DS9 saved to path (e.g. filename() + '.tmp') in the cache as the field centered on ra, dec with FOV fov (arcmin)
+    #Returns the path to the image in the cache, or None if it is not that field (or can't be checked without astropy) and was deleted
+    def add(self, path, survey, ra, dec, fov, pixels=0):
+        if not os.path.exists(path):
+            return None
+        try:
+            matches = self.matches(path, ra, dec, fov)
+        except ImportError: #No astropy so can't check it
+            matches = False
+        except Exception as e: #E.g. an incomplete image or a WCS astropy can't read
+            print('Could not check image saved from DS9 ' + path + ': ' + str(e))
+            matches = False
+        if not matches:
+            os.remove(path)
+            return None
+        output_path = self.filename(survey, ra, dec, fov, pixels)
+        os.replace(path, output_path)
+        self.evict()
+        return output_path
+
+    #Check if the WCS of a FITS image shows it is centered on ra, dec (degrees) with a FOV of fov (arcmin), within field_tolerance
+    def matches(self, path, ra, dec, fov):
+        from astropy.io import fits
+        from astropy.wcs import WCS
+        from astropy.wcs.utils import proj_plane_pixel_scales
+        with fits.open(path) as hdulist:
+            header = hdulist[0].header
+            wcs = WCS(header).celestial
+            if not wcs.has_celestial:
+                return False
+            nx, ny = header['NAXIS1'], header['NAXIS2']
+        center_ra, center_dec = wcs.all_pix2world((nx - 1) / 2.0, (ny - 1) / 2.0, 0)
+        width, height = proj_plane_pixel_scales(wcs) * 60.0 * [nx, ny] #arcmin
+        dra = ((float(center_ra) - ra + 180.0) % 360.0 - 180.0) * math.cos(math.radians(dec)) * 60.0 #Offsets in arcmin
+        ddec = (float(center_dec) - dec) * 60.0
+        fov = float(fov)
+        return math.hypot(dra, ddec) <= field_tolerance * fov and abs(width - fov) <= field_tolerance * fov and abs(height - fov) <= field_tolerance * fov
+
+    #Cut the field centered on ra, dec with FOV fov (arcmin) out of a cached FITS image and save it in the cache
+    #Returns the path to the new image
+    def crop(self, path, survey, ra, dec, fov):
+        from astropy.io import fits
+        from astropy.wcs import WCS
+        from astropy.wcs.utils import proj_plane_pixel_scales
+        from astropy.nddata import Cutout2D
+        with fits.open(path) as hdulist:
+            header = hdulist[0].header
+            wcs = WCS(header).celestial
+            if not wcs.has_celestial:
+                raise ValueError('no celestial WCS')
+            x, y = wcs.all_world2pix(ra, dec, 0)
+            n = int(round(fov / 60.0 / proj_plane_pixel_scales(wcs)[1])) #Pixels on a side
+            cutout = Cutout2D(hdulist[0].data, (float(x), float(y)), (n, n), wcs=wcs, mode='trim')
+            header = header.copy()
+            for key in ('CD1_1', 'CD1_2', 'CD2_1', 'CD2_2', 'PC1_1', 'PC1_2', 'PC2_1', 'PC2_2'): #Replace the old WCS with the cutout's
+                header.remove(key, ignore_missing=True)
+            header.update(cutout.wcs.to_header())
+            output_path = self.filename(survey, ra, dec, fov, n)
+            fits.PrimaryHDU(cutout.data, header).writeto(output_path + '.tmp', overwrite=True)
+        os.replace(output_path + '.tmp', output_path) #So a half written image is never in the cache
+        return output_path
+
+    #Total size of the cache in bytes
+    def size(self):
+        return sum(os.path.getsize(entry[5]) for entry in self.entries())
+
+    #Remove least recently used images until the cache is under max_bytes
+    def evict(self):
+        images = []
+        total = 0
+        for entry in self.entries():
+            stat = os.stat(entry[5])
+            images.append((stat.st_mtime, stat.st_size, entry[5]))
+            total += stat.st_size
+        images.sort()
+        for mtime, size, path in images:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def stats(self):
+        return {'hits': self.hits, 'crops': self.crops, 'misses': self.misses, 'bytes': self.size()}
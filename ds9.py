@@ -1,90 +1,315 @@
 #Python library for accessing DS9 and XPA.
 #Written by Kyle Kaplan March 2014.
-# import pyds9
+#
+#Commands are sent through a transport with a pluggable backend:
+#  'pyds9' - persistent XPA connection through pyds9 (libxpa), no process spawned per command (default if pyds9 is installed)
+#  'xpa'   - xpaset/xpaget subprocesses (default without pyds9, only needs the XPA command line tools)
+#  'samp'  - persistent connection to DS9 through a SAMP hub (needs astropy)
+#  'fake'  - local stand in for DS9 that just records commands, for running without a display
+#Choose with use('pyds9') etc. or by setting the environment variable IGRINS_DS9_BACKEND.
+#
+#Inside "with batch():" commands are queued and sent together when the block ends (or at the next get()),
+#redundant commands are dropped and regions drawn with draw() are uploaded to DS9 in a single payload.
 import subprocess
 from subprocess import call, PIPE #Allow python to access command line
 from subprocess import check_output #Allow python to access command line and return result to a variable
+import builtins
+import contextlib
+import importlib.util
+import os
+import shlex
+import tempfile
 import time #To put in delays
 
-# global d
-# d = None #Set d to None initially
+verbose = True #Print commands as they are sent to DS9
+launch_timeout = 30.0 #Seconds ensure_open() waits for a newly started DS9 to answer
+
+#Commands that change state relative to the current state (or act on whatever is currently open), so sending them twice is not the same as once
+non_idempotent_commands = ('catalog clear', 'catalog close', 'catalog match', 'zoom', 'rotate', 'pan', 'frame new', 'regions', 'fits', 'skyview', 'dssstsci', 'exit')
+
+
+#Backend that runs xpaset and xpaget as subprocesses (without going through a shell)
+class XPABackend:
+  def __init__(self, target='ds9'):
+    self.target = target
+  def set(self, command):
+    call(['xpaset', '-p', self.target] + shlex.split(command)) #Split like the shell would but without expanding $ or &&
+  def set_data(self, command, data): #Send data to xpaset through stdin (e.g. a whole region file)
+    subprocess.run(['xpaset', self.target] + shlex.split(command), input=data.encode(), stdout=PIPE, stderr=PIPE)
+  def get(self, command):
+    return check_output(['xpaget', self.target] + shlex.split(command))
+  def is_open(self):
+    try:
+      self.get('version')
+      return True
+    except Exception:
+      return False
+  def launch(self):
+    subprocess.Popen(['ds9'])
+  def close(self):
+    pass
+
+
+#Backend that keeps a persistent XPA connection open through pyds9
+class PyDS9Backend:
+  def __init__(self, target='ds9'):
+    self.target = target
+    self.d = None
+  def connect(self):
+    if self.d is None:
+      import pyds9
+      self.d = pyds9.DS9(self.target) #Open a DS9 object with pyds9, this launches DS9 if it is not already open
+    return self.d
+  def set(self, command):
+    self.connect().set(command)
+  def set_data(self, command, data):
+    self.connect().set(command, data)
+  def get(self, command):
+    return self.connect().get(command)
+  def is_open(self):
+    try:
+      self.connect()
+      return True
+    except Exception:
+      return False
+  def launch(self):
+    self.connect()
+  def close(self):
+    self.d = None
+
+
+#Backend that keeps a connection open to DS9 through a SAMP hub
+class SAMPBackend:
+  def __init__(self, timeout=10):
+    self.timeout = str(timeout)
+    self.client = None
+    self.ds9_id = None
+  def connect(self):
+    if self.client is None:
+      from astropy.samp import SAMPIntegratedClient
+      self.client = SAMPIntegratedClient(name='IGRINS Observing Planner')
+      self.client.connect()
+    if self.ds9_id is None:
+      for client_id in self.client.get_registered_clients():
+        if self.client.get_metadata(client_id).get('samp.name', '') == 'ds9':
+          self.ds9_id = client_id
+      if self.ds9_id is None:
+        raise RuntimeError('DS9 is not connected to the SAMP hub.')
+    return self.client
+  def set(self, command):
+    client = self.connect()
+    client.ecall_and_wait(self.ds9_id, 'ds9.set', self.timeout, cmd=command)
+  def set_data(self, command, data): #SAMP cannot send data directly so write it to a temporary file and have DS9 load that
+    with tempfile.NamedTemporaryFile('w', suffix='.reg', delete=False) as f:
+      f.write(data)
+    try:
+      self.set(command + ' ' + f.name)
+    finally:
+      os.remove(f.name)
+  def get(self, command):
+    client = self.connect()
+    result = client.ecall_and_wait(self.ds9_id, 'ds9.get', self.timeout, cmd=command)
+    return result['samp.result']['value']
+  def is_open(self):
+    try:
+      self.connect()
+      return True
+    except Exception:
+      return False
+  def launch(self):
+    subprocess.Popen(['ds9', '-samp', 'connect'])
+  def close(self):
+    if self.client is not None:
+      self.client.disconnect()
+    self.client = None
+    self.ds9_id = None
+
+
+#Local stand in for DS9 that records every command it is sent, so things can be run and checked without a display
+#Set responses[command] to what get(command) should return, and catalog_export to the text "catalog export tsv" should write
+class FakeDS9:
+  def __init__(self):
+    self.commands = [] #Every command received, in order
+    self.regions = [] #Region lines received through set_data
+    self.responses = {'version': b'ds9 8.0\n'}
+    self.catalog_export = None
+    self.n_calls = 0 #Number of round trips to "DS9"
+  def set(self, command):
+    self.n_calls += 1
+    self.commands.append(command)
+    if command.startswith('catalog export tsv ') and self.catalog_export is not None:
+      with builtins.open(command.split(' ', 3)[3], 'w') as f: #builtins.open since open() below opens DS9
+        f.write(self.catalog_export)
+    if command == 'regions delete all':
+      self.regions = []
+  def set_data(self, command, data):
+    self.n_calls += 1
+    self.commands.append(command)
+    self.regions.extend(data.splitlines())
+  def get(self, command):
+    self.n_calls += 1
+    self.commands.append('get ' + command)
+    return self.responses.get(command, b'')
+  def is_open(self):
+    return True
+  def launch(self):
+    pass
+  def close(self):
+    pass
+
+
+backends = {
+  'xpa': XPABackend,
+  'pyds9': PyDS9Backend,
+  'samp': SAMPBackend,
+  'fake': FakeDS9,
+}
+
+
+#Holds the backend and the queue of commands waiting to be sent
+class Transport:
+  def __init__(self, backend):
+    self.backend = backend
+    self.queue = [] #List of ('set', command) or ('draw', region) waiting to be sent
+    self.batch_depth = 0
+    self.n_sent = 0 #Number of commands actually sent to the backend
+    self.n_dropped = 0 #Number of redundant commands that were never sent
+    self.opened = False #If open() has made sure DS9 is running
+  def set(self, command):
+    self.queue.append(('set', command))
+    if self.batch_depth == 0:
+      self.flush()
+  def draw(self, region):
+    self.queue.append(('draw', region))
+    if self.batch_depth == 0:
+      self.flush()
+  def get(self, command):
+    self.flush() #Make sure everything queued up has been done before asking DS9 anything
+    return self.backend.get(command)
+  def flush(self):
+    queue = self.queue
+    self.queue = []
+    i = 0
+    while i < len(queue):
+      kind, command = queue[i]
+      if kind == 'draw': #Gather all regions drawn in a row into one payload
+        regions = []
+        while i < len(queue) and queue[i][0] == 'draw':
+          regions.append(queue[i][1])
+          i += 1
+        if verbose:
+          print('regions <', len(regions), 'region(s)')
+        self.backend.set_data('regions', '\n'.join(regions) + '\n')
+        self.n_sent += 1
+        continue
+      if i > 0 and queue[i-1] == queue[i] and not command.startswith(non_idempotent_commands): #Drop a repeat of the same command
+        self.n_dropped += 1
+        i += 1
+        continue
+      if verbose:
+        print('set command =', command)
+      self.backend.set(command)
+      self.n_sent += 1
+      i += 1
+
+
+transport = None #Transport used by all the functions below, created the first time it is needed
+
+
+#Choose the backend used to talk to DS9, returns the backend so it can be inspected (e.g. the FakeDS9 commands)
+def use(backend='xpa', **kwargs):
+  global transport
+  if transport is not None:
+    transport.flush()
+    transport.backend.close()
+  if isinstance(backend, str):
+    backend = backends[backend](**kwargs)
+  transport = Transport(backend)
+  return backend
+
+
+#Backend used unless another is chosen: pyds9 if it is installed (checked without importing it), otherwise xpaset/xpaget
+def default_backend():
+  if os.environ.get('IGRINS_DS9_BACKEND', '') != '':
+    return os.environ['IGRINS_DS9_BACKEND']
+  if importlib.util.find_spec('pyds9') is not None:
+    return 'pyds9'
+  return 'xpa'
+
+
+def get_transport():
+  if transport is None:
+    use(default_backend())
+  return transport
+
+
+#Queue up commands inside a "with batch():" block and send them all when the block ends
+@contextlib.contextmanager
+def batch():
+  t = get_transport()
+  t.batch_depth += 1
+  try:
+    yield t
+  finally:
+    t.batch_depth -= 1
+    if t.batch_depth == 0:
+      t.flush()
+
+
+#Send any queued commands now
+def flush():
+  get_transport().flush()
+
 
 #Open DS9
 def open():
-  #call('xpans &', shell=True) #Load XPA immediately, so XPA commands can be sent to ds9, commented out for now, apparently doesn't work
-  #if check_output('xpaaccess ds9 &', shell=True) == 'no\n':
-  try:
-    print('Trying to open DS9.  You can ignore the XPA error below.')
-    get('version') #Check if ds9 is already open
-  except: #If the above errors that likely means ds9 isn't open so...
-    call('ds9 &', shell=True) #Load DS9
-  #if check_output('xpaaccess ds9 &', shell=True) == 'no\n':
-  #  call(['/bin/bash', '-i', '-c', 'ds9 &']) #Load DS9 with bash, change bash to whatever shell you use if you are having issues
-  #while check_output('xpaaccess ds9 &', shell=True) == 'no\n': #While loop that checks every second or so if DS9 is open before continuing
-  #  time.sleep(1) #Wait one second than check if DS9 is open again
-  # global d
-  # if d == None: #Is DS9 not open yet...
-  #   d = pyds9.DS9() #Open a DS9 object with pyds9
-  # else: #If DS9 is already open...
-  #   print('WARNING: DS9 is already open.')
-  
+  t = get_transport()
+  print('Trying to open DS9.  You can ignore the XPA error below.')
+  if not t.backend.is_open(): #Check if ds9 is already open, if not...
+    t.backend.launch() #Load DS9
+  t.opened = True
+
+#Open DS9 the first time it is needed instead of at startup, waiting up to launch_timeout seconds for it to start answering
+def ensure_open():
+  t = get_transport()
+  if t.opened:
+    return
+  if not t.backend.is_open():
+    t.backend.launch()
+    start_time = time.time()
+    while not t.backend.is_open() and time.time() - start_time < launch_timeout:
+      time.sleep(0.25)
+  t.opened = True
+
 #Quit DS9
 def close():
-  call('xpaset -p ds9 exit')
-  # global d
-  # if d != None: #If DS9 is open
-  #   d.set('exit') #Quit DS9
-  #   d = None #Blank out holder for DS9 object
-  # else:
-  #   print('WARNING: DS9 is already closed.')
-  
+  set('exit')
+  get_transport().backend.close()
+
 #Get xpaget statements from ds9
 def get(command):
-  result = check_output('xpaget ds9 ' + command, shell=True) #Get information from ds9 using XPA get
-  # global d
-  # if d != None: #If DS9 is open
-  #   result = d.get(command) #Get information from DS9 and store in result
-  #   #wait(1.0)
-  #   return(str(result).strip()) #return information grabbed from ds9
-  # else: #If DS9 is not open
-  #   print('Warning: DS9 is not open.')
-  #   return(None)
-  return result
+  return get_transport().get(command)
 
 
 #Send xpaset commands to ds9
 def set(command):
-  print('set command =', command)
-  call('xpaset -p ds9 ' + command, shell=True)
-  #time.sleep(0.5) #Set delay after each command to give computer time to respond before the next command
-  # global d
-  # if d != None: #If DS9 is open
-  #   d.set(command) #Send command to DS9
-  #   #wait(1.0)
-  # else: #If DS9 is not open
-  #   print('Warning: DS9 is not open.')
+  get_transport().set(command)
 
 #Allow user to set delays in DS9 scripts
 def wait(delay):
+  flush()
   time.sleep(delay)
 
 #Special command for drawing regions onto ds9
 def draw(command):
-  print('echo "' + command + '" | xpaset ds9 regions')
-  call('echo "' + command + '" | xpaset ds9 regions', shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-  # global d
-  # if d != None: #If DS9 is open
-  #   d.set('regions', command)
-  #   #wait(1.0)
-  # else: #If DS9 is not open
-  #   print('Warning: DS9 is not open.')
-  
+  get_transport().draw(command)
+
 def rot(angle):
   set('rotate '+str(angle))
 
 def rotto(angle):
   set('rotate to '+str(angle))
-  
+
 def north():
   set('rotate to 0')
 
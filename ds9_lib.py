@@ -3,9 +3,16 @@
 import numpy as np #Import numpy
 import ds9  #Import wrapper for allowing python script DS9 with XPA
 import sys, os
+import functools
 from coordfuncs import *  #Import coordfuncs for handing spherical astronomy and coordinates
 #Grab path to current working directory
 current_working_directory = os.getcwd() + '/'
+#Outline of SVC FOV, found next to this file so the planner can be run from any directory
+scam_outline_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scam-outline.txt')
+scam_outline_npy_filename = scam_outline_filename.replace('.txt', '.npy') #Binary copy of the outline, made from the text file the first time it is needed
+svc_polygon_cache_size = 64 #Number of rotated/scaled/mirrored SVC polygons (and their region strings) to keep cached
+svc_outline_tolerances = (0.02, 0.05, 0.1, 0.2, 0.5, 1.0) #Levels of detail (max. deviation in arcsec) the SVC outline can be simplified to
+svc_outline_pixels_per_fov = 1800.0 #Roughly how many screen pixels the finder chart FOV spans in DS9 (900 pixel image at zoom 1.8)
 
 #global variables (for McD) [originally taken from observability.py options file]
 mirror_field = False #Mirror field (needed for DCT)
@@ -18,7 +25,137 @@ gstar_mag_limit = 14.0        #Guide star search K-band mag. limit, the dimmest
 gstar_ra_limit_arcmin = 3.0     #Guide star search delta-RA limit (in arcmin) from  target, FOR MCDONALD OBSERVATORY 2.7M
 gstar_dec_limit_arcmin = 3.0     #Guide star search delta-Dec. limit (in arcmin) from target, FOR MCDONALD OBSERVATORY 2.7M
 n_gstars = 20      #Guide star search, star number limit (ie. 10 means find 10 brightest stars)
-
+guide_star_surveys = ('Gaia DR2', '2MASS point source') #Catalogs guide stars can be searched for in (the GUI's guide star survey menu)
+default_guide_star_survey = 'Gaia DR2'
+catalog_query_margin_arcmin = 0.1 #Extra on each side of the box the DS9 catalog tool is asked to fetch, the catalog filter trims it back down
+use_catalog_cache = True #Keep guide star catalog query results on disk so repeated or overlapping searches don't need the network
+catalog_cache_directory = os.path.join(os.path.expanduser('~'), '.igrins_observing_planner', 'catalog_cache')
+catalog_cache_max_bytes = 100e6 #Maximum size of the guide star catalog cache in bytes
+catalog_cache = None #CatalogCache object, made by get_catalog_cache() the first time it is needed
+guide_star_index_directories = {} #Local catalog indexes (built with catalog_index.py) to search instead of using the DS9 catalog tool, by survey e.g. {'Gaia DR2': 'gaia_index/'}
+guide_star_indexes = {} #Loaded CatalogIndex objects by directory
+use_cutout_cache = True #Keep finder chart images on disk so remaking a finder chart for the same (or a smaller) field doesn't need the network
+cutout_cache_directory = os.path.join(os.path.expanduser('~'), '.igrins_observing_planner', 'cutout_cache')
+cutout_cache_max_bytes = 500e6 #Maximum size of the finder chart image cache in bytes
+cutout_cache = None #CutoutCache object, made by get_cutout_cache() the first time it is needed
+
+
+
+scam_outline = None #SVC FOV outline (poly_x, poly_y) in arcsec, loaded by load_scam_outline()
+
+
+#Load the outline of the SVC FOV (thanks to Henry Roe (private communication)) as a 2 x N array of (poly_x, poly_y) in arcsec
+#The text file is only parsed once, after that the outline is memory mapped from a .npy file next to it
+def load_scam_outline():
+    global scam_outline
+    if scam_outline is None:
+        if os.path.exists(scam_outline_npy_filename) and os.path.getmtime(scam_outline_npy_filename) >= os.path.getmtime(scam_outline_filename):
+            scam_outline = np.load(scam_outline_npy_filename, mmap_mode='r')
+        else:
+            x, y, poly_x, poly_y = loadtxt(scam_outline_filename, unpack=True)
+            scam_outline = np.array([poly_x, poly_y])
+            try:
+                np.save(scam_outline_npy_filename, scam_outline)
+            except OSError: #If we can't write next to the text file just keep the outline in memory
+                pass
+    return scam_outline
+
+
+#Simplify a polyline (x, y) with the Douglas-Peucker algorithm so no removed point is further than max_deviation from the simplified line
+#Returns a boolean array of which points to keep, the first and last points are always kept
+def douglas_peucker(x, y, max_deviation):
+    keep = zeros(size(x), dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    stack = [(0, size(x)-1)]
+    while len(stack) > 0:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        px = x[i+1:j] - x[i]
+        py = y[i+1:j] - y[i]
+        length_squared = dx*dx + dy*dy
+        if length_squared > 0.0: #Distance from each point to the segment between points i and j
+            t = clip((px*dx + py*dy) / length_squared, 0.0, 1.0)
+            distance = hypot(px - t*dx, py - t*dy)
+        else:
+            distance = hypot(px, py)
+        k = argmax(distance)
+        if distance[k] > max_deviation: #Keep the furthest point and split the line there
+            k = i + 1 + k
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+#Return the SVC FOV outline (poly_x, poly_y) in arcsec simplified so it deviates from the full outline by no more than max_deviation (arcsec)
+@functools.lru_cache(maxsize=len(svc_outline_tolerances)+1)
+def get_simplified_scam_outline(max_deviation):
+    poly_x, poly_y = load_scam_outline()
+    if max_deviation is None or max_deviation <= 0.0:
+        return poly_x, poly_y
+    poly_x = np.asarray(poly_x)
+    poly_y = np.asarray(poly_y)
+    far = argmax(hypot(poly_x - poly_x[0], poly_y - poly_y[0])) #The outline is closed so split it into two lines at the point furthest from the first
+    keep = zeros(size(poly_x), dtype=bool)
+    keep[:far+1] = douglas_peucker(poly_x[:far+1], poly_y[:far+1], max_deviation)
+    closed_x = append(poly_x[far:], poly_x[0]) #Second half wraps back around to the first point
+    closed_y = append(poly_y[far:], poly_y[0])
+    keep[far:] |= douglas_peucker(closed_x, closed_y, max_deviation)[:-1]
+    return poly_x[keep], poly_y[keep]
+
+
+#Choose how much the SVC outline can be simplified (arcsec) for a finder chart with an image FOV of fov_arcmin
+#so the removed detail is smaller than about half a screen pixel in DS9 and the FOV boundary does not visibly change
+def svc_outline_tolerance_for_fov(fov_arcmin):
+    tolerance = 0.5 * float(fov_arcmin) * 60.0 / svc_outline_pixels_per_fov
+    levels = [level for level in svc_outline_tolerances if level <= tolerance]
+    if len(levels) == 0:
+        return None #Use the full outline
+    return levels[-1]
+
+
+#Return the SVC FOV polygon (poly_x, poly_y) in degrees, rotated by rotation (deg), scaled for the plate scale, and mirrored if needed
+#If max_deviation (arcsec on the sky) is set, the outline is simplified to be within max_deviation of the full outline
+#Results are cached since the same PA gets redrawn over and over, the returned arrays are read only
+@functools.lru_cache(maxsize=svc_polygon_cache_size)
+def get_svc_polygon(rotation, plate_scale, mirror_field=False, max_deviation=None):
+    zoom =  plate_scale / 0.119 #Set zoom scale to scale the FOV, the McDonald Observatory 2.7m plate scale is 0.119
+    if max_deviation is None:
+        poly_x, poly_y = load_scam_outline()
+    else:
+        poly_x, poly_y = get_simplified_scam_outline(max_deviation / zoom) #Outline gets scaled by zoom below so scale the tolerance to match
+    poly_x = poly_x / 3600.0 #Convert arcseconds to degrees
+    poly_y = poly_y / 3600.0
+    if mirror_field: #If SCV field is mirrored (e.g. on DCT)...
+        poly_y = -poly_y  #Mirror the polygon describing the FOV of the SCV
+    rad_rot = radians(rotation)  #Convert degrees to radians for angle of rotation
+    rotMatrix = array(
+        [[cos(rad_rot), -sin(rad_rot)], [sin(rad_rot), cos(rad_rot)]])  #Set up rotation matrix for polygon
+    polygon = rotMatrix.dot([poly_x, poly_y]) * zoom  #Apply rotation matrix to the FOV polygon, and scale it if necessary
+    polygon.setflags(write=False)
+    return polygon[0], polygon[1]
+
+
+#Return the SVC FOV polygon as the "(x1, y1, x2, y2, ...)" string used in region files
+#If ra and dec (deg.) are given the polygon is placed on the sky at that position, otherwise it is left as offsets (for templates)
+#If max_deviation (arcsec) is set the outline is simplified and written with 8 decimal places instead of full precision
+@functools.lru_cache(maxsize=svc_polygon_cache_size)
+def get_svc_polygon_string(rotation, plate_scale, mirror_field=False, ra=None, dec=None, max_deviation=None):
+    poly_x, poly_y = get_svc_polygon(rotation, plate_scale, mirror_field, max_deviation)
+    if ra is not None:
+        poly_x = poly_x / cos(radians(dec))
+        poly_x = poly_x + ra #Add RA and Dec. position
+        poly_y = poly_y + dec
+    poly_xy = np.empty(2*size(poly_x), dtype=float) #Interleave x and y points
+    poly_xy[0::2] = poly_x
+    poly_xy[1::2] = poly_y
+    if max_deviation is None:
+        return '(' + ', '.join(map(repr, poly_xy.tolist())) + ')'
+    return '(' + ', '.join(['%.8f' % value for value in poly_xy.tolist()]) + ')'
 
 
 # gstar_dra_arcsec = 0.0  #Initialize these variables, if no guide star is used, just keep them zero
@@ -35,11 +172,6 @@ polygon used to represent the SVC FOV'''
 def create_region_template(rotation, plate_scale, guidestar_dra=0, guidestar_ddec=0, guidestar_sl=0, guidestar_sw=0, mirror_field=False):
     zoom =  plate_scale / 0.119 #Set zoom scale to scale the FOV, the McDonald Observatory 2.7m plate scale is 0.119 so changing the plate scale in the options.inp file 
     default_slit_angle = 359.98672  #Default angle of the slit (East to west)
-    x, y, poly_x, poly_y = loadtxt('scam-outline.txt', unpack=True) #Outline of SVC FOV, thanks to Henry Roe (private communication)
-    poly_x = poly_x / 3600.0 #Convert arcseconds to degrees
-    poly_y = poly_y / 3600.0
-    if mirror_field: #If SCV field is mirrored (e.g. on DCT)...
-        poly_y = -poly_y  #Mirror the polygon describing the FOV of the SCV
     # poly_x = [0.02714, 0.02712, 0.02593, 0.02462, 0.02412, 0.02422, 0.02429,  #Old polygon, now using new one from Henry Roe
     #           #Default x values for points in FOV polygon
     #           -0.00265, -0.02095, -0.02338, -0.02403, -0.02681, -0.02677, -0.02518,
@@ -48,16 +180,7 @@ def create_region_template(rotation, plate_scale, guidestar_dra=0, guidestar_dde
     #           #Default y values for points in FOV polygon
     #           0.00582677, 0.00541191, 0.00319962, 0.00332299, -0.00340406, -0.00778661, -0.01318707,
     #           -0.01728969, -0.02215466, -0.02662075, -0.0258552, -0.01869832]
-    rad_rot = radians(rotation)  #Convert degrees to radians for angle of rotation
-    rotMatrix = array(
-        [[cos(rad_rot), -sin(rad_rot)], [sin(rad_rot), cos(rad_rot)]])  #Set up rotation matrix for polygon
-    [poly_x, poly_y] = rotMatrix.dot([poly_x, poly_y]) * zoom  #Apply rotation matrix to the FOV polygon, and scale it if necessary
-    poly_xy = '('  #Make string to output for polygon points
-    n = size(poly_x)  #Find number of points in polygon
-    for i in range(n - 1):  #Loop through points 0 -> n-2
-        poly_xy = poly_xy + str(poly_x[i]) + ', ' + str(poly_y[i]) + ', '
-    poly_xy = poly_xy + str(poly_x[n - 1]) + ', ' + str(
-        poly_y[n - 1]) + ')'  #Give final point the special format it needs
+    poly_xy = get_svc_polygon_string(rotation, plate_scale, mirror_field)  #Make string to output for polygon points
     total_slit_angle = longitude(default_slit_angle - rotation)  #Calculate angle to rotate slit box
     slit_angle = str(total_slit_angle.deg())  #Convert slit angle after applying rotation of IGRINS to a string
     output = []  #Set up array to output lines of text to region tmeplate file, as strings appended to the array
@@ -83,14 +206,9 @@ def create_region_template(rotation, plate_scale, guidestar_dra=0, guidestar_dde
 Rotation in Position Angle is accounted for via rotation matrix for the 
 polygon used to represent the SVC FOV'''
 def create_region(coordobj, rotation, plate_scale, guidestar_dra=0, guidestar_ddec=0, guidestar_sl=0, guidestar_sw=0, mirror_field=False,
-        show_scan=False, scan_blocks=None, scan_plus_90_deg=False):
+        show_scan=False, scan_blocks=None, scan_plus_90_deg=False, filename='IGRINS_svc_generated.reg', max_deviation=None):
     zoom =  plate_scale / 0.119 #Set zoom scale to scale the FOV, the McDonald Observatory 2.7m plate scale is 0.119 so changing the plate scale in the options.inp file 
     default_slit_angle = 359.98672  #Default angle of the slit (East to west)
-    x, y, poly_x, poly_y = loadtxt('scam-outline.txt', unpack=True) #Outline of SVC FOV, thanks to Henry Roe (private communication)
-    poly_x = poly_x / 3600.0 #Convert arcseconds to degrees
-    poly_y = poly_y / 3600.0
-    if mirror_field: #If SCV field is mirrored (e.g. on DCT)...
-        poly_y = -poly_y  #Mirror the polygon describing the FOV of the SCV
     # poly_x = [0.02714, 0.02712, 0.02593, 0.02462, 0.02412, 0.02422, 0.02429,  #Old polygon, now using new one from Henry Roe
     #           #Default x values for points in FOV polygon
     #           -0.00265, -0.02095, -0.02338, -0.02403, -0.02681, -0.02677, -0.02518,
@@ -99,19 +217,7 @@ def create_region(coordobj, rotation, plate_scale, guidestar_dra=0, guidestar_dd
     #           #Default y values for points in FOV polygon
     #           0.00582677, 0.00541191, 0.00319962, 0.00332299, -0.00340406, -0.00778661, -0.01318707,
     #           -0.01728969, -0.02215466, -0.02662075, -0.0258552, -0.01869832]
-    rad_rot = radians(rotation)  #Convert degrees to radians for angle of rotation
-    rotMatrix = array(
-        [[cos(rad_rot), -sin(rad_rot)], [sin(rad_rot), cos(rad_rot)]])  #Set up rotation matrix for polygon
-    [poly_x, poly_y] = rotMatrix.dot([poly_x, poly_y]) * zoom  #Apply rotation matrix to the FOV polygon, and scale it if necessary
-    poly_x /= cos(radians(coordobj.dec.deg()))
-    poly_x += coordobj.ra.deg() #Add RA and Dec. position
-    poly_y += coordobj.dec.deg()
-    poly_xy = '('  #Make string to output for polygon points
-    n = size(poly_x)  #Find number of points in polygon
-    for i in range(n - 1):  #Loop through points 0 -> n-2
-        poly_xy = poly_xy + str(poly_x[i]) + ', ' + str(poly_y[i]) + ', '
-    poly_xy = poly_xy + str(poly_x[n - 1]) + ', ' + str(
-        poly_y[n - 1]) + ')'  #Give final point the special format it needs
+    poly_xy = get_svc_polygon_string(rotation, plate_scale, mirror_field, coordobj.ra.deg(), coordobj.dec.deg(), max_deviation)  #Make string to output for polygon points, placed at the target
     total_slit_angle = longitude(default_slit_angle - rotation)  #Calculate angle to rotate slit box
     slit_angle = str(total_slit_angle.deg())  #Convert slit angle after applying rotation of IGRINS to a string
     output = []  #Set up array to output lines of text to region tmeplate file, as strings appended to the array
@@ -154,301 +260,441 @@ def create_region(coordobj, rotation, plate_scale, guidestar_dra=0, guidestar_dd
         output.append('point(' + str((guidestar_dra/3600.0/coordobj.dec.cos())+coordobj.ra.deg()) + ',' + str(
             guidestar_ddec/3600.0+coordobj.dec.deg()) + ') # point=circle font="helvetica 12 bold roman" color=yellow text={Offslit guide star [sl: ' + "%5.2f" % guidestar_sl + ', sw:' + "%5.2f" % guidestar_sw + ']} select=1')
     output.append('polygon' + poly_xy)  #Save SVC FOV polygon
-    savetxt('IGRINS_svc_generated.reg', output, fmt="%s")  #Save region template file for reading into ds9
-
-
-
-def make_finder_chart_in_ds9(target, guidestar, grab_image=True):
-
-    #Set rotator variables
-    delta_PA = 90.0 - float(target.PA.get())  #Default instrument East-west setting is 90 degrees in PA
-    #breakpoint()
-    ra = sex2deg(target.ra.get(), units='hms') #Convert to decimal degrees so we can easily add and subtract
-    dec = sex2deg(target.dec.get(), units='dms')
-    if target.use_proper_motion.get(): #Use target proper motion to set slit center 
-        proper_motion_ra_distance_arcsec = float(target.proper_motion[0].get()) * 1e-3 * (float(target.epoch.get())-2000.0)
-        proper_motion_dec_distance_arcsec = float(target.proper_motion[1].get()) * 1e-3 * (float(target.epoch.get())-2000.0)
-        ra += proper_motion_ra_distance_arcsec / cos(radians(dec)) / 3600.0
-        dec += proper_motion_dec_distance_arcsec / 3600.
-    guidestar_dra = float(guidestar.dra.get()) #Defaults for guidestar
-    guidestar_ddec =  float(guidestar.ddec.get())
-    guidestar_sl =  float(guidestar.dG[0].get())
-    guidestar_sw =  float(guidestar.dG[1].get())
-    if target.use_slitscan.get(): #Adjust coordinates if using slitscan
-        guidestar_sl, guidestar_sw = target.get_scan_sl_sw(int(target.scan_finder_row.get()), 
-                                        int(target.scan_finder_col.get()),
-                                        int(target.scan_finder_pos.get()))
-        guidestar_slitscan_dra, guidestar_slitscan_ddec = convert_from_sl_sw_to_dra_ddec(guidestar_sl, guidestar_sw, float(target.PA.get()))
-        if not target.scan_rotation.get()=='+90 deg PA':
-            ra += (guidestar_dra-guidestar_slitscan_dra) / cos(radians(dec)) / 3600.0
-            dec += (guidestar_ddec-guidestar_slitscan_ddec) / 3600.   
-            guidestar_dra =  guidestar_slitscan_dra
-            guidestar_ddec = guidestar_slitscan_ddec 
-        else:
-            ra += (guidestar_dra+guidestar_slitscan_dra) / cos(radians(dec)) / 3600.0
-            dec += (guidestar_ddec+guidestar_slitscan_ddec) / 3600.       
-            guidestar_dra =  -guidestar_slitscan_dra
-            guidestar_ddec = -guidestar_slitscan_ddec       
-
-    obj_coords = coords(ra, dec)
-    print(ra, dec)
-    # else:
-    #     ra = target.ra.get()
-    #     dec = target.dec.get()
-    #     print(ra+' '+dec)
-    #     obj_coords = coord_query(ra+' '+dec) #Put RA and DEC in a coords object
-    #ds9.open()  #Open DS9
-    #ds9.wait(2.0) #Used to be needed, commented out for now because I think I fixed this bug and can now speed things up
-    if grab_image==True:
-        ds9.set('single')  #set single display mode
-        if target.survey.get() == '2MASS K-band': #Use HEASARC Sky View server to get mosaicced 2MASS images, to get rid of bug from where images got sliced from the 2MASS server
-            ds9.set('skyview open')
-            ds9.set('skyview pixels 900 900') #Set resoultion of image retrieved
-            #n_pixels = str(int(np.round(900 * (fov/6)))) #Calculate number of pixels to use for resolution of 2MASS image, normalized to 900 pixels for 6 arcmin on a side
-            #ds9.set('skyview pixels '+n_pixels+' '+n_pixels) #Set resoultion of image retrieved
-            #ds9.set('skyview size '+ str(img_size) + ' ' + str(img_size) + ' arcmin')#Set size of image
-            ds9.set('skyview size '+ target.fov.get() + ' ' + target.fov.get() + ' arcmin')#Set size of image
-            ds9.set('skyview survey 2MASS-'+band) #Use HEASARC Sky View server to get mosaicced 2MASS images
+    with open(filename, 'w') as f: #Save region file for reading into ds9, written as is since savetxt would pad every line out to the long polygon line
+        f.write(''.join(f"{line}\n" for line in output))
+
+
+
+#Number of pixels on a side of the finder chart image retrieved for a survey (0 means the server picks)
+def finder_chart_pixels(survey):
+    return 900 if survey == '2MASS K-band' else 0
+
+
+#Return the on-disk cache of finder chart images, or None if it is turned off (or can't be made)
+def get_cutout_cache():
+    global cutout_cache
+    if cutout_cache is None and use_cutout_cache:
+        import cutout_cache as cutout_cache_module
+        try:
+            cutout_cache = cutout_cache_module.CutoutCache(cutout_cache_directory, max_bytes=cutout_cache_max_bytes)
+        except OSError:
+            return None
+    return cutout_cache
+
+
+#Make a finder chart in DS9 centered on obj_coords (a coords object), rotated to match the IGRINS guider for delta_PA = 90 - PA
+#Use planner_lib.calculate_finder_chart_center to find obj_coords, delta_PA, and the guide star position from the target and guide star
+def make_finder_chart_in_ds9(obj_coords, delta_PA, survey='2MASS K-band', fov='6.0', guidestar_dra=0.0, guidestar_ddec=0.0, guidestar_sl=0.0, guidestar_sw=0.0,
+        show_scan=False, scan_blocks=None, scan_plus_90_deg=False, grab_image=True):
+    with ds9.batch(): #Queue up the DS9 commands and send them together
+        fov = str(fov)
+        #ds9.open()  #Open DS9
+        #ds9.wait(2.0) #Used to be needed, commented out for now because I think I fixed this bug and can now speed things up
+        if grab_image==True:
+            ds9.set('single')  #set single display mode
+            pixels = finder_chart_pixels(survey)
+            cache = get_cutout_cache()
+            cached_image = None
+            if cache is not None: #Check for an image of this field (or a larger one that can be cropped) already on disk
+                cached_image = cache.lookup(survey, obj_coords.ra.deg(), obj_coords.dec.deg(), float(fov), pixels)
+                print('Finder chart image cache:', cache.stats())
+            if cached_image is not None:
+                ds9.set('fits ' + cached_image) #Load cached image instead of retrieving it again
+            elif survey == '2MASS K-band': #Use HEASARC Sky View server to get mosaicced 2MASS images, to get rid of bug from where images got sliced from the 2MASS server
+                ds9.set('skyview open')
+                ds9.set('skyview pixels ' + str(pixels) + ' ' + str(pixels)) #Set resoultion of image retrieved
+                #n_pixels = str(int(np.round(900 * (fov/6)))) #Calculate number of pixels to use for resolution of 2MASS image, normalized to 900 pixels for 6 arcmin on a side
+                #ds9.set('skyview pixels '+n_pixels+' '+n_pixels) #Set resoultion of image retrieved
+                #ds9.set('skyview size '+ str(img_size) + ' ' + str(img_size) + ' arcmin')#Set size of image
+                ds9.set('skyview size '+ fov + ' ' + fov + ' arcmin')#Set size of image
+                ds9.set('skyview survey 2MASS-'+band) #Use HEASARC Sky View server to get mosaicced 2MASS images
+                # if obj_choice == '2':  #If user specifies object name
+                #    ds9.set('skyview name ' + obj_input.replace(" ", "_"))  #Retrieve 2MASS image
+                # else:  #If user specifies object coordiantes
+                #    ds9.set('skyview coord ' + str(obj_coords.ra.deg()) + ' ' + str(
+                #        obj_coords.dec.deg()) + ' degrees')  #Retrieve 2MASS image
+                ds9.set('skyview coord ' + str(obj_coords.ra.deg()) + ' ' + str(
+                   obj_coords.dec.deg()) + ' degrees')  #Retrieve 2MASS image
+                ds9.set('skyview close') #Close skyserver window
+            elif survey == 'POSS2 IR': #Use STSCI DSS server to grab the POSS2 Infrared survey
+                ds9.set('dssstsci open')
+                ds9.set('dssstsci size '+ fov + ' ' + fov + ' arcmin')#Set size of image
+                ds9.set('dssstsci survey poss2ukstu_ir') #Set survey + band
+                ds9.set('dssstsci '+ str(obj_coords.ra.deg()) + ' ' + str(
+                   obj_coords.dec.deg()) + ' degrees')  #Retrieve  image
+                #ds9.set('dssstsci close') #Close window when done
+            if cached_image is None and cache is not None and survey in ('2MASS K-band', 'POSS2 IR'): #Keep the retrieved image for next time
+                saved_image = cache.filename(survey, obj_coords.ra.deg(), obj_coords.dec.deg(), float(fov), pixels) + '.tmp'
+                ds9.set('save fits ' + saved_image + ' image')
+                ds9.flush() #Make sure DS9 has saved the image before checking it
+                cache.add(saved_image, survey, obj_coords.ra.deg(), obj_coords.dec.deg(), float(fov), pixels) #Only kept if it is this field (the retrieval worked)
+            #Old 2MASS server commented out for now, probably obselete, using HEASARC Sky View server now
+            #HEASARC Sky Viewer server does not appear to be working anymore in DS9 so falling back on the old 2MASS image server, it's not ideal but it should work (mostly)
+            # ds9.set('2mass close')  #Close 2MASS window
+            # ds9.set('2mass survey ' + band)  #Load 2MASS survey
+            # ds9.set('2mass size ' + str(img_size) + ' ' + str(
+            #    img_size) + ' arcmin')  #Set size of image (weird issues here, only strips extracted)
             # if obj_choice == '2':  #If user specifies object name
-            #    ds9.set('skyview name ' + obj_input.replace(" ", "_"))  #Retrieve 2MASS image
+            #    ds9.set('2mass name ' + obj_input.replace(" ", "_"))  #Retrieve 2MASS image
             # else:  #If user specifies object coordiantes
-            #    ds9.set('skyview coord ' + str(obj_coords.ra.deg()) + ' ' + str(
+            #    ds9.set('2mass coord ' + str(obj_coords.ra.deg()) + ' ' + str(
             #        obj_coords.dec.deg()) + ' degrees')  #Retrieve 2MASS image
-            ds9.set('skyview coord ' + str(obj_coords.ra.deg()) + ' ' + str(
-               obj_coords.dec.deg()) + ' degrees')  #Retrieve 2MASS image
-            ds9.set('skyview close') #Close skyserver window
-        elif target.survey.get() == 'POSS2 IR': #Use STSCI DSS server to grab the POSS2 Infrared survey
-            ds9.set('dssstsci open')
-            ds9.set('dssstsci size '+ target.fov.get() + ' ' + target.fov.get() + ' arcmin')#Set size of image
-            ds9.set('dssstsci survey poss2ukstu_ir') #Set survey + band
-            ds9.set('dssstsci '+ str(obj_coords.ra.deg()) + ' ' + str(
-               obj_coords.dec.deg()) + ' degrees')  #Retrieve  image
-            #ds9.set('dssstsci close') #Close window when done
-        #Old 2MASS server commented out for now, probably obselete, using HEASARC Sky View server now
-        #HEASARC Sky Viewer server does not appear to be working anymore in DS9 so falling back on the old 2MASS image server, it's not ideal but it should work (mostly)
-        # ds9.set('2mass close')  #Close 2MASS window
-        # ds9.set('2mass survey ' + band)  #Load 2MASS survey
-        # ds9.set('2mass size ' + str(img_size) + ' ' + str(
-        #    img_size) + ' arcmin')  #Set size of image (weird issues here, only strips extracted)
-        # if obj_choice == '2':  #If user specifies object name
-        #    ds9.set('2mass name ' + obj_input.replace(" ", "_"))  #Retrieve 2MASS image
-        # else:  #If user specifies object coordiantes
-        #    ds9.set('2mass coord ' + str(obj_coords.ra.deg()) + ' ' + str(
-        #        obj_coords.dec.deg()) + ' degrees')  #Retrieve 2MASS image
-        # ds9.set('2mass close')  #Close 2MASS window
-
-        ds9.set('scale log')  #Set view to log scale
-        ds9.set('scale Zmax')  #Set scale limits to Zmax, looks okay
-    # else:  #If user does specify their own fits file, use it
-    #     ds9.set('fits ' + finder_chart_fits)  #Load fits fits file
-
-    # #Grab guide star RA and Dec. from user input if specified
-    # if gstar_choice == '1':  #Grab guide star coordinates from dRA & dDec input in arcseconds (distance guide star is from target in arcseconds)
-    #dra, ddec = gstar_input.split(' ')  #Sepearte delta RA and Dec. by a space entered by the user
-    # dra = float(dra) / 3600.0  #Convert arcseconds to degrees
-    # ddec = float(ddec) / 3600.0  #convert arcseconds to degrees
-    # gstar_coords = coords(obj_coords.ra.deg() + dra / obj_coords.dec.cos(), obj_coords.dec.deg() + ddec)
-    # elif gstar_choice == '2':  #Grab guide star coordinates from RA & Dec input
-    #     gstar_coords = coord_query(gstar_input)
-    # elif gstar_choice == '3':  #Grab guide star coordinates from name lookup on internet
-    #     gstar_coords = name_query(gstar_input)
-
-    # if gstar_choice != '0' and gstar_choice != '4':  #If single guide star actually put in by user calculate the following parameters...
-    #     gstar_dra_arcsec = ra_seperation(obj_coords, gstar_coords,
-    #                                      units='arcsec')  #position of guide star from object in arcseconds
-    #     gstar_ddec_arcsec = dec_seperation(obj_coords, gstar_coords,
-    #                                        units='arcsec')  #position of guide star from object in arcseconds
-    #     gstar_dra_deg = gstar_dra_arcsec / 3600.0  #position of guide star from object in degrees
-    #     gstar_ddec_deg = gstar_ddec_arcsec / 3600.0  #position of guide star from object in degrees
-    #     gstar_dx = (-gstar_dra_arcsec * cos(radians(PA - 45.0)) + gstar_ddec_arcsec * sin(
-    #         radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-    #     gstar_dy = (gstar_dra_arcsec * sin(radians(PA - 45.0)) + gstar_ddec_arcsec * cos(
-    #         radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-    #     gstar_sl = -gstar_dra_arcsec * cos(radians(PA - 90.0)) + gstar_ddec_arcsec * sin(
-    #         radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-    #     gstar_sw = gstar_dra_arcsec * sin(radians(PA - 90.0)) + gstar_ddec_arcsec * cos(
-    #         radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-
-    # create_region_template(delta_PA, plate_scale, gstar_dra_deg, gstar_ddec_deg, gstar_sl,
-    #                        gstar_sw, mirror_field)  #Make region template file rotated and the specified PA
-    # create_region(obj_coords, delta_PA, plate_scale, gstar_dra_deg, gstar_ddec_deg, gstar_sl,
-    #                        gstar_sw, mirror_field)  #Make region template file rotated and the specified PA
-    ds9.set('regions delete all')
-    create_region(obj_coords, delta_PA, plate_scale, guidestar_dra=guidestar_dra, guidestar_ddec=guidestar_ddec, guidestar_sl=guidestar_sl, guidestar_sw=guidestar_sw, mirror_field=mirror_field, 
-        show_scan=target.use_slitscan.get(), scan_blocks=target.scan_blocks, scan_plus_90_deg=target.scan_rotation.get()=='+90 deg PA')  #Make region template file rotated and the specified PA
-    #ds9.set(
-    #    'regions template IGRINS_svc_generated.tpl at ' + obj_coords.showcoords() + ' fk5')  #Read in regions template file
-    #ds9.set('pan to '+obj_coords.showcoords() + ' wcs fk5')
-    #ds9.set('regions template ' + current_working_directory + 'IGRINS_svc_generated.tpl at,  ' + obj_coords.showcoords() + ' wcs fk5')
-    #ds9.set('regions template ' + current_working_directory + 'IGRINS_svc_generated.tpl')
-    ds9.set('regions ' + current_working_directory + 'IGRINS_svc_generated.reg')
-    ds9.set('regions select all')
-    ds9.set('regions move back')
-    ds9.set('regions group FOV new')
-    ds9.set('regions select none')  #Deslect regions when finished
-    ds9.set(
-        'align yes')  #Set north to be up and east to be left, before rotating, for weird fits files that open at odd angles
-    ds9.rotto(-45 + delta_PA)  #Set orientation to match IGRINS guider
-
-    ds9.set('pan to ' + obj_coords.showcoords() + ' wcs fk5')  #Center frame on target object
-    ds9.set('zoom to fit')
-    ds9.set('zoom 1.8')  #Try to set the zoom to easily see the IGRINS FOV
-    ds9.set('mode pointer')  #Go to this standard editing mode in DS9
-
-    # if gstar_choice == '4':  #If user specifies code to find guide stars automatically
-    #     gstar_dec_limit = gstar_dec_limit / (2.0 * 60.0)  #Convert limit in Dec. to degrees
-    #     gstar_ra_limit = gstar_ra_limit / (2.0 * 60.0 * obj_coords.dec.cos())  #Convert limit in RA to degrees
-    #     ds9.set('catalog 2mass')  #Initialize catalog
-    #     # ds9.set("catalog filter '$RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + "&&$RAJ2000<=" + str(
-    #     #     obj_coords.ra.deg() + gstar_ra_limit) \
-    #     #         + "&&$DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + "&&$DEJ2000<=" + str(
-    #     #     obj_coords.dec.deg() + gstar_dec_limit) \
-    #     #         + "&&$Kmag<=" + str(gstar_mag_limit) + "'")  #Load catalog
-    #     ds9.set(r"catalog filter '$RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + r" $RAJ2000<=" + str(
-    #         obj_coords.ra.deg() + gstar_ra_limit) \
-    #             + r" $DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + r" $DEJ2000<=" + str(
-    #         obj_coords.dec.deg() + gstar_dec_limit) \
-    #             + r" $Kmag<=" + str(gstar_mag_limit) + r"'")  #Load catalog
-    #     ds9.set(
-    #         "catalog sort 'Kmag' incr")  #Sort list by starting from brightest K-band mag. and getting dimmer as you go down
-    #     ds9.set("catalog export tsv " + current_working_directory + "tmp.dat")  #Save catalog list as a tab seperated value file for later trimming
-    #     lines = open('tmp.dat').readlines()  #Open catalog list tsv file into memory
-    #     if len(lines) > 1:
-    #         open('tmp.dat', 'w').writelines(
-    #             lines[0:n_gstars + 1])  #Truncate by maximum number of guide stars and save catalog list
-    #         ds9.set('catalog clear')  #Clear 2MASS catalog
-    #         ds9.set('catalog close')  #Close 2MASS catalog window
-    #         ds9.set('catalog import tsv ' + current_working_directory + 'tmp.dat')  #Load only brightest stars to be potential guide stars
-    #         ds9.set(
-    #             'mode catalog')  #Set mode to catalog so user can click on possible guide stars and look at their stats
-    #         gra, gdec, gmag = loadtxt('tmp.dat', usecols=(0, 1, 9), delimiter='\t', unpack=True,
-    #                                   skiprows=1)  #Grab RA, Dec., and K-mag from catalog
-    #         gra = ascontiguousarray(gra) #Fix a bug
-    #         gdec = ascontiguousarray(gdec)
-    #         gmag = ascontiguousarray(gmag)
-    #         n_gstars = size(gra)  #reset n_gstars to the actual number of guide stars found
-    #         command_line_output.append('Guide stars found:')  #Output for command line
-    #         command_line_output.append('K-mag:\t sl: \t sw: \t\t Coordinates (J2000):')  #Output for command line
-    #         for i in range(n_gstars):  #Loop through each guide star found and
+            # ds9.set('2mass close')  #Close 2MASS window
+
+            ds9.set('scale log')  #Set view to log scale
+            ds9.set('scale Zmax')  #Set scale limits to Zmax, looks okay
+        # else:  #If user does specify their own fits file, use it
+        #     ds9.set('fits ' + finder_chart_fits)  #Load fits fits file
+
+        # #Grab guide star RA and Dec. from user input if specified
+        # if gstar_choice == '1':  #Grab guide star coordinates from dRA & dDec input in arcseconds (distance guide star is from target in arcseconds)
+        #dra, ddec = gstar_input.split(' ')  #Sepearte delta RA and Dec. by a space entered by the user
+        # dra = float(dra) / 3600.0  #Convert arcseconds to degrees
+        # ddec = float(ddec) / 3600.0  #convert arcseconds to degrees
+        # gstar_coords = coords(obj_coords.ra.deg() + dra / obj_coords.dec.cos(), obj_coords.dec.deg() + ddec)
+        # elif gstar_choice == '2':  #Grab guide star coordinates from RA & Dec input
+        #     gstar_coords = coord_query(gstar_input)
+        # elif gstar_choice == '3':  #Grab guide star coordinates from name lookup on internet
+        #     gstar_coords = name_query(gstar_input)
+
+        # if gstar_choice != '0' and gstar_choice != '4':  #If single guide star actually put in by user calculate the following parameters...
+        #     gstar_dra_arcsec = ra_seperation(obj_coords, gstar_coords,
+        #                                      units='arcsec')  #position of guide star from object in arcseconds
+        #     gstar_ddec_arcsec = dec_seperation(obj_coords, gstar_coords,
+        #                                        units='arcsec')  #position of guide star from object in arcseconds
+        #     gstar_dra_deg = gstar_dra_arcsec / 3600.0  #position of guide star from object in degrees
+        #     gstar_ddec_deg = gstar_ddec_arcsec / 3600.0  #position of guide star from object in degrees
+        #     gstar_dx = (-gstar_dra_arcsec * cos(radians(PA - 45.0)) + gstar_ddec_arcsec * sin(
+        #         radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
+        #     gstar_dy = (gstar_dra_arcsec * sin(radians(PA - 45.0)) + gstar_ddec_arcsec * cos(
+        #         radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
+        #     gstar_sl = -gstar_dra_arcsec * cos(radians(PA - 90.0)) + gstar_ddec_arcsec * sin(
+        #         radians(PA - 90.0))  #guide star position relative to slit in arcseconds
+        #     gstar_sw = gstar_dra_arcsec * sin(radians(PA - 90.0)) + gstar_ddec_arcsec * cos(
+        #         radians(PA - 90.0))  #guide star position relative to slit in arcseconds
+
+        # create_region_template(delta_PA, plate_scale, gstar_dra_deg, gstar_ddec_deg, gstar_sl,
+        #                        gstar_sw, mirror_field)  #Make region template file rotated and the specified PA
+        # create_region(obj_coords, delta_PA, plate_scale, gstar_dra_deg, gstar_ddec_deg, gstar_sl,
+        #                        gstar_sw, mirror_field)  #Make region template file rotated and the specified PA
+        ds9.set('regions delete all')
+        create_region(obj_coords, delta_PA, plate_scale, guidestar_dra=guidestar_dra, guidestar_ddec=guidestar_ddec, guidestar_sl=guidestar_sl, guidestar_sw=guidestar_sw, mirror_field=mirror_field, 
+            show_scan=show_scan, scan_blocks=scan_blocks, scan_plus_90_deg=scan_plus_90_deg,
+            max_deviation=svc_outline_tolerance_for_fov(fov))  #Make region template file rotated and the specified PA, with the SVC outline simplified for the image FOV
+        #ds9.set(
+        #    'regions template IGRINS_svc_generated.tpl at ' + obj_coords.showcoords() + ' fk5')  #Read in regions template file
+        #ds9.set('pan to '+obj_coords.showcoords() + ' wcs fk5')
+        #ds9.set('regions template ' + current_working_directory + 'IGRINS_svc_generated.tpl at,  ' + obj_coords.showcoords() + ' wcs fk5')
+        #ds9.set('regions template ' + current_working_directory + 'IGRINS_svc_generated.tpl')
+        ds9.set('regions ' + current_working_directory + 'IGRINS_svc_generated.reg')
+        ds9.set('regions select all')
+        ds9.set('regions move back')
+        ds9.set('regions group FOV new')
+        ds9.set('regions select none')  #Deslect regions when finished
+        ds9.set(
+            'align yes')  #Set north to be up and east to be left, before rotating, for weird fits files that open at odd angles
+        ds9.rotto(-45 + delta_PA)  #Set orientation to match IGRINS guider
+
+        ds9.set('pan to ' + obj_coords.showcoords() + ' wcs fk5')  #Center frame on target object
+        ds9.set('zoom to fit')
+        ds9.set('zoom 1.8')  #Try to set the zoom to easily see the IGRINS FOV
+        ds9.set('mode pointer')  #Go to this standard editing mode in DS9
+
+        # if gstar_choice == '4':  #If user specifies code to find guide stars automatically
+        #     gstar_dec_limit = gstar_dec_limit / (2.0 * 60.0)  #Convert limit in Dec. to degrees
+        #     gstar_ra_limit = gstar_ra_limit / (2.0 * 60.0 * obj_coords.dec.cos())  #Convert limit in RA to degrees
+        #     ds9.set('catalog 2mass')  #Initialize catalog
+        #     # ds9.set("catalog filter '$RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + "&&$RAJ2000<=" + str(
+        #     #     obj_coords.ra.deg() + gstar_ra_limit) \
+        #     #         + "&&$DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + "&&$DEJ2000<=" + str(
+        #     #     obj_coords.dec.deg() + gstar_dec_limit) \
+        #     #         + "&&$Kmag<=" + str(gstar_mag_limit) + "'")  #Load catalog
+        #     ds9.set(r"catalog filter '$RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + r" $RAJ2000<=" + str(
+        #         obj_coords.ra.deg() + gstar_ra_limit) \
+        #             + r" $DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + r" $DEJ2000<=" + str(
+        #         obj_coords.dec.deg() + gstar_dec_limit) \
+        #             + r" $Kmag<=" + str(gstar_mag_limit) + r"'")  #Load catalog
+        #     ds9.set(
+        #         "catalog sort 'Kmag' incr")  #Sort list by starting from brightest K-band mag. and getting dimmer as you go down
+        #     ds9.set("catalog export tsv " + current_working_directory + "tmp.dat")  #Save catalog list as a tab seperated value file for later trimming
+        #     lines = open('tmp.dat').readlines()  #Open catalog list tsv file into memory
+        #     if len(lines) > 1:
+        #         open('tmp.dat', 'w').writelines(
+        #             lines[0:n_gstars + 1])  #Truncate by maximum number of guide stars and save catalog list
+        #         ds9.set('catalog clear')  #Clear 2MASS catalog
+        #         ds9.set('catalog close')  #Close 2MASS catalog window
+        #         ds9.set('catalog import tsv ' + current_working_directory + 'tmp.dat')  #Load only brightest stars to be potential guide stars
+        #         ds9.set(
+        #             'mode catalog')  #Set mode to catalog so user can click on possible guide stars and look at their stats
+        #         gra, gdec, gmag = loadtxt('tmp.dat', usecols=(0, 1, 9), delimiter='\t', unpack=True,
+        #                                   skiprows=1)  #Grab RA, Dec., and K-mag from catalog
+        #         gra = ascontiguousarray(gra) #Fix a bug
+        #         gdec = ascontiguousarray(gdec)
+        #         gmag = ascontiguousarray(gmag)
+        #         n_gstars = size(gra)  #reset n_gstars to the actual number of guide stars found
+        #         command_line_output.append('Guide stars found:')  #Output for command line
+        #         command_line_output.append('K-mag:\t sl: \t sw: \t\t Coordinates (J2000):')  #Output for command line
+        #         for i in range(n_gstars):  #Loop through each guide star found and
                 
-    #             gstar_coords = coords(gra[i], gdec[i])
-    #             found_gstar_dra_arcsec = ra_seperation(obj_coords, gstar_coords,
-    #                                                    units='arcsec')  #position of guide star from object in arcseconds
-    #             found_gstar_ddec_arcsec = dec_seperation(obj_coords, gstar_coords,
-    #                                                      units='arcsec')  #position of guide star from object in arcseconds
-    #             gstar_dx = (-found_gstar_dra_arcsec * cos(radians(PA - 45.0)) + found_gstar_ddec_arcsec * sin(
-    #                 radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-    #             gstar_dy = (found_gstar_dra_arcsec * sin(radians(PA - 45.0)) + found_gstar_ddec_arcsec * cos(
-    #                 radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-    #             gstar_sl = -found_gstar_dra_arcsec * cos(radians(PA - 90.0)) + found_gstar_ddec_arcsec * sin(
-    #                 radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-    #             gstar_sw = found_gstar_dra_arcsec * sin(radians(PA - 90.0)) + found_gstar_ddec_arcsec * cos(
-    #                 radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-    #             command_line_output.append("%7.2f" % gmag[
-    #                 i] + '\t' + "%7.2f" % gstar_sl + '\t' + "%7.2f" % gstar_sw + '\t\t' + gstar_coords.showcoords())  #Save info on found guide stars to the command line
-    #             ds9.draw('fk5; point(' + str(gra[i]) + ',' + str(
-    #                 gdec[i]) + ') # point=cross font={helvetica 9 bold roman} color=yellow text={[K: ' \
-    #                      + str(gmag[
-    #                 i]) + '; SL: ' + "%5.2f" % gstar_sl + '; SW: ' + "%5.2f" % gstar_sw + ']}')  #Put pointer regions to guide stars in DS9
-    #     else:
-    #         ds9.set('catalog clear')  #Clear 2MASS catalog
-    #         ds9.set('catalog close')  #Close 2MASS catalog window
-    #         print('ERROR: No possible guide stars found. Check target position and then the mangitude, RA, & Dec limits in options.inp and retry.')    
-
-
-#Search for guide stars
-def search_for_guide_stars(target_ra, target_dec, n_gstars, PA, survey, use_proper_motion, epoch):
-    obj_coords = coord_query(target_ra+' '+target_dec) #Put RA and DEC in a coords object
-    gstar_dec_limit = gstar_dec_limit_arcmin / (2.0 * 60.0)  #Convert limit in Dec. to degrees
-    gstar_ra_limit = gstar_ra_limit_arcmin / (2.0 * 60.0 * obj_coords.dec.cos())  #Convert limit in RA to degrees
+        #             gstar_coords = coords(gra[i], gdec[i])
+        #             found_gstar_dra_arcsec = ra_seperation(obj_coords, gstar_coords,
+        #                                                    units='arcsec')  #position of guide star from object in arcseconds
+        #             found_gstar_ddec_arcsec = dec_seperation(obj_coords, gstar_coords,
+        #                                                      units='arcsec')  #position of guide star from object in arcseconds
+        #             gstar_dx = (-found_gstar_dra_arcsec * cos(radians(PA - 45.0)) + found_gstar_ddec_arcsec * sin(
+        #                 radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
+        #             gstar_dy = (found_gstar_dra_arcsec * sin(radians(PA - 45.0)) + found_gstar_ddec_arcsec * cos(
+        #                 radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
+        #             gstar_sl = -found_gstar_dra_arcsec * cos(radians(PA - 90.0)) + found_gstar_ddec_arcsec * sin(
+        #                 radians(PA - 90.0))  #guide star position relative to slit in arcseconds
+        #             gstar_sw = found_gstar_dra_arcsec * sin(radians(PA - 90.0)) + found_gstar_ddec_arcsec * cos(
+        #                 radians(PA - 90.0))  #guide star position relative to slit in arcseconds
+        #             command_line_output.append("%7.2f" % gmag[
+        #                 i] + '\t' + "%7.2f" % gstar_sl + '\t' + "%7.2f" % gstar_sw + '\t\t' + gstar_coords.showcoords())  #Save info on found guide stars to the command line
+        #             ds9.draw('fk5; point(' + str(gra[i]) + ',' + str(
+        #                 gdec[i]) + ') # point=cross font={helvetica 9 bold roman} color=yellow text={[K: ' \
+        #                      + str(gmag[
+        #                 i]) + '; SL: ' + "%5.2f" % gstar_sl + '; SW: ' + "%5.2f" % gstar_sw + ']}')  #Put pointer regions to guide stars in DS9
+        #     else:
+        #         ds9.set('catalog clear')  #Clear 2MASS catalog
+        #         ds9.set('catalog close')  #Close 2MASS catalog window
+        #         print('ERROR: No possible guide stars found. Check target position and then the mangitude, RA, & Dec limits in options.inp and retry.')    
+
+
+#Read a guide star catalog exported by DS9 as a tab seperated value file (e.g. tmp.dat), or the lines of one (header first)
+#Returns arrays of RA, Dec. (decimal degrees), K-mag, and proper motion in RA and Dec (mas/yr, zero for 2MASS)
+def read_guide_star_catalog(filename, survey):
+    if survey == 'Gaia DR2': #If using Gaia, columns are from the Gaia catalog matched to 2MASS
+        gra, gdec, gmag, gpra, gpdec = genfromtxt(filename, usecols=(0, 1, 43, 9, 11), delimiter='\t', unpack=True,
+                                 skip_header=1, missing_values='', filling_values=0, ndmin=1)  #Grab RA, Dec., K-mag and proper motion from catalog
+    else: #If just using 2MASS point source catalog
+        gra, gdec, gmag = loadtxt(filename, usecols=(0, 1, 9), delimiter='\t', unpack=True,
+                                 skiprows=1, ndmin=1)  #Grab RA, Dec., and K-mag from catalog
+        gpra = zeros(size(gra))
+        gpdec = zeros(size(gra))
+    gra = ascontiguousarray(gra) #Fix a bug
+    gdec = ascontiguousarray(gdec)
+    gmag = ascontiguousarray(gmag)
+    gpra = ascontiguousarray(gpra)
+    gpdec = ascontiguousarray(gpdec)
+    return gra, gdec, gmag, gpra, gpdec
+
+
+#Read the extra columns used to score guide stars (see guide_star_scoring.py) from a catalog exported by DS9, or the lines of one
+#Returns a dictionary of arrays: "pm_error" (total proper motion error, mas/yr), "gmag" (Gaia G mag.), and "bp_rp" (Gaia BP-RP color)
+#NaN where the catalog (e.g. 2MASS) or the star doesn't have them
+def read_guide_star_details(filename, survey):
+    if survey == 'Gaia DR2': #e_pmRA, e_pmDE, Gmag, and BP-RP from the Gaia columns of the catalog matched to 2MASS
+        e_pmra, e_pmdec, gmag, bp_rp = genfromtxt(filename, usecols=(10, 12, 16, 26), delimiter='\t', unpack=True,
+                                 skip_header=1, missing_values='', filling_values=nan, ndmin=1)
+        return {'pm_error': hypot(e_pmra, e_pmdec), 'gmag': ascontiguousarray(gmag), 'bp_rp': ascontiguousarray(bp_rp)}
+    return empty_guide_star_details(len(loadtxt(filename, usecols=(0,), delimiter='\t', skiprows=1, ndmin=1)))
+
+
+#Guide star details (like read_guide_star_details) for n stars from a catalog without any of them
+def empty_guide_star_details(n):
+    return {'pm_error': full(n, nan), 'gmag': full(n, nan), 'bp_rp': full(n, nan)}
+
+
+#Column with the K-band magnitude in catalogs exported by DS9 (see read_guide_star_catalog)
+def kmag_column(survey):
+    if survey == 'Gaia DR2':
+        return 43
+    return 9
+
+
+#Have the DS9 catalog just loaded fetch every star in a box in RA and Dec. (degrees), instead of the stars around the current
+#frame at DS9's default size, so the query covers all of the box (e.g. the catalog cache tiles that are going to be stored)
+def set_catalog_query_box(ra_min, ra_max, dec_min, dec_max):
+    closest_to_equator = 0.0 if dec_min <= 0.0 <= dec_max else minimum(abs(dec_min), abs(dec_max)) #Where the box is widest on the sky
+    width_arcmin = (ra_max - ra_min) * cos(radians(closest_to_equator)) * 60.0 + 2.0 * catalog_query_margin_arcmin
+    height_arcmin = (dec_max - dec_min) * 60.0 + 2.0 * catalog_query_margin_arcmin
+    ds9.set('catalog coordinate ' + repr(float((ra_min + ra_max) / 2.0)) + ' ' + repr(float((dec_min + dec_max) / 2.0)) + ' fk5')
+    ds9.set('catalog size ' + '%.4f' % width_arcmin + ' ' + '%.4f' % height_arcmin + ' arcmin')
+    ds9.set('catalog retrieve')
+
+
+#Have DS9 query the guide star catalog for stars in a box in RA and Dec. (degrees), sorted from brightest K-band mag.
+#Returns the lines (header first) of the catalog exported by DS9 as a tab seperated value file
+def query_guide_star_catalog_in_ds9(survey, ra_min, ra_max, dec_min, dec_max):
+    ds9.ensure_open() #Start DS9 if this is the first time it is needed
     if survey == 'Gaia DR2':
         ds9.set('catalog gaia')
-        ds9.set(r"catalog filter $_RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + r"&&$_RAJ2000<=" + str(
-            obj_coords.ra.deg() + gstar_ra_limit) \
-                + r"&&$_DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + r"&&$_DEJ2000<=" + str(
-            obj_coords.dec.deg() + gstar_dec_limit) \
+        set_catalog_query_box(ra_min, ra_max, dec_min, dec_max)
+        ds9.set(r"catalog filter $_RAJ2000>=" + str(ra_min) + r"&&$_RAJ2000<=" + str(ra_max) \
+                + r"&&$_DEJ2000>=" + str(dec_min) + r"&&$_DEJ2000<=" + str(dec_max) \
                 + r"&&$RPmag<=" + str(gstar_mag_limit+3.0) + r"&&$RPmag>0.01")  #Load catalog
-    #    elif survey == '2MASS point source':
     ds9.set('catalog 2mass')  #Initialize catalog
-    # ds9.set("catalog filter '$RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + "&&$RAJ2000<=" + str(
-    #     obj_coords.ra.deg() + gstar_ra_limit) \
-    #         + "&&$DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + "&&$DEJ2000<=" + str(
-    #     obj_coords.dec.deg() + gstar_dec_limit) \
-    #         + "&&$Kmag<=" + str(gstar_mag_limit) + "'")  #Load catalog
-    ds9.set(r"catalog filter $RAJ2000>=" + str(obj_coords.ra.deg() - gstar_ra_limit) + r"&&$RAJ2000<=" + str(
-        obj_coords.ra.deg() + gstar_ra_limit) \
-            + r"&&$DEJ2000>=" + str(obj_coords.dec.deg() - gstar_dec_limit) + r"&&$DEJ2000<=" + str(
-        obj_coords.dec.deg() + gstar_dec_limit) \
+    set_catalog_query_box(ra_min, ra_max, dec_min, dec_max)
+    ds9.set(r"catalog filter $RAJ2000>=" + str(ra_min) + r"&&$RAJ2000<=" + str(ra_max) \
+            + r"&&$DEJ2000>=" + str(dec_min) + r"&&$DEJ2000<=" + str(dec_max) \
             + r"&&$Kmag<=" + str(gstar_mag_limit))  #Load catalog
-
-
     if survey == 'Gaia DR2':
         ds9.set('catalog match error 5 arcsec')
         ds9.set('catalog match')
-    #ds9.set("catalog sort '2_Kmag' incr")  #Sort list by starting from brightest K-band mag. and getting dimmer as you go down
     ds9.set("catalog sort 'Kmag' incr")  #Sort list by starting from brightest K-band mag. and getting dimmer as you go down
-    ds9.set("catalog export tsv " + current_working_directory + "tmp.dat")  #Save catalog list as a tab seperated value file for later trimming
-    lines = open('tmp.dat').readlines()  #Open catalog list tsv file into memory
-    #breakpoint()
-    if len(lines) > 1:
-        open('tmp.dat', 'w').writelines(
-            lines[0:n_gstars + 1])  #Truncate by maximum number of guide stars and save catalog list
-        ds9.set('catalog clear')  #Clear 2MASS catalo, note run 3 times to close all the catalog windows
+    export_filename = current_working_directory + 'tmp.dat'
+    if os.path.exists(export_filename): #Remove the last export so a query that fails can't be mistaken for this one
+        os.remove(export_filename)
+    ds9.set("catalog export tsv " + export_filename)  #Save catalog list as a tab seperated value file for later trimming
+    ds9.flush() #Make sure DS9 has written out the catalog before reading it
+    lines = []
+    if os.path.exists(export_filename):
+        with open(export_filename) as f:
+            lines = f.readlines()  #Open catalog list tsv file into memory
+    ds9.set('catalog clear')  #Clear 2MASS catalog, note run 3 times to close all the catalog windows
+    ds9.set('catalog close')  #Close 2MASS catalog window
+    if survey == 'Gaia DR2' and len(lines) > 1: #If using Gaia
+        ds9.set('catalog clear')  #Clear 2MASS catalog
         ds9.set('catalog close')  #Close 2MASS catalog window
-        if survey == 'Gaia DR2': #If using Gaia
-            ds9.set('catalog clear')  #Clear 2MASS catalog
-            ds9.set('catalog close')  #Close 2MASS catalog window
-            ds9.set('catalog clear')  #Clear 2MASS catalog
-            ds9.set('catalog close')  #Close 2MASS catalog window
-            gra, gdec, gmag, gpra, gpdec = genfromtxt('tmp.dat', usecols=(0, 1, 43, 9, 11), delimiter='\t', unpack=True,
-                                     skip_header=1, missing_values='', filling_values=0)  #Grab RA, Dec., K-mag and proper motion from catalog
-            gpra = ascontiguousarray(gpra)
-            gpdec = ascontiguousarray(gpdec)
-        else: #If just using 2MASS gdec source catalog
-            gra, gdec, gmag = loadtxt('tmp.dat', usecols=(0, 1, 9), delimiter='\t', unpack=True,
-                                     skiprows=1)  #Grab RA, Dec., and K-mag from catalog
-        gra = ascontiguousarray(gra) #Fix a bug
-        gdec = ascontiguousarray(gdec)
-        gmag = ascontiguousarray(gmag)
-        n_gstars = size(gra)  #reset n_gstars to the actual number of guide stars found
-        print('Guide stars found:')  #Output for command line
-        print('K-mag:\t sl: \t sw: \t\t Coordinates (J2000):')  #Output for command line
-        for i in range(n_gstars):  #Loop through each guide star found and
-            
-            gstar_coords = coords(gra[i], gdec[i])
-            found_gstar_dra_arcsec = ra_seperation(obj_coords, gstar_coords,
-                                                   units='arcsec')  #position of guide star from object in arcseconds
-            found_gstar_ddec_arcsec = dec_seperation(obj_coords, gstar_coords,
-                                                     units='arcsec')  #position of guide star from object in arcseconds
-            if use_proper_motion == True and survey == 'Gaia DR2': #If using the Gaia catalog and user specifies they want to use proper motion, apply proper motion here
-                proper_motion_ra_distance_arcsec = gpra[i] * 1e-3 * (epoch-2000.0)
-                proper_motion_dec_distance_arcsec = gpdec[i] * 1e-3 * (epoch-2000.0)
-                found_gstar_dra_arcsec += proper_motion_ra_distance_arcsec
-                found_gstar_ddec_arcsec += proper_motion_dec_distance_arcsec
-                gra += proper_motion_ra_distance_arcsec / cos(radians(gdec)) / 3600.0
-                gdec += proper_motion_dec_distance_arcsec / 3600.0
-            # gstar_dx = (-found_gstar_dra_arcsec * cos(radians(PA - 45.0)) + found_gstar_ddec_arcsec * sin(
-            #     radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-            # gstar_dy = (found_gstar_dra_arcsec * sin(radians(PA - 45.0)) + found_gstar_ddec_arcsec * cos(
-            #     radians(PA - 45.0)) ) / plate_scale  #guide star position in pixels in the SVC display
-            gstar_sl = -found_gstar_dra_arcsec * cos(radians(PA - 90.0)) + found_gstar_ddec_arcsec * sin(
-                radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-            gstar_sw = found_gstar_dra_arcsec * sin(radians(PA - 90.0)) + found_gstar_ddec_arcsec * cos(
-                radians(PA - 90.0))  #guide star position relative to slit in arcseconds
-            print("%7.2f" % gmag[
-                i] + '\t' + "%7.2f" % gstar_sl + '\t' + "%7.2f" % gstar_sw + '\t\t' + gstar_coords.showcoords())  #Save info on found guide stars to the command line
-            ds9.draw('fk5 ; point(' + str(gra[i]) + ',' + str(
-                gdec[i]) + ') # point=cross font={helvetica 9 bold roman} color=yellow text={[K: ' \
-                     + str(gmag[
-                i]) + '; SL: ' + "%5.2f" % gstar_sl + '; SW: ' + "%5.2f" % gstar_sw + r']} tag={guidestars} move=0')  #Put pointer regions to guide stars in DS9
-        ds9.set('regions group guidestars movefront') #Move guidestar regions to front
-        ds9.set('mode region') #Set catalog mode so user can select the star they want
-    else:
         ds9.set('catalog clear')  #Clear 2MASS catalog
         ds9.set('catalog close')  #Close 2MASS catalog window
-        print('ERROR: No possible guide stars found. Check target position and then the mangitude, RA, & Dec limits in options.inp and retry.')    
+    lines = [line for line in lines if line.strip() != '']
+    import catalog_cache as catalog_cache_module
+    if not catalog_cache_module.has_header(lines): #E.g. DS9 could not reach the catalog server, don't take that as a field without stars
+        raise IOError('DS9 did not export the '+survey+' catalog, check the network connection and retry.')
+    return lines
+
+
+#Return the on-disk cache of guide star catalog queries, or None if it is turned off (or can't be made)
+def get_catalog_cache():
+    global catalog_cache
+    if catalog_cache is None and use_catalog_cache:
+        import catalog_cache as catalog_cache_module
+        try:
+            catalog_cache = catalog_cache_module.CatalogCache(catalog_cache_directory, max_bytes=catalog_cache_max_bytes)
+        except OSError:
+            return None
+    return catalog_cache
+
+
+#Return the local catalog index (see catalog_index.py) to search for guide stars in for a survey, or None to use the DS9 catalog tool
+def get_guide_star_index(survey):
+    directory = guide_star_index_directories.get(survey)
+    if directory is None:
+        return None
+    if directory not in guide_star_indexes:
+        import catalog_index
+        guide_star_indexes[directory] = catalog_index.CatalogIndex.load(directory)
+    return guide_star_indexes[directory]
+
+
+#Get the n_gstars brightest guide stars in a box in RA and Dec. (degrees) from the catalog cache or, if not cached, through DS9
+#Returns arrays of RA, Dec., K-mag and proper motion like read_guide_star_catalog
+#If use_ds9 is False, raises LookupError when the stars are not cached instead of querying through DS9
+#If details is set, a dictionary of the extra columns used to score guide stars (see read_guide_star_details) is also returned
+def query_guide_star_catalog(survey, search_box, n_gstars, use_ds9=True, details=False):
+    cache = get_catalog_cache()
+    lines = None
+    if cache is not None: #Try the cache first
+        lines = cache.lookup(survey, gstar_mag_limit, *search_box)
+        if lines is not None and len(lines) > 1: #Sort cached stars from brightest K-band mag., like DS9 does
+            lines = [lines[0]] + sorted(lines[1:], key=lambda line: float(line.split('\t')[kmag_column(survey)] or 'inf'))
+    if lines is None and not use_ds9:
+        raise LookupError('Guide stars for this field are not in the '+survey+' catalog cache or a local catalog index')
+    if lines is None: #Not cached so query the catalog through DS9
+        query_box = None
+        if cache is not None: #Query all of every cache tile the search touches so the tiles can be stored
+            query_box = cache.covering_box(*search_box)
+        if query_box is None:
+            query_box = search_box
+        lines = query_guide_star_catalog_in_ds9(survey, *query_box)
+        if cache is not None: #Only a real answer from the catalog server is stored (query_guide_star_catalog_in_ds9 raises otherwise)
+            cache.store(survey, gstar_mag_limit, lines, *query_box)
+        if len(lines) > 1: #Trim back down to the search box
+            lines = [lines[0]] + [line for line in lines[1:]
+                if search_box[0] <= float(line.split('\t')[0]) <= search_box[1] and search_box[2] <= float(line.split('\t')[1]) <= search_box[3]]
+    if cache is not None:
+        print('Guide star catalog cache:', cache.stats())
+    if len(lines) <= 1:
+        stars = zeros(0), zeros(0), zeros(0), zeros(0), zeros(0)
+        return stars + (empty_guide_star_details(0),) if details else stars
+    stars = read_guide_star_catalog(lines[0:n_gstars + 1], survey) #Truncate by maximum number of guide stars and grab RA, Dec., K-mag and proper motion
+    if details:
+        return stars + (read_guide_star_details(lines[0:n_gstars + 1], survey),)
+    return stars
+
+
+#Return the (ra_min, ra_max, dec_min, dec_max) box in degrees to search for guide stars in around a target at ra, dec (degrees)
+def guide_star_search_box(ra, dec):
+    gstar_dec_limit = gstar_dec_limit_arcmin / (2.0 * 60.0)  #Convert limit in Dec. to degrees
+    gstar_ra_limit = gstar_ra_limit_arcmin / (2.0 * 60.0 * cos(radians(dec)))  #Convert limit in RA to degrees
+    return (ra - gstar_ra_limit, ra + gstar_ra_limit, dec - gstar_dec_limit, dec + gstar_dec_limit)
 
 
+#Get the n_gstars brightest guide stars in a box in RA and Dec. (degrees) from the local catalog index for the survey if there
+#is one, otherwise from the catalog cache or through DS9 (see query_guide_star_catalog)
+def find_guide_stars(survey, search_box, n_gstars, use_ds9=True, details=False):
+    index = get_guide_star_index(survey)
+    if index is not None: #Use the local catalog index, no network or DS9 catalog tool needed
+        stars = index.stars(index.brightest(index.box(*search_box, mag_limit=gstar_mag_limit), n_gstars))
+        return tuple(stars) + (empty_guide_star_details(len(stars[0])),) if details else stars #The index only keeps positions, mags., and proper motions
+    return query_guide_star_catalog(survey, search_box, n_gstars, use_ds9=use_ds9, details=details)
+
+
+#Search for guide stars, list and mark them in DS9 ranked by guide_star_scoring.score_guide_stars (best first)
+#Returns a list of dictionaries of the ranked guide stars: ra and dec (sexagesimal), dra, ddec, sl, sw (arcsec), mag, score, and notes
+def search_for_guide_stars(target_ra, target_dec, n_gstars, PA, survey, use_proper_motion, epoch):
+    import guide_star_scoring
+    ranked = []
+    with ds9.batch(): #Queue up the DS9 commands and send them together
+        obj_coords = coord_query(target_ra+' '+target_dec) #Put RA and DEC in a coords object
+        search_box = guide_star_search_box(obj_coords.ra.deg(), obj_coords.dec.deg())
+        gra, gdec, gmag, gpra, gpdec, details = find_guide_stars(survey, search_box, n_gstars, details=True)
+        if len(gra) > 0:
+            apply_proper_motion = use_proper_motion == True and survey == 'Gaia DR2' #If using the Gaia catalog and user specifies they want to use proper motion, apply proper motion
+            gra, gdec, found_gstar_dra_arcsec, found_gstar_ddec_arcsec, gstar_sl, gstar_sw = calculate_guide_star_positions(
+                obj_coords.ra.deg(), obj_coords.dec.deg(), gra, gdec, PA, gpra=gpra, gpdec=gpdec, use_proper_motion=apply_proper_motion, epoch=epoch)
+            scores = guide_star_scoring.score_guide_stars(found_gstar_dra_arcsec, found_gstar_ddec_arcsec, gmag, PA, pmra=gpra, pmdec=gpdec,
+                details=details, epoch=epoch, use_proper_motion=apply_proper_motion)
+            output = ['Guide stars found (best first):', '  K-mag:\t sl: \t sw: \t\t Coordinates (J2000): \t Score:']  #Output for command line
+            regions = []
+            showcoords = coords_array(gra, gdec).showcoords().tolist()
+            for rank, row in enumerate(scores, 1):
+                i = int(row['index'])
+                ra, dec, mag, sl, sw, showcoord = gra[i], gdec[i], gmag[i], gstar_sl[i], gstar_sw[i], showcoords[i]
+                notes = guide_star_scoring.score_notes(row)
+                output.append("%2i" % rank + "%7.2f" % mag + '\t' + "%7.2f" % sl + '\t' + "%7.2f" % sw + '\t\t' + showcoord + '\t' + "%6.2f" % row['score'] \
+                    + ('\t' + notes if notes != '' else ''))  #Save info on found guide stars to the command line
+                regions.append('fk5 ; point(' + str(ra) + ',' + str(dec) + ') # point=cross font={helvetica 9 bold roman} color=yellow text={[#' + str(rank) + ' K: ' \
+                    + str(mag) + '; SL: ' + "%5.2f" % sl + '; SW: ' + "%5.2f" % sw + r']} tag={guidestars} move=0')  #Pointer regions to guide stars in DS9
+                ra, dec = showcoord.split()
+                ranked.append({'ra': ra, 'dec': dec, 'dra': float(row['dra']), 'ddec': float(row['ddec']), 'sl': float(sl), 'sw': float(sw),
+                    'mag': float(mag), 'score': float(row['score']), 'notes': notes})
+            print('\n'.join(output))
+            ds9.draw('\n'.join(regions)) #Put all the pointer regions to guide stars in DS9 at once
+            ds9.set('regions group guidestars movefront') #Move guidestar regions to front
+            ds9.set('mode region') #Set catalog mode so user can select the star they want
+        else:
+            print('ERROR: No possible guide stars found. Check target position and then the mangitude, RA, & Dec limits in options.inp and retry.')
+    return ranked
+
+
+
+#Calculate positions of guide stars relative to a target for arrays of guide star RA and Dec. (decimal degrees)
+#If use_proper_motion is set, each star is moved by its own proper motion (gpra, gpdec in mas/yr) from epoch 2000 to epoch
+#Returns arrays of the guide star RA and Dec (deg.), dRA and dDec from the target (arcsec), and sl and sw (arcsec) for the PA
+def calculate_guide_star_positions(target_ra, target_dec, gra, gdec, PA, gpra=None, gpdec=None, use_proper_motion=False, epoch=2000.0):
+    gra = array(gra, dtype=float) % 360.0
+    gdec = array(gdec, dtype=float)
+    target_dec_rad = radians(target_dec)
+    gdec_rad = radians(gdec)
+    #Same as ra_seperation: (RA2-RA1)*cos(dec) where cos(dec) is the average declination taken using the integral defintion of averages
+    same_dec = gdec_rad == target_dec_rad
+    with errstate(divide='ignore', invalid='ignore'):
+        average_cos_dec = where(same_dec, cos(target_dec_rad), (sin(gdec_rad) - sin(target_dec_rad)) / (gdec_rad - target_dec_rad))
+    dra = ((gra - target_ra + 180.0) % 360.0 - 180.0) * average_cos_dec * 3600.0  #position of guide star from object in arcseconds, the short way around through RA = 0
+    ddec = (gdec - target_dec) * 3600.0
+    if use_proper_motion:
+        proper_motion_ra_distance_arcsec = array(gpra, dtype=float) * 1e-3 * (epoch-2000.0)
+        proper_motion_dec_distance_arcsec = array(gpdec, dtype=float) * 1e-3 * (epoch-2000.0)
+        dra = dra + proper_motion_ra_distance_arcsec
+        ddec = ddec + proper_motion_dec_distance_arcsec
+        gra = (gra + proper_motion_ra_distance_arcsec / cos(gdec_rad) / 3600.0) % 360.0
+        gdec = gdec + proper_motion_dec_distance_arcsec / 3600.0
+    sl, sw = convert_from_dra_ddec_to_sl_sw(dra, ddec, PA)  #guide star position relative to slit in arcseconds
+    return gra, gdec, dra, ddec, sl, sw
+
 
 #Convert dRA and dDec provided by user for guide star to dG SL SW based on slit PA
 def convert_from_dra_ddec_to_sl_sw(dra_arcsec, ddec_arcsec, PA):
@@ -0,0 +1,190 @@
+#Draw finder charts to PNG or PDF files without DS9, from a local FITS image (e.g. from the finder chart image cache) and the
+#region file made by ds9_lib.create_region, so finder charts can be made in batch on a machine without a display
+#
+#The chart is drawn the way make_finder_chart_in_ds9 shows it: north up and east left ("align yes"), rotated by rotation
+#(-45 + delta_PA, like "rotate to"), centered on the target, with the whole image fit in the chart and then zoomed by zoom
+#(1.8), and a log scale with zscale/max limits.  The image is resampled onto the chart through its WCS, and the regions (SVC
+#outline, slit box, compass, guide star, and slitscan boxes) are placed through the same tangent plane, so everything lines
+#up on the sky.  Needs astropy and matplotlib, which are only imported when a chart is drawn.
+
+import re
+import numpy as np
+
+
+default_zoom = 1.8 #Same zoom make_finder_chart_in_ds9 sets after zooming to fit
+default_pixels = 900 #Size of the chart in pixels (PNG), about the size of the DS9 frame
+region_colors = {'green': '#00ff00', 'blue': '#0000ff', 'yellow': '#ffff00', 'red': '#ff0000', 'cyan': '#00ffff', 'magenta': '#ff00ff', 'white': '#ffffff'}
+
+
+#Project RA and Dec. (degrees) onto the plane tangent to the sky at ra0, dec0, returns (east, north) offsets in arcsec
+def sky_to_tangent_plane(ra, dec, ra0, dec0):
+    ra, dec = np.radians(ra), np.radians(dec)
+    ra0, dec0 = np.radians(ra0), np.radians(dec0)
+    cos_c = np.sin(dec0) * np.sin(dec) + np.cos(dec0) * np.cos(dec) * np.cos(ra - ra0)
+    east = np.cos(dec) * np.sin(ra - ra0) / cos_c
+    north = (np.cos(dec0) * np.sin(dec) - np.sin(dec0) * np.cos(dec) * np.cos(ra - ra0)) / cos_c
+    return np.degrees(east) * 3600.0, np.degrees(north) * 3600.0
+
+
+#Inverse of sky_to_tangent_plane, returns RA and Dec. (degrees) for (east, north) offsets in arcsec
+def tangent_plane_to_sky(east, north, ra0, dec0):
+    east, north = np.radians(np.asarray(east) / 3600.0), np.radians(np.asarray(north) / 3600.0)
+    ra0, dec0 = np.radians(ra0), np.radians(dec0)
+    denominator = np.cos(dec0) - north * np.sin(dec0)
+    ra = ra0 + np.arctan2(east, denominator)
+    dec = np.arctan2(np.sin(dec0) + north * np.cos(dec0), np.hypot(east, denominator))
+    return np.degrees(ra) % 360.0, np.degrees(dec)
+
+
+#Chart coordinates (arcsec, x to the right and y up on the chart) of (east, north) offsets in arcsec, for a chart rotated by rotation (deg.)
+def tangent_plane_to_chart(east, north, rotation):
+    angle = np.radians(rotation)
+    x, y = -np.asarray(east), np.asarray(north) #North up and east left
+    return x * np.cos(angle) - y * np.sin(angle), x * np.sin(angle) + y * np.cos(angle)
+
+
+def chart_to_tangent_plane(x, y, rotation):
+    angle = np.radians(rotation)
+    x, y = np.asarray(x), np.asarray(y)
+    x, y = x * np.cos(angle) + y * np.sin(angle), -x * np.sin(angle) + y * np.cos(angle)
+    return -x, y
+
+
+#Read the shapes out of a region file written by ds9_lib.create_region (fk5 coordinates in degrees, sizes in arcsec)
+#Returns a list of dictionaries with the shape, its numbers, and its color, width, and text
+def read_regions(filename):
+    regions = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            match = re.match(r'(#\s*)?(box|polygon|point|compass)\(([^)]*)\)\s*(.*)', line)
+            if match is None:
+                continue
+            shape, numbers, properties = match.group(2), match.group(3), match.group(4)
+            color = re.search(r'color=(\S+)', properties)
+            width = re.search(r'width=(\d+)', properties)
+            text = re.search(r'text=\{([^}]*)\}', properties)
+            regions.append({
+                'shape': shape,
+                'values': [float(value.strip().rstrip('"')) for value in numbers.split(',')],
+                'color': region_colors.get(color.group(1), color.group(1)) if color else region_colors['green'],
+                'width': int(width.group(1)) if width else 1,
+                'text': text.group(1) if text else '',
+            })
+    return regions
+
+
+#Corners (east, north offsets in arcsec) of boxes centered on east, north with length and width (arcsec) at angle (deg.)
+#DS9 measures box angles for sky regions counterclockwise from west with north up and east left
+def box_corners(east, north, length, width, angle):
+    angle = np.radians(angle)
+    ux, uy = np.cos(angle), np.sin(angle) #Long side of the box as (west, north)
+    corners = []
+    for a, b in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+        west = a * 0.5 * length * ux - b * 0.5 * width * uy
+        up = a * 0.5 * length * uy + b * 0.5 * width * ux
+        corners.append((east - west, north + up))
+    return corners
+
+
+#Matrix that linearly interpolates values at the coarse positions onto the fine positions (fine = matrix.dot(coarse))
+def interpolation_matrix(fine, coarse):
+    return np.column_stack([np.interp(fine, coarse, column) for column in np.eye(len(coarse))])
+
+
+#Resample a FITS image (through its WCS) onto a chart of n_pixels x n_pixels covering half_width arcsec either side of ra0, dec0
+#The WCS is only evaluated every grid_step chart pixels and interpolated in between, which is well under a pixel off for
+#finder chart sized fields and much faster than transforming every pixel
+#Returns the resampled image with NaN off the edges of the image
+def resample_image(data, wcs, ra0, dec0, rotation, half_width, n_pixels, grid_step=16):
+    grid = np.unique(np.append(np.arange(0, n_pixels, grid_step), n_pixels - 1)) #Chart pixels to evaluate the WCS at
+    grid_coordinates = (grid + 0.5) / n_pixels * 2.0 * half_width - half_width
+    x, y = np.meshgrid(grid_coordinates, grid_coordinates)
+    ra, dec = tangent_plane_to_sky(*chart_to_tangent_plane(x, y, rotation), ra0, dec0)
+    px, py = wcs.all_world2pix(ra, dec, 0)
+    interpolate = interpolation_matrix(np.arange(n_pixels), grid)
+    px = interpolate.dot(px).dot(interpolate.T)
+    py = interpolate.dot(py).dot(interpolate.T)
+    px, py = np.round(px), np.round(py) #Nearest pixel, like DS9 shows it
+    inside = np.isfinite(px) & np.isfinite(py) & (px >= 0) & (px < data.shape[1]) & (py >= 0) & (py < data.shape[0])
+    chart = np.full((n_pixels, n_pixels), np.nan)
+    chart[inside] = data[py[inside].astype(int), px[inside].astype(int)]
+    return chart
+
+
+#Scale the image like DS9's "scale log" with "scale Zmax" (zscale lower limit, max upper limit), returns values from 0 to 1
+def scale_image(data):
+    from astropy.visualization import ZScaleInterval, LogStretch
+    finite = data[np.isfinite(data)]
+    if len(finite) == 0:
+        return np.zeros(data.shape)
+    low = ZScaleInterval().get_limits(finite)[0]
+    high = finite.max()
+    if high <= low:
+        return np.zeros(data.shape)
+    return LogStretch(a=1000.0)(np.clip((data - low) / (high - low), 0.0, 1.0)) #DS9's log scale also uses an exponent of 1000
+
+
+#Draw a finder chart from a FITS image and a region file and save it to output_filename (.png or .pdf)
+#ra0 and dec0 (degrees) are the center of the chart, rotation (deg.) is what DS9 would be rotated to (-45 + delta_PA)
+#Returns output_filename
+def render_finder_chart(fits_filename, region_filename, output_filename, ra0, dec0, rotation, zoom=default_zoom, n_pixels=default_pixels, title=None):
+    from astropy.io import fits
+    from astropy.wcs import WCS
+    from astropy.wcs.utils import proj_plane_pixel_scales
+    from matplotlib.figure import Figure #Use the figure directly instead of pyplot so nothing needs a display and charts can be drawn in threads
+    from matplotlib.collections import LineCollection
+    with fits.open(fits_filename) as hdulist:
+        data = np.asarray(hdulist[0].data, dtype=float)
+        wcs = WCS(hdulist[0].header).celestial
+    while data.ndim > 2: #E.g. a single plane cube
+        data = data[0]
+    if not wcs.has_celestial:
+        raise ValueError('No celestial WCS in ' + fits_filename)
+    pixel_scale = proj_plane_pixel_scales(wcs).mean() * 3600.0 #arcsec
+    half_width = 0.5 * max(data.shape) * pixel_scale / zoom #Zoom to fit the whole image and then zoom in
+    chart = scale_image(resample_image(data, wcs, ra0, dec0, rotation, half_width, n_pixels))
+    figure = Figure(figsize=(n_pixels / 100.0, n_pixels / 100.0), dpi=100.0)
+    axes = figure.add_axes((0.0, 0.0, 1.0, 1.0))
+    axes.set_facecolor('black')
+    axes.imshow(chart, cmap='gray', origin='lower', extent=(-half_width, half_width, -half_width, half_width), interpolation='nearest', vmin=0.0, vmax=1.0)
+    lines, colors, widths = [], [], [] #Collect the outlines and draw them all at once, a slitscan can have thousands of boxes
+    def to_chart(ra, dec):
+        return tangent_plane_to_chart(*sky_to_tangent_plane(ra, dec, ra0, dec0), rotation)
+    def add_line(x, y, region):
+        lines.append(np.column_stack((x, y)))
+        colors.append(region['color'])
+        widths.append(region['width'])
+    for region in read_regions(region_filename):
+        values = region['values']
+        if region['shape'] == 'box':
+            east, north = sky_to_tangent_plane(values[0], values[1], ra0, dec0)
+            corners = box_corners(east, north, values[2], values[3], values[4])
+            x, y = tangent_plane_to_chart([corner[0] for corner in corners + corners[:1]], [corner[1] for corner in corners + corners[:1]], rotation)
+            add_line(x, y, region)
+        elif region['shape'] == 'polygon':
+            x, y = to_chart(values[0::2] + values[0:1], values[1::2] + values[1:2])
+            add_line(x, y, region)
+        elif region['shape'] == 'point':
+            x, y = to_chart(values[0], values[1])
+            axes.plot([x], [y], marker='o', markersize=8, markerfacecolor='none', markeredgecolor=region['color'])
+            if region['text'] != '':
+                axes.annotate(region['text'], (x, y), xytext=(0, 8), textcoords='offset points', ha='center', color=region['color'], fontsize=9, fontweight='bold')
+        elif region['shape'] == 'compass':
+            east, north = sky_to_tangent_plane(values[0], values[1], ra0, dec0)
+            size = values[2] if len(values) > 2 else 36.0
+            for label, (d_east, d_north) in (('N', (0.0, size)), ('E', (size, 0.0))):
+                x, y = tangent_plane_to_chart([east, east + d_east], [north, north + d_north], rotation)
+                axes.annotate('', xy=(x[1], y[1]), xytext=(x[0], y[0]), arrowprops={'arrowstyle': '->', 'color': region['color']})
+                axes.text(x[1] + 0.1 * (x[1] - x[0]), y[1] + 0.1 * (y[1] - y[0]), label, color=region['color'], fontsize=12, fontweight='bold', ha='center', va='center')
+    axes.add_collection(LineCollection(lines, colors=colors, linewidths=widths))
+    axes.set_xlim(-half_width, half_width)
+    axes.set_ylim(-half_width, half_width)
+    axes.set_axis_off()
+    if title is not None:
+        axes.text(0.02, 0.98, title, transform=axes.transAxes, color='white', fontsize=12, fontweight='bold', va='top')
+    if output_filename.lower().endswith('.png'):
+        figure.savefig(output_filename, dpi=100.0, facecolor='black', pil_kwargs={'compress_level': 1}) #Fast compression, the noisy sky hardly compresses anyway
+    else:
+        figure.savefig(output_filename, dpi=100.0, facecolor='black')
+    return output_filename
@@ -0,0 +1,131 @@
+#Guide star scoring: rank guide star candidates by how good a first pick they are for acquiring the target
+#
+#Sorting by K mag. alone often puts first a star that is outside the SVC field at the PA, on the slit, right next to another
+#star the guider could jump to, or somewhere else by the time it is observed.  score_guide_stars() works out for every
+#candidate at once:
+#  - edge_distance: how far inside (positive) or outside (negative) the edge of the SVC field the star is at the PA (arcsec)
+#  - slit_distance: how far the star is from the edge of the slit (arcsec)
+#  - n_neighbors and nearest_neighbor: other candidates within neighbor_radius that are not much fainter, which could confuse the guider
+#  - position_error: how far the star could be from its catalog position at the epoch (arcsec), from the proper motion error, or
+#    the whole proper motion if it is not applied, or unknown_pm_error if the catalog doesn't have one (e.g. 2MASS)
+#  - mag_residual: Gaia G - 2MASS K minus the G - K expected for the star's Gaia BP-RP color, a large one means the Gaia and
+#    2MASS stars were matched wrong (or one is a blend) and the K mag. can't be trusted
+#and adds them up into a score in mags (the K mag. plus penalties, lower is better).  Stars that are usable (in the field with
+#pa_optimizer.edge_margin to spare and pa_optimizer.min_slit_distance off the slit) come first, best score first.
+
+import numpy as np
+import ds9_lib
+import pa_optimizer
+
+
+neighbor_radius = 6.0 #Other stars closer than this (arcsec) can confuse the guider...
+neighbor_dmag = 2.5 #...unless they are at least this many mags. fainter
+neighbor_penalty = 2.0 #Mags. added to the score for each confusing neighbor
+edge_comfort = 5.0 #Stars closer than this to the edge of the SVC field (arcsec) get a penalty...
+edge_weight = 0.2 #...of this many mags. per arcsec closer
+unknown_pm_error = 20.0 #Proper motion error (mas/yr) to assume for stars without one
+pm_weight = 1.0 #Mags. added to the score per arcsec of position error
+mag_tolerance = 1.0 #Gaia G - 2MASS K can be this far (mags.) from the expected color before the K mag. is suspect (about 3 sigma)...
+mag_weight = 1.0 #...and after that, this many mags. are added to the score per mag. it is off
+#Gaia DR2 G - Ks as a polynomial of BP - RP (Evans et al. 2018, A&A 616, A4, table A.2), good for 0.25 < BP - RP < 5.5
+g_minus_k_coefficients = (-0.1885, 2.092, -0.1345)
+g_minus_k_color_range = (0.25, 5.5)
+
+score_dtype = [('index', int), ('dra', float), ('ddec', float), ('mag', float), ('sl', float), ('sw', float), ('edge_distance', float),
+    ('slit_distance', float), ('n_neighbors', int), ('nearest_neighbor', float), ('position_error', float), ('mag_residual', float),
+    ('usable', bool), ('score', float)]
+
+
+#Array of floats with None as NaN
+def float_array(values, n):
+    if values is None:
+        return np.full(n, np.nan)
+    return np.array([np.nan if value is None else value for value in values], dtype=float).reshape(n)
+
+
+#Expected Gaia G - 2MASS K for Gaia BP - RP colors, NaN outside the colors the relation holds for
+def expected_g_minus_k(bp_rp):
+    bp_rp = np.asarray(bp_rp, dtype=float)
+    g_minus_k = g_minus_k_coefficients[0] + g_minus_k_coefficients[1] * bp_rp + g_minus_k_coefficients[2] * bp_rp**2
+    return np.where((bp_rp > g_minus_k_color_range[0]) & (bp_rp < g_minus_k_color_range[1]), g_minus_k, np.nan)
+
+
+#Score guide star candidates at dra, ddec (arcsec from the target) with K mags. mag for a PA (deg.)
+#pmra and pmdec (mas/yr) are the catalog proper motions and details the dictionary of extra catalog columns from
+#ds9_lib.read_guide_star_details (pm_error, gmag, and bp_rp), either can be left out
+#epoch is when the target is observed and use_proper_motion if the proper motions are applied to the guide star positions
+#Returns a structured array (score_dtype) with one row per candidate, best first, "index" is the candidate's index in the input
+def score_guide_stars(dra, ddec, mag, PA, pmra=None, pmdec=None, details=None, epoch=2000.0, use_proper_motion=False, plate_scale=None, mirror_field=None):
+    plate_scale = ds9_lib.plate_scale if plate_scale is None else plate_scale
+    mirror_field = ds9_lib.mirror_field if mirror_field is None else mirror_field
+    dra, ddec = np.atleast_1d(np.asarray(dra, dtype=float)), np.atleast_1d(np.asarray(ddec, dtype=float))
+    n = len(dra)
+    mag = float_array(mag, n)
+    details = ds9_lib.empty_guide_star_details(n) if details is None else details
+    #Where the stars are in the SVC field, turned back by the rotation the field is drawn at (delta_PA = 90 - PA)
+    edges = pa_optimizer.outline_edges(plate_scale, bool(mirror_field), pa_optimizer.outline_tolerance)
+    rotation = np.radians(90.0 - float(PA))
+    x = dra * np.cos(rotation) + ddec * np.sin(rotation)
+    y = -dra * np.sin(rotation) + ddec * np.cos(rotation)
+    edge_distance = np.where(pa_optimizer.points_in_outline(x, y, edges), 1.0, -1.0) * pa_optimizer.outline_distance(x, y, edges)
+    sl, sw = ds9_lib.convert_from_dra_ddec_to_sl_sw(dra, ddec, float(PA))
+    slit_distance = pa_optimizer.slit_distance(sl, sw, plate_scale)
+    #Neighbors, from the distances between every pair of candidates
+    separation = np.hypot(dra[:, np.newaxis] - dra[np.newaxis, :], ddec[:, np.newaxis] - ddec[np.newaxis, :])
+    np.fill_diagonal(separation, np.inf)
+    confusing = (separation < neighbor_radius) & ~(mag[np.newaxis, :] >= mag[:, np.newaxis] + neighbor_dmag) #Stars without a mag. count too
+    n_neighbors = confusing.sum(axis=1)
+    nearest_neighbor = separation.min(axis=1, initial=np.inf)
+    #How far off the catalog position the star could be when it is observed
+    years = abs(float(epoch) - 2000.0)
+    pm_error = float_array(details['pm_error'], n)
+    pm_error = np.where(np.isfinite(pm_error), pm_error, unknown_pm_error)
+    if use_proper_motion:
+        position_error = pm_error * years / 1000.0
+    else:
+        position_error = np.hypot(np.hypot(float_array(pmra, n), float_array(pmdec, n)), pm_error) * years / 1000.0
+        position_error = np.where(np.isfinite(position_error), position_error, unknown_pm_error * years / 1000.0)
+    #Gaia and 2MASS magnitudes agreeing
+    mag_residual = float_array(details['gmag'], n) - mag - expected_g_minus_k(float_array(details['bp_rp'], n))
+    score = np.where(np.isnan(mag), 99.0, mag) + pa_optimizer.distance_weight * slit_distance \
+        + edge_weight * np.maximum(edge_comfort - edge_distance, 0.0) \
+        + neighbor_penalty * n_neighbors \
+        + pm_weight * position_error \
+        + mag_weight * np.nan_to_num(np.maximum(np.abs(mag_residual) - mag_tolerance, 0.0))
+    usable = (edge_distance >= pa_optimizer.edge_margin) & (slit_distance >= pa_optimizer.min_slit_distance)
+    order = np.lexsort((score, ~usable))
+    scores = np.zeros(n, dtype=score_dtype)
+    scores['index'] = order
+    for name, values in (('dra', dra), ('ddec', ddec), ('mag', mag), ('sl', sl), ('sw', sw), ('edge_distance', edge_distance),
+            ('slit_distance', slit_distance), ('n_neighbors', n_neighbors), ('nearest_neighbor', nearest_neighbor),
+            ('position_error', position_error), ('mag_residual', mag_residual), ('usable', usable), ('score', score)):
+        scores[name] = values[order]
+    return scores
+
+
+#Short description of what is wrong with a scored guide star (a row from score_guide_stars), '' if nothing
+def score_notes(row):
+    notes = []
+    if row['edge_distance'] < 0.0:
+        notes.append('outside SVC field')
+    elif row['edge_distance'] < pa_optimizer.edge_margin:
+        notes.append('on SVC field edge')
+    if row['slit_distance'] < pa_optimizer.min_slit_distance:
+        notes.append('on slit')
+    if row['n_neighbors'] > 0:
+        notes.append(str(row['n_neighbors'])+' close neighbor'+('s' if row['n_neighbors'] > 1 else ''))
+    if row['position_error'] > 1.0:
+        notes.append('position off by up to %.1f"' % row['position_error'])
+    if abs(row['mag_residual']) > mag_tolerance:
+        notes.append('K mag. suspect')
+    return ', '.join(notes)
+
+
+#Scores of a guide star (a row from score_guide_stars) as a dictionary, with None for values that are not known
+def score_dictionary(row):
+    dictionary = {}
+    for name in row.dtype.names:
+        value = row[name].item()
+        dictionary[name] = None if isinstance(value, float) and not np.isfinite(value) else value
+    dictionary['notes'] = score_notes(row)
+    return dictionary
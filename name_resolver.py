@@ -0,0 +1,210 @@
+#Resolve target names to coordinates through SIMBAD many names at a time, with the results kept in a local SQLite cache
+#
+#NameResolver.resolve(names) looks every name up in the cache first and sends the ones that are not there (or are older
+#than the cache's ttl) to the service in one request (Simbad.query_objects) per batch_size names, so resolving a target list
+#is one round trip and resolving it again needs no network at all (and in the same session, not even the cache).
+#resolve_async() does the same on a worker thread and returns a concurrent.futures.Future, so the GUI does not freeze while
+#waiting; names asked for while a request is being made are collected and sent together in the next one.
+#Names are matched ignoring case and extra spaces ("m  1" is "M 1").  Results are (ra, dec, pmra, pmdec) strings like
+#planner_lib.simbad_lookup returns: sexagesimal RA and Dec. and proper motions in mas/yr.
+#StandInService resolves names from a table instead of SIMBAD, for testing and working offline.
+
+import os
+import time
+import json
+import sqlite3
+import threading
+import concurrent.futures
+
+
+batch_size = 500 #Most names to send to the service in one request
+batch_window = 0.05 #Seconds resolve_async waits to collect more names before sending a request
+
+
+#Key names are stored and matched by
+def normalize_name(name):
+    return ' '.join(str(name).split()).lower()
+
+
+#SQLite database of resolved names, a name that was not found is remembered (for not_found_ttl) so it isn't looked up again either
+class NameCache:
+    def __init__(self, filename, ttl=30.0*86400.0, not_found_ttl=86400.0):
+        self.filename = filename
+        self.ttl = ttl #Seconds a result is good for
+        self.not_found_ttl = not_found_ttl #Seconds to remember that a name was not found
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(filename)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        self.pid = None
+        self.connection = None
+        with self.lock, self.connect():
+            self.connection.execute('CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, ra TEXT, dec TEXT, pmra TEXT, pmdec TEXT, time REAL)')
+
+    #Return the connection to the database, opening a new one in a new process (e.g. a worker process forked from this one)
+    #since SQLite connections can't be shared between processes
+    def connect(self):
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.filename, timeout=30.0, check_same_thread=False) #Used from the resolver's worker thread too, behind the lock
+            self.pid = os.getpid()
+        return self.connection
+
+    #Return a dictionary of normalized name: (ra, dec, pmra, pmdec), or None if it was not found, for the names that are cached
+    #and not too old
+    def lookup(self, names):
+        keys = sorted(set(normalize_name(name) for name in names))
+        found = {}
+        now = time.time()
+        with self.lock:
+            for i in range(0, len(keys), 900): #SQLite limits how many values can go in one query
+                chunk = keys[i:i + 900]
+                rows = self.connect().execute('SELECT name, ra, dec, pmra, pmdec FROM names WHERE name IN ('+','.join('?' * len(chunk))+')'
+                    +' AND ((ra IS NOT NULL AND time >= ?) OR (ra IS NULL AND time >= ?))', chunk + [now - self.ttl, now - self.not_found_ttl]).fetchall()
+                for row in rows:
+                    found[row[0]] = None if row[1] is None else tuple(row[1:])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    #Store a dictionary of name: (ra, dec, pmra, pmdec), or None for names that were not found
+    def store(self, results):
+        now = time.time()
+        with self.lock, self.connect():
+            self.connection.executemany('INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?, ?, ?)',
+                [(normalize_name(name),) + ((None,) * 4 if result is None else tuple(str(value) for value in result)) + (now,) for name, result in results.items()])
+
+    #Remove results older than the ttl
+    def expire(self):
+        now = time.time()
+        with self.lock, self.connect():
+            self.connection.execute('DELETE FROM names WHERE (ra IS NOT NULL AND time < ?) OR (ra IS NULL AND time < ?)', (now - self.ttl, now - self.not_found_ttl))
+
+    def stats(self):
+        with self.lock:
+            n_names = self.connect().execute('SELECT COUNT(*) FROM names').fetchone()[0]
+        return {'names': n_names, 'hits': self.hits, 'misses': self.misses}
+
+
+#Resolves names through SIMBAD with astroquery, all the names given at once in one query_objects request
+class SimbadService:
+    def __init__(self, get_simbad):
+        self.get_simbad = get_simbad #Function returning the astroquery Simbad object, with pmra and pmdec votable fields added
+        self.n_requests = 0
+
+    #Returns a dictionary of name: (ra, dec, pmra, pmdec) for the names SIMBAD found
+    def query(self, names):
+        from coordfuncs import coords
+        import numpy as np
+        self.n_requests += 1
+        table = self.get_simbad().query_objects(list(names))
+        if table is None:
+            return {}
+        columns = {column.lower(): column for column in table.colnames}
+        if 'user_specified_id' in columns: #Newer astroquery says which name each row is for
+            row_names = [str(name) for name in table[columns['user_specified_id']]]
+        elif 'script_number_id' in columns: #Older astroquery numbers the names from 1
+            row_names = [names[int(number) - 1] for number in table[columns['script_number_id']]]
+        else:
+            row_names = list(names)
+        results = {}
+        for i, name in enumerate(row_names):
+            ra, dec = table[columns['ra']][i], table[columns['dec']][i]
+            if np.ma.is_masked(ra) or np.ma.is_masked(dec) or str(ra).strip() == '': #Not found
+                continue
+            ra, dec = coords(ra, dec).showcoords().split()
+            pm = []
+            for key in ('pmra', 'pmdec'):
+                value = table[columns[key]][i] if key in columns else None
+                pm.append('0.0' if value is None or np.ma.is_masked(value) or not np.isfinite(float(value)) else str(float(value)))
+            results[name] = (ra, dec, pm[0], pm[1])
+        return results
+
+
+#Stand-in for SIMBAD for testing and working offline: resolves names from a dictionary of name: (ra, dec, pmra, pmdec), or a
+#JSON file of one, and counts requests, waiting latency seconds for each request like a round trip to a server
+class StandInService:
+    def __init__(self, table=None, filename=None, latency=0.0):
+        if filename is not None:
+            with open(filename) as f:
+                table = json.load(f)
+        self.table = {normalize_name(name): tuple(str(value) for value in result) for name, result in (table or {}).items()}
+        self.latency = latency
+        self.n_requests = 0
+        self.n_names = 0
+
+    def query(self, names):
+        self.n_requests += 1
+        self.n_names += len(names)
+        time.sleep(self.latency)
+        return {name: self.table[normalize_name(name)] for name in names if normalize_name(name) in self.table}
+
+
+class NameResolver:
+    def __init__(self, service, cache=None, batch_size=batch_size):
+        self.service = service
+        self.cache = cache
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.resolved = {} #Normalized name: result (None if not found) for everything resolved so far, so names aren't even looked up in the cache twice
+        self.waiting = [] #(names, future) for resolve_async calls waiting for the worker thread
+        self.working = False
+
+    #Resolve names, returns a dictionary of name: (ra, dec, pmra, pmdec) for the names that were found
+    def resolve(self, names):
+        names = [str(name) for name in names]
+        found = {normalize_name(name): self.resolved[normalize_name(name)] for name in names if normalize_name(name) in self.resolved}
+        if self.cache is not None:
+            found.update(self.cache.lookup([name for name in names if normalize_name(name) not in found]))
+        missing = {} #Each name that is not cached, once, in the order given
+        for name in names:
+            key = normalize_name(name)
+            if key not in found and key not in missing:
+                missing[key] = name
+        missing = list(missing.values())
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            results = self.service.query(batch)
+            results.update((name, None) for name in batch if name not in results) #Remember the names that were not found too
+            if self.cache is not None:
+                self.cache.store(results)
+            found.update((normalize_name(name), result) for name, result in results.items())
+        self.resolved.update(found)
+        return {name: found[normalize_name(name)] for name in names if found.get(normalize_name(name)) is not None}
+
+    #Resolve a single name, raises LookupError if it is not found
+    def resolve_one(self, name):
+        result = self.resolve([name])
+        if len(result) == 0:
+            raise LookupError('Could not resolve "'+str(name)+'"')
+        return result[str(name)]
+
+    #Resolve names on a worker thread, returns a Future for the dictionary resolve() would return
+    def resolve_async(self, names):
+        future = concurrent.futures.Future()
+        with self.lock:
+            self.waiting.append(([str(name) for name in names], future))
+            if not self.working:
+                self.working = True
+                threading.Thread(target=self.work, daemon=True).start()
+        return future
+
+    #Worker thread: resolve everything waiting in one go until nothing is left
+    def work(self):
+        while True:
+            time.sleep(batch_window) #Let more names pile up so they go in the same request
+            with self.lock:
+                waiting, self.waiting = self.waiting, []
+                if len(waiting) == 0:
+                    self.working = False
+                    return
+            waiting = [(names, future) for names, future in waiting if future.set_running_or_notify_cancel()] #Skip lookups cancelled while waiting
+            try:
+                results = self.resolve([name for names, future in waiting for name in names])
+            except Exception as e:
+                for names, future in waiting:
+                    future.set_exception(e)
+                continue
+            for names, future in waiting:
+                future.set_result({name: results[name] for name in names if name in results})
@@ -0,0 +1,167 @@
+#Observability of many targets over a night (or a whole semester) at once: local sidereal time, hour angle, altitude,
+#azimuth, and airmass as (targets x times) arrays, worked out locally without any network or astropy
+#
+#Times can be numpy datetime64 (UTC) or Julian dates, in an array of any shape, e.g. a night from night_times() or a
+#(nights x steps) grid of a whole semester.  Target RA and Dec. are arrays in degrees.  Every result has the shape
+#(number of targets,) + times.shape, so picking what can be observed is a single array operation, e.g.
+#   times, dark = observability.night_times('2025-01-15')
+#   result = observability.observability(ra, dec, times)
+#   up = observability.observable(result, max_airmass=2.0, dark=dark)
+#   can_start = observability.observable_for(up, 6) #Observable for the next 6 steps, e.g. long enough for a slitscan block
+#The observatory defaults to the one set in ds9_lib (observatory_latitude and observatory_longitude, McDonald Observatory).
+
+import numpy as np
+
+
+#Julian dates of times given as numpy datetime64 (UTC) or already as Julian dates
+def julian_date(times):
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return (times - np.datetime64('1970-01-01T00:00:00')) / np.timedelta64(1, 's') / 86400.0 + 2440587.5
+    return times.astype(float)
+
+
+#Return numpy datetime64 (UTC, second precision) for Julian dates
+def datetime_from_julian_date(jd):
+    seconds = np.round((np.asarray(jd, dtype=float) - 2440587.5) * 86400.0)
+    return np.datetime64('1970-01-01T00:00:00') + seconds.astype('timedelta64[s]')
+
+
+#Latitude (deg. north) and longitude (deg. west) of the observatory, from ds9_lib unless given
+def site(latitude=None, longitude=None):
+    if latitude is None or longitude is None:
+        import ds9_lib
+        latitude = ds9_lib.observatory_latitude if latitude is None else latitude
+        longitude = ds9_lib.observatory_longitude if longitude is None else longitude
+    return float(latitude), float(longitude)
+
+
+#Greenwich mean sidereal time in degrees (Meeus, Astronomical Algorithms eq. 12.4, good to well under a second of time)
+def greenwich_sidereal_time(times):
+    jd = julian_date(times)
+    d = jd - 2451545.0
+    t = d / 36525.0
+    return (280.46061837 + 360.98564736629 * d + 0.000387933 * t**2 - t**3 / 38710000.0) % 360.0
+
+
+#Local sidereal time in degrees at longitude (deg. west, like ds9_lib.observatory_longitude)
+def local_sidereal_time(times, longitude=None):
+    latitude, longitude = site(0.0, longitude)
+    return (greenwich_sidereal_time(times) - longitude) % 360.0
+
+
+#RA and Dec. (degrees) of the Sun, low precision (about 0.01 deg.) formula from the Astronomical Almanac
+def sun_ra_dec(times):
+    n = julian_date(times) - 2451545.0
+    mean_longitude = 280.460 + 0.9856474 * n
+    mean_anomaly = np.radians(357.528 + 0.9856003 * n)
+    ecliptic_longitude = np.radians(mean_longitude + 1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2.0 * mean_anomaly))
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+    ra = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude))) % 360.0
+    dec = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude)))
+    return ra, dec
+
+
+#Precess J2000 RA and Dec. (degrees) to the equinox of Julian date jd (Meeus, Astronomical Algorithms eq. 21.3 and 21.4)
+#The precession over a few decades is a few tenths of a degree, enough to matter for altitudes near the horizon
+def precess(ra, dec, jd):
+    t = (np.mean(jd) - 2451545.0) / 36525.0
+    zeta = np.radians((2306.2181 * t + 0.30188 * t**2 + 0.017998 * t**3) / 3600.0)
+    z = np.radians((2306.2181 * t + 1.09468 * t**2 + 0.018203 * t**3) / 3600.0)
+    theta = np.radians((2004.3109 * t - 0.42665 * t**2 - 0.041833 * t**3) / 3600.0)
+    ra, dec = np.radians(ra), np.radians(dec)
+    a = np.cos(dec) * np.sin(ra + zeta)
+    b = np.cos(theta) * np.cos(dec) * np.cos(ra + zeta) - np.sin(theta) * np.sin(dec)
+    c = np.sin(theta) * np.cos(dec) * np.cos(ra + zeta) + np.cos(theta) * np.sin(dec)
+    return np.degrees(np.arctan2(a, b) + z) % 360.0, np.degrees(np.arcsin(np.clip(c, -1.0, 1.0)))
+
+
+#Hour angle (deg., -180 to 180, positive west of the meridian), altitude (deg.), and azimuth (deg., north through east)
+#for RA, Dec., and LST (degrees) arrays that broadcast together
+def hour_angle_altitude_azimuth(ra, dec, lst, latitude):
+    hour_angle = (np.asarray(lst) - ra + 180.0) % 360.0 - 180.0
+    ha = np.radians(hour_angle)
+    dec = np.radians(dec)
+    lat = np.radians(latitude)
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+    altitude = np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+    azimuth = np.degrees(np.arctan2(-np.cos(dec) * np.sin(ha), np.sin(dec) * np.cos(lat) - np.cos(dec) * np.cos(ha) * np.sin(lat))) % 360.0
+    return hour_angle, altitude, azimuth
+
+
+#Same as hour_angle_altitude_azimuth for targets along the first axis and LSTs along the rest
+def horizontal_coordinates(ra, dec, lst, latitude):
+    ra = np.asarray(ra, dtype=float).reshape((-1,) + (1,) * np.ndim(lst))
+    dec = np.asarray(dec, dtype=float).reshape(ra.shape)
+    return hour_angle_altitude_azimuth(ra, dec, np.asarray(lst)[np.newaxis], latitude)
+
+
+#Airmass for altitudes in degrees (Pickering 2002, which holds down to the horizon), infinite below the horizon
+def airmass(altitude):
+    altitude = np.asarray(altitude, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = 1.0 / np.sin(np.radians(altitude + 244.0 / (165.0 + 47.0 * np.abs(altitude)**1.1)))
+    return np.where(altitude > 0.0, x, np.inf)
+
+
+#Work out the observability of targets at J2000 RA and Dec. (degrees) at times (datetime64 or Julian dates, any shape)
+#Targets are precessed to the middle of the times, which is close enough over a semester
+#Returns a dictionary of arrays with shape (number of targets,) + times.shape:
+#   hour_angle (hours, positive west), altitude (deg.), azimuth (deg., north through east), and airmass
+#and "lst" (hours) with the shape of times
+def observability(ra, dec, times, latitude=None, longitude=None):
+    latitude, longitude = site(latitude, longitude)
+    lst = local_sidereal_time(times, longitude)
+    ra, dec = precess(ra, dec, julian_date(times))
+    hour_angle, altitude, azimuth = horizontal_coordinates(ra, dec, lst, latitude)
+    return {
+        'lst': lst / 15.0,
+        'hour_angle': hour_angle / 15.0,
+        'altitude': altitude,
+        'azimuth': azimuth,
+        'airmass': airmass(altitude),
+    }
+
+
+#Times from local noon on the given dates (local date the night starts on, e.g. '2025-01-15' or a list of them) through the
+#next local noon every step_minutes, and a mask of which ones are dark (Sun below twilight degrees, -12 is nautical twilight)
+#Returns (times, dark) with shape (number of steps,) for one date or (number of dates, number of steps) for a list of dates
+def night_times(dates, step_minutes=5.0, twilight=-12.0, latitude=None, longitude=None):
+    latitude, longitude = site(latitude, longitude)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    local_noon = dates.astype('datetime64[s]') + np.timedelta64(int(round((12.0 + longitude / 15.0) * 3600.0)), 's') #Local mean noon in UTC
+    steps = (np.arange(0.0, 24.0 * 60.0, step_minutes) * 60.0).astype('timedelta64[s]')
+    times = local_noon[..., np.newaxis] + steps
+    sun_ra, sun_dec = sun_ra_dec(times)
+    dark = hour_angle_altitude_azimuth(sun_ra, sun_dec, local_sidereal_time(times, longitude), latitude)[1] < twilight
+    return times, dark
+
+
+#Mask of when targets can be observed: airmass at most max_airmass, hour angle within +/- max_hour_angle (hours) if given,
+#and if dark (from night_times) is given, only when it is dark
+def observable(result, max_airmass=2.0, max_hour_angle=None, dark=None):
+    mask = result['airmass'] <= max_airmass
+    if max_hour_angle is not None:
+        mask &= np.abs(result['hour_angle']) <= max_hour_angle
+    if dark is not None:
+        mask &= np.asarray(dark)[np.newaxis]
+    return mask
+
+
+#Mask of the times a target stays observable for the next n_steps steps (including that one) along the last axis,
+#e.g. to find when a slitscan block that takes n_steps time steps can be started
+def observable_for(mask, n_steps):
+    n_steps = int(n_steps)
+    if n_steps <= 1:
+        return np.asarray(mask, dtype=bool)
+    counts = np.cumsum(np.asarray(mask, dtype=int), axis=-1)
+    counts = np.concatenate([np.zeros(counts.shape[:-1] + (1,), dtype=int), counts], axis=-1)
+    can_start = np.zeros(np.shape(mask), dtype=bool)
+    can_start[..., :counts.shape[-1] - n_steps] = (counts[..., n_steps:] - counts[..., :-n_steps]) == n_steps
+    return can_start
+
+
+#RA and Dec. arrays (degrees) of target dictionaries (like planner_lib.default_target_dictionary) with sexagesimal coordinates
+def target_ra_dec(targets):
+    from coordfuncs import sex2deg_array
+    return sex2deg_array([target['ra'] for target in targets], units='hms'), sex2deg_array([target['dec'] for target in targets], units='dms')
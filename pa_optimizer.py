@@ -0,0 +1,187 @@
+#Position angle sweep: find the PAs that put a usable guide star in the Slit View Camera (SVC) field
+#
+#Instead of typing in a PA, searching for guide stars, and checking the finder chart by eye, sweep_pa() takes the guide star
+#candidates once (offsets from the target in arcsec, e.g. from planner_lib.calculate_guide_star_offsets, and K mags) and tests
+#every star at every PA from 0 to 360 in pa_step steps against the SVC outline (scam-outline.txt) rotated for that PA, the
+#same polygon ds9_lib.create_region draws on the finder chart.  A star is usable at a PA if it is at least edge_margin inside
+#the outline and at least min_slit_distance off the slit.  The PA ranges with a usable star are ranked by the best star in
+#them, scored by its brightness and how far it is from the slit.
+#
+#Turning the PA turns every star around the target on a circle, so instead of testing (PAs x stars) points against every
+#edge of the outline, each star's circle is intersected with the edges once.  The circle goes in and out of the outline at
+#each crossing, so a crossing number (point in polygon) test of each star where it is, plus counting the crossings between
+#there and every PA with one searchsorted, says if the star is inside at every PA.  This is exact for the polygon, and a
+#sweep over 360 PAs and a few hundred stars takes a small fraction of a second.
+
+import functools
+import numpy as np
+import ds9_lib
+
+
+pa_step = 1.0 #Step between PAs in the sweep (deg.)
+edge_margin = 2.0 #How far inside the SVC field edge a guide star has to be (arcsec)
+min_slit_distance = 2.0 #How far off the slit a guide star has to be (arcsec)
+margin_points = 8 #Number of points around each star, edge_margin away, that also have to be inside the field
+outline_tolerance = 0.2 #Simplify the SVC outline to within this many arcsec for the sweep
+distance_weight = 0.02 #Mags. of brightness worth one arcsec closer to the slit when ranking guide stars
+slit_length = 15.0 #Slit length and width at the McDonald Observatory 2.7m plate scale (arcsec), scaled like create_region does
+slit_width = 1.0
+
+
+#Edges (x1, y1, x2, y2) of the SVC outline in arcsec (x east, y north) at rotation 0
+@functools.lru_cache(maxsize=8)
+def outline_edges(plate_scale, mirror_field=False, max_deviation=None):
+    x, y = ds9_lib.get_svc_polygon(0.0, plate_scale, mirror_field, max_deviation)
+    x, y = np.asarray(x) * 3600.0, np.asarray(y) * 3600.0
+    return x, y, np.roll(x, -1), np.roll(y, -1)
+
+
+#Crossing number test of points (arrays x, y in arcsec) against the outline edges, returns a boolean array of which are inside
+def points_in_outline(x, y, edges):
+    x1, y1, x2, y2 = edges
+    x = np.asarray(x, dtype=float)[..., np.newaxis]
+    y = np.asarray(y, dtype=float)[..., np.newaxis]
+    straddles = (y1 > y) != (y2 > y) #Edges crossing the horizontal line through each point
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_crossing = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(straddles & (x < x_crossing), axis=-1) % 2 == 1
+
+
+#Distance (arcsec) from points (arrays x, y in arcsec) to the nearest edge of the outline
+def outline_distance(x, y, edges):
+    x1, y1, x2, y2 = edges
+    x = np.asarray(x, dtype=float)[..., np.newaxis]
+    y = np.asarray(y, dtype=float)[..., np.newaxis]
+    dx, dy = x2 - x1, y2 - y1
+    length_squared = np.maximum(dx*dx + dy*dy, 1e-20)
+    t = np.clip(((x - x1) * dx + (y - y1) * dy) / length_squared, 0.0, 1.0) #Closest point along each edge
+    return np.hypot(x - x1 - t * dx, y - y1 - t * dy).min(axis=-1, initial=np.inf)
+
+
+#Where circles around the origin with the given radii cross the outline edges
+#Returns arrays of which circle each crossing is on and the angle (deg.) of the crossing
+def circle_crossings(radius, edges):
+    x1, y1, x2, y2 = edges
+    dx, dy = x2 - x1, y2 - y1
+    a = dx*dx + dy*dy #Solve |(x1, y1) + t (dx, dy)| = radius for t along each edge
+    b = x1*dx + y1*dy
+    c = x1*x1 + y1*y1 - np.asarray(radius, dtype=float)[:, np.newaxis]**2
+    discriminant = b*b - a*c
+    hit = (discriminant >= 0.0) & (a > 0.0)
+    root = np.sqrt(np.where(hit, discriminant, 0.0))
+    circles, angles = [], []
+    for sign in (-1.0, 1.0): #A circle just touching an edge gets two crossings at the same place, which cancel out
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (-b + sign * root) / a
+        i, j = np.nonzero(hit & (t >= 0.0) & (t < 1.0)) #Count a crossing at a corner on only one of its edges
+        t = t[i, j]
+        circles.append(i)
+        angles.append(np.degrees(np.arctan2(y1[j] + t * dy[j], x1[j] + t * dx[j])))
+    return np.concatenate(circles), np.concatenate(angles)
+
+
+#Check if points (arrays x, y in arcsec) turned clockwise by each of rotations (deg.) are inside the outline
+#Returns a boolean array of shape (number of rotations, number of points)
+def inside_outline(x, y, rotations, edges):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n_points = len(x)
+    inside = points_in_outline(x, y, edges) #Where each point starts
+    circles, crossing_angles = circle_crossings(np.hypot(x, y), edges)
+    #How far each point turns clockwise to get to each crossing on its circle, sorted by point and then angle
+    turn_to_crossing = (np.degrees(np.arctan2(y, x))[circles] - crossing_angles) % 360.0
+    keys = np.sort(circles * 360.0 + np.minimum(turn_to_crossing, np.nextafter(360.0, 0.0)))
+    offsets = np.arange(n_points) * 360.0
+    first = np.searchsorted(keys, offsets, side='left')
+    turns = np.asarray(rotations, dtype=float) % 360.0
+    n_crossed = np.searchsorted(keys, offsets[np.newaxis, :] + turns[:, np.newaxis], side='right') - first[np.newaxis, :]
+    return inside[np.newaxis, :] ^ (n_crossed % 2 == 1)
+
+
+#Distance (arcsec) from guide stars at sl, sw (arcsec) to the edge of the slit, 0 on the slit
+def slit_distance(sl, sw, plate_scale):
+    zoom = plate_scale / 0.119
+    return np.hypot(np.maximum(np.abs(sl) - 0.5 * slit_length * zoom, 0.0), np.maximum(np.abs(sw) - 0.5 * slit_width * zoom, 0.0))
+
+
+#Test guide stars at dra, ddec (arcsec from the target) at each PA (deg.)
+#Returns a dictionary of (number of PAs, number of stars) arrays: "usable", "inside" (the field with edge_margin to spare),
+#and "sl", "sw", and "slit_distance" (arcsec)
+def usable_guide_stars(dra, ddec, PA, edge_margin=edge_margin, min_slit_distance=min_slit_distance, plate_scale=None, mirror_field=None,
+        max_deviation=outline_tolerance):
+    plate_scale = ds9_lib.plate_scale if plate_scale is None else plate_scale
+    mirror_field = ds9_lib.mirror_field if mirror_field is None else mirror_field
+    dra, ddec = np.atleast_1d(np.asarray(dra, dtype=float)), np.atleast_1d(np.asarray(ddec, dtype=float))
+    PA = np.atleast_1d(np.asarray(PA, dtype=float))
+    n_stars = len(dra)
+    edges = outline_edges(plate_scale, bool(mirror_field), max_deviation)
+    directions = np.radians(np.arange(margin_points) * 360.0 / margin_points) if edge_margin > 0.0 else np.zeros(0)
+    x = np.concatenate([dra] + [dra + edge_margin * np.cos(direction) for direction in directions]) #Each star and the points around it
+    y = np.concatenate([ddec] + [ddec + edge_margin * np.sin(direction) for direction in directions])
+    inside = inside_outline(x, y, 90.0 - PA, edges) #The field is drawn rotated by delta_PA = 90 - PA, so turn the stars back by it
+    inside = inside.reshape(len(PA), len(directions) + 1, n_stars).all(axis=1)
+    sl, sw = ds9_lib.convert_from_dra_ddec_to_sl_sw(dra[np.newaxis, :], ddec[np.newaxis, :], PA[:, np.newaxis])
+    distance = slit_distance(sl, sw, plate_scale)
+    return {
+        'usable': inside & (distance >= min_slit_distance),
+        'inside': inside,
+        'sl': sl,
+        'sw': sw,
+        'slit_distance': distance,
+    }
+
+
+#Runs of True in a boolean array, returns a list of (first index, length)
+def runs(mask):
+    changes = np.diff(np.concatenate([[0], np.asarray(mask, dtype=int), [0]]))
+    return [(int(start), int(end - start)) for start, end in zip(np.flatnonzero(changes == 1), np.flatnonzero(changes == -1))]
+
+
+#Runs of True in a boolean array that goes around a circle (e.g. PAs from 0 to 360), a run can wrap past the end
+def circular_runs(mask):
+    mask = np.asarray(mask, dtype=bool)
+    if mask.all():
+        return [(0, len(mask))]
+    shift = int(np.argmin(mask)) #Start looking from a False so no run is split in two
+    return [((start + shift) % len(mask), length) for start, length in runs(np.roll(mask, -shift))]
+
+
+#Sweep the PA from 0 to 360 for guide star candidates at dra, ddec (arcsec from the target) with magnitudes mag
+#Returns a dictionary with the "PA"s swept, the "usable" (number of PAs, number of stars) array, the "best_star" at each PA
+#(-1 if none), and "ranges": a list of the PA ranges with a usable star, best first, each a dictionary with
+#   PA_start, PA_end, and width (deg.) of the range, n_stars usable somewhere in it, and its best guide star:
+#   star (index), mag, star_PA_start and star_PA_end (the part of the range it is usable in), best_PA (the middle of that,
+#   the most room for error), and the star's sl, sw, and slit_distance (arcsec) at best_PA
+def sweep_pa(dra, ddec, mag, pa_step=pa_step, edge_margin=edge_margin, min_slit_distance=min_slit_distance, plate_scale=None,
+        mirror_field=None, max_deviation=outline_tolerance):
+    PA = np.arange(0.0, 360.0, pa_step)
+    n_pa = len(PA)
+    mag = np.array([np.nan if value is None else value for value in np.atleast_1d(mag)], dtype=float)
+    result = usable_guide_stars(dra, ddec, PA, edge_margin=edge_margin, min_slit_distance=min_slit_distance, plate_scale=plate_scale,
+        mirror_field=mirror_field, max_deviation=max_deviation)
+    usable = result['usable']
+    score = np.where(np.isnan(mag), 99.0, mag)[np.newaxis, :] + distance_weight * result['slit_distance'] #Lower is better, stars without a mag. go last
+    score = np.where(usable, score, np.inf)
+    best_star = np.where(usable.any(axis=1), np.argmin(score, axis=1), -1) if usable.shape[1] > 0 else np.full(n_pa, -1)
+    ranges = []
+    for start, length in circular_runs(best_star >= 0):
+        indices = (start + np.arange(length)) % n_pa
+        star = int(np.argmin(score[indices].min(axis=0)))
+        star_start, star_length = max(runs(usable[indices, star]), key=lambda run: run[1])
+        best = indices[star_start + (star_length - 1) // 2]
+        ranges.append({
+            'PA_start': float(PA[start]),
+            'PA_end': float(PA[indices[-1]]),
+            'width': float(length * pa_step),
+            'n_stars': int(usable[indices].any(axis=0).sum()),
+            'star': star,
+            'mag': None if np.isnan(mag[star]) else float(mag[star]),
+            'star_PA_start': float(PA[indices[star_start]]),
+            'star_PA_end': float(PA[indices[star_start + star_length - 1]]),
+            'best_PA': float(PA[best]),
+            'sl': float(result['sl'][best, star]),
+            'sw': float(result['sw'][best, star]),
+            'slit_distance': float(result['slit_distance'][best, star]),
+            'score': float(score[best, star]),
+        })
+    ranges.sort(key=lambda pa_range: (pa_range['score'], -pa_range['width']))
+    return {'PA': PA, 'usable': usable, 'best_star': best_star, 'ranges': ranges}
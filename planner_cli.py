@@ -0,0 +1,499 @@
+#Command line interface to the IGRINS Observing Planner, for planning without the tkinter GUI
+#Reads one JSON object per line from stdin (or --input) and writes one JSON object per line to stdout
+#
+#Each input line is either a target dictionary (same keys as "target" in the JSON files saved by the GUI, with an optional
+#"guidestar" dictionary), or a whole save file object {"target": {...}, "guidestar": [{...}, ...]} in which case the
+#guide star used is set by "gs_index" (default 0).  Guide stars are searched for in the catalog given by "guide_star_survey"
+#("Gaia DR2" or "2MASS point source"), or the guide star's "survey", and otherwise in Gaia DR2 like the GUI.
+#
+#Examples:
+#   echo '{"name": "M 1"}' | python planner_cli.py resolve
+#   echo '{"ra": "05:34:31.9", "dec": "+22:00:52", "PA": "90", "catalog": "tmp.dat"}' | python planner_cli.py guidestars
+#   python planner_cli.py finder --input save.json --region-file finder.reg
+#   python planner_cli.py finder --input targets.jsonl --region-file {name}.reg --chart {name}_finder.png
+#   python planner_cli.py slitscan-scripts --input targets.jsonl --output-dir scripts/
+#   python planner_cli.py slitscan-scripts --input targets.jsonl --output-dir scripts/ --archive {name}_scripts.zip
+#   python planner_cli.py pa-sweep --input targets.jsonl --guide-star-index "2MASS point source=2mass_index/"
+#   python planner_cli.py schedule --input semester_targets.csv --date 2025-01-15 --max-airmass 1.8
+#   python planner_cli.py plan --input semester_targets.csv --output-dir plans/ --processes 8 --guide-star-index "2MASS point source=2mass_index/"
+#
+#Target lists can also be CSV files (--input ending in .csv) with a header line of target keys, e.g. "name,PA,use_slitscan".
+#A project file saved by the GUI (see project_file.py) can also be given as --input, each of its targets is one record.
+#With --processes the targets are planned in a pool of worker processes, output lines are still in input order and progress
+#for each target is reported on stderr as it finishes.
+
+import sys
+import os
+import json
+import csv
+import time
+import argparse
+import contextlib
+import concurrent.futures
+import numpy as np
+with contextlib.redirect_stdout(sys.stderr): #coordfuncs prints a warning when astroquery is missing, keep it out of the JSON output
+    import planner_lib
+    import ds9_lib
+
+
+#Target dictionary and guide star dictionary of an input record, as given (without the defaults filled in)
+def record_dictionaries(record):
+    if 'target' in record: #Same format as the JSON save files
+        target = record['target']
+        guidestar = record.get('guidestar', {})
+        if isinstance(guidestar, list):
+            guidestar = guidestar[int(record.get('gs_index', 0))] if len(guidestar) > 0 else {}
+    else:
+        target = record
+        guidestar = record.get('guidestar', {})
+    return target, guidestar
+
+
+#Split an input record into the target dictionary and the guide star dictionary
+def split_record(record):
+    target, guidestar = record_dictionaries(record)
+    return planner_lib.fill_target_dictionary(target), planner_lib.fill_target_dictionary(guidestar)
+
+
+#Check a guide star catalog survey name (e.g. from --guide-star-index), raises ValueError if guide stars can't be searched for in it
+def check_guide_star_survey(survey):
+    if survey not in ds9_lib.guide_star_surveys:
+        raise ValueError('"'+str(survey)+'" is not a guide star catalog, use one of: '+', '.join('"'+name+'"' for name in ds9_lib.guide_star_surveys))
+    return survey
+
+
+#Guide star catalog to search for a record: "guide_star_survey" if the record has it, otherwise the guide star's survey, otherwise
+#Gaia DR2 like the GUI.  A guide star's survey that is not a catalog (e.g. the finder chart survey "2MASS K-band" that guide star
+#slots that were never filled have) is ignored
+def guide_star_survey(record):
+    if 'guide_star_survey' in record:
+        return check_guide_star_survey(record['guide_star_survey'])
+    survey = record_dictionaries(record)[1].get('survey')
+    if survey in ds9_lib.guide_star_surveys:
+        return survey
+    return ds9_lib.default_guide_star_survey
+
+
+#Pick a short name for output files for a record
+def record_label(target, index):
+    if target['scan_script_targetshortname'] != '':
+        return target['scan_script_targetshortname']
+    if target['name'] != '':
+        return target['name'].replace(' ', '_')
+    return str(index)
+
+
+def resolve(record, index, args):
+    target, guidestar = split_record(record)
+    ra, dec, pmra, pmdec = planner_lib.simbad_lookup(target['name'])
+    target['ra'] = ra
+    target['dec'] = dec
+    target['proper_motion'] = (pmra, pmdec)
+    target['rotator_setting'] = str(planner_lib.calculate_rotator_setting(target['PA']))
+    return target
+
+
+#Read the guide star candidates for a record from a catalog exported by DS9 (e.g. tmp.dat), a list in the record, or if
+#neither is given, search the local catalog index or catalog cache (or DS9 if use_ds9) around the target
+#Returns lists or arrays of RA, Dec., mag., and proper motions, brightest first when they came from a catalog, and a dictionary
+#of the extra catalog columns used to score them (see ds9_lib.read_guide_star_details)
+def guide_star_candidates(record, target, survey, n, use_ds9=False):
+    if 'catalog' in record: #Read candidates from a catalog exported by DS9 (e.g. tmp.dat)
+        gra, gdec, gmag, gpra, gpdec = ds9_lib.read_guide_star_catalog(record['catalog'], survey)
+        details = ds9_lib.read_guide_star_details(record['catalog'], survey)
+        n = int(record.get('n', n))
+        return gra[:n], gdec[:n], gmag[:n], gpra[:n], gpdec[:n], {key: values[:n] for key, values in details.items()}
+    if 'candidates' in record: #Or from a list of {"ra": ..., "dec": ...} given in the record
+        candidates = record['candidates']
+        gra = [candidate['ra'] for candidate in candidates]
+        gdec = [candidate['dec'] for candidate in candidates]
+        gmag = [candidate.get('mag', None) for candidate in candidates]
+        gpra = [candidate.get('pmra', 0.0) for candidate in candidates]
+        gpdec = [candidate.get('pmdec', 0.0) for candidate in candidates]
+        details = {key: [candidate.get(key, None) for candidate in candidates] for key in ('pm_error', 'gmag', 'bp_rp')}
+        return gra, gdec, gmag, gpra, gpdec, details
+    obj_coords = planner_lib.coords(target['ra'], target['dec'])
+    search_box = ds9_lib.guide_star_search_box(obj_coords.ra.deg(), obj_coords.dec.deg())
+    return ds9_lib.find_guide_stars(survey, search_box, int(record.get('n', n)), use_ds9=use_ds9, details=True)
+
+
+#Guide star offsets (like planner_lib.calculate_guide_star_offsets) for a target's candidates, ranked best first for the
+#target's PA by guide_star_scoring.score_guide_stars, each with its catalog mag. and proper motion and its scores
+def ranked_guide_stars(target, gra, gdec, gmag, gpra, gpdec, details):
+    import guide_star_scoring
+    offsets = planner_lib.calculate_guide_star_offsets(target['ra'], target['dec'], float(target['PA']), gra, gdec)
+    scores = guide_star_scoring.score_guide_stars([offset['dra'] for offset in offsets], [offset['ddec'] for offset in offsets], gmag,
+        float(target['PA']), pmra=gpra, pmdec=gpdec, details=details, epoch=float(target['epoch']))
+    ranked = []
+    for row in scores:
+        i = int(row['index'])
+        offset = offsets[i]
+        offset['mag'] = gmag[i]
+        offset['pmra'] = gpra[i]
+        offset['pmdec'] = gpdec[i]
+        offset.update(guide_star_scoring.score_dictionary(row))
+        ranked.append(offset)
+    return ranked
+
+
+def guidestars(record, index, args):
+    target, guidestar = split_record(record)
+    survey = guide_star_survey(record)
+    return {'name': target['name'], 'guidestars': ranked_guide_stars(target, *guide_star_candidates(record, target, survey, args.n, use_ds9=args.ds9))}
+
+
+#Sweep the PA from 0 to 360 for the guide star candidates of a target (see pa_optimizer.py), returns the PA ranges with a
+#usable guide star, best first, with the coordinates of each range's best star
+def pa_sweep(record, index, args):
+    import pa_optimizer
+    target, guidestar = split_record(record)
+    survey = guide_star_survey(record)
+    gra, gdec, gmag, gpra, gpdec, details = guide_star_candidates(record, target, survey, args.n, use_ds9=args.ds9)
+    offsets = planner_lib.calculate_guide_star_offsets(target['ra'], target['dec'], 90.0, gra, gdec)
+    result = pa_optimizer.sweep_pa([offset['dra'] for offset in offsets], [offset['ddec'] for offset in offsets], gmag, pa_step=args.pa_step)
+    for pa_range in result['ranges']:
+        pa_range['ra'] = offsets[pa_range['star']]['ra']
+        pa_range['dec'] = offsets[pa_range['star']]['dec']
+    return {'name': target['name'], 'n_candidates': len(offsets), 'ranges': result['ranges']}
+
+
+#Draw the finder chart for a target to a PNG or PDF without DS9 (see finder_render.py), from the FITS image given in the record
+#("fits") or else the image of the field in the finder chart image cache
+def render_chart(record, target, obj_coords, delta_PA, region_filename, chart_filename):
+    import finder_render
+    fits_filename = record.get('fits')
+    if fits_filename is None:
+        cache = ds9_lib.get_cutout_cache()
+        if cache is not None:
+            fits_filename = cache.lookup(target['survey'], obj_coords.ra.deg(), obj_coords.dec.deg(), float(target['fov']),
+                ds9_lib.finder_chart_pixels(target['survey']))
+        if fits_filename is None:
+            raise LookupError('No image of this field in the finder chart image cache, give one with "fits" in the record')
+    return finder_render.render_finder_chart(fits_filename, region_filename, chart_filename, obj_coords.ra.deg(), obj_coords.dec.deg(),
+        -45 + delta_PA, title=target['name'] or None)
+
+
+def finder(record, index, args):
+    target, guidestar = split_record(record)
+    region_filename = args.region_file.format(index=index, name=record_label(target, index))
+    obj_coords, delta_PA, guidestar_dra, guidestar_ddec, guidestar_sl, guidestar_sw, scan_blocks = planner_lib.prepare_finder_chart(
+        target, guidestar, region_filename=region_filename)
+    if args.ds9: #Also display the finder chart in DS9
+        ds9_lib.ds9.ensure_open()
+        ds9_lib.make_finder_chart_in_ds9(obj_coords, delta_PA, survey=target['survey'], fov=target['fov'],
+            guidestar_dra=guidestar_dra, guidestar_ddec=guidestar_ddec, guidestar_sl=guidestar_sl, guidestar_sw=guidestar_sw,
+            show_scan=target['use_slitscan'], scan_blocks=scan_blocks, scan_plus_90_deg=target['scan_rotation']=='+90 deg PA')
+    chart_filename = None
+    if args.chart is not None:
+        chart_filename = render_chart(record, target, obj_coords, delta_PA, region_filename, args.chart.format(index=index, name=record_label(target, index)))
+    ra, dec = obj_coords.showcoords().split()
+    return {
+        'name': target['name'],
+        'ra': ra,
+        'dec': dec,
+        'delta_PA': delta_PA,
+        'ds9_rotation': -45 + delta_PA,
+        'rotator_setting': planner_lib.calculate_rotator_setting(target['PA']),
+        'guidestar_dra': guidestar_dra,
+        'guidestar_ddec': guidestar_ddec,
+        'guidestar_sl': guidestar_sl,
+        'guidestar_sw': guidestar_sw,
+        'region_file': region_filename,
+        'chart': chart_filename,
+    }
+
+
+def slitscan_table(record, index, args):
+    target, guidestar = split_record(record)
+    scan_blocks = planner_lib.generate_slitscan_blocks_from_dictionary(target, guidestar['dG'][0], guidestar['dG'][1])
+    if args.output_dir is None:
+        return {'name': target['name'], 'table': planner_lib.generate_slitscan_table(scan_blocks, target['PA'])}
+    extension = '.parquet' if args.table_format == 'parquet' else '.csv'
+    filename = os.path.join(args.output_dir, record_label(target, index)+'_slitscan'+extension)
+    planner_lib.write_slitscan_table(scan_blocks, target['PA'], filename, layout=args.table_format)
+    return {'name': target['name'], 'file': filename}
+
+
+def slitscan_scripts(record, index, args):
+    target, guidestar = split_record(record)
+    scan_blocks = planner_lib.generate_slitscan_blocks_from_dictionary(target, guidestar['dG'][0], guidestar['dG'][1])
+    scripts = planner_lib.iterate_slitscan_scripts(scan_blocks, target['PA'], target['scan_script_targetshortname'],
+        target['scan_script_off'][0], target['scan_script_off'][1], scan_rotation=target['scan_rotation'])
+    if args.output_dir is None:
+        return {'name': target['name'], 'scripts': dict(scripts)}
+    archive = None
+    if args.archive is not None:
+        archive = args.archive.format(index=index, name=record_label(target, index))
+    return {'name': target['name'], 'files': planner_lib.write_slitscan_scripts(scripts, args.output_dir, archive=archive, n_threads=args.threads)}
+
+
+#Plan a whole target: look up its coordinates if it has none, pick guide stars (best first) if the record has none, and
+#write the save file, finder chart region file, and for slitscans the slitscan table and scripts into --output-dir
+#With --chart, the finder chart is also drawn to a PNG or PDF
+#Without --output-dir, returns the save file ({"target": ..., "guidestar": [...]}) as the output line
+def plan(record, index, args):
+    target, guidestar = split_record(record)
+    if target['ra'] == '' or target['dec'] == '': #Look up coordinates by name
+        ra, dec, pmra, pmdec = planner_lib.simbad_lookup(target['name'])
+        target['ra'] = ra
+        target['dec'] = dec
+        target['proper_motion'] = (pmra, pmdec)
+    target['rotator_setting'] = str(planner_lib.calculate_rotator_setting(target['PA']))
+    if isinstance(record.get('guidestar'), list): #Guide stars already picked, like in a save file
+        guidestar_dictionaries = [planner_lib.fill_target_dictionary(dictionary) for dictionary in record['guidestar']]
+    elif 'guidestar' in record:
+        guidestar_dictionaries = [guidestar]
+    else:
+        survey = guide_star_survey(record)
+        candidates = guide_star_candidates(record, target, survey, args.n, use_ds9=args.ds9)
+        if len(candidates[0]) == 0:
+            raise LookupError('No possible guide stars found for '+(target['name'] or str(index)))
+        guidestar_dictionaries = []
+        for offset in ranked_guide_stars(target, *candidates):
+            guidestar_dictionaries.append(planner_lib.fill_target_dictionary({'ra': offset['ra'], 'dec': offset['dec'],
+                'dra': str(offset['dra']), 'ddec': str(offset['ddec']), 'dG': (str(offset['sl']), str(offset['sw'])), 'survey': survey}))
+    save = {'target': target, 'guidestar': guidestar_dictionaries}
+    if args.output_dir is None:
+        return save
+    gs_index = int(record.get('gs_index', 0))
+    guidestar = guidestar_dictionaries[gs_index] if len(guidestar_dictionaries) > 0 else planner_lib.fill_target_dictionary({})
+    label = record_label(target, index)
+    files = []
+    filename = os.path.join(args.output_dir, label+'.json')
+    with open(filename, 'w') as f: #Same format as the GUI saves, so the plan can be loaded and checked in the GUI
+        f.write(json.dumps(save, indent=4, default=json_default))
+    files.append(filename)
+    region_filename = os.path.join(args.output_dir, label+'.reg')
+    finder_chart = planner_lib.prepare_finder_chart(target, guidestar, region_filename=region_filename)
+    scan_blocks = finder_chart[-1]
+    files.append(region_filename)
+    if args.chart is not None:
+        files.append(render_chart(record, target, finder_chart[0], finder_chart[1], region_filename,
+            os.path.join(args.output_dir, args.chart.format(index=index, name=label))))
+    if target['use_slitscan']:
+        extension = '.parquet' if args.table_format == 'parquet' else '.csv'
+        files.append(planner_lib.write_slitscan_table(scan_blocks, target['PA'], os.path.join(args.output_dir, label+'_slitscan'+extension),
+            layout=args.table_format))
+        scripts = planner_lib.iterate_slitscan_scripts(scan_blocks, target['PA'], target['scan_script_targetshortname'],
+            target['scan_script_off'][0], target['scan_script_off'][1], scan_rotation=target['scan_rotation'])
+        files += planner_lib.write_slitscan_scripts(scripts, args.output_dir, archive=label+'_scripts.zip')
+    return {'name': target['name'], 'ra': target['ra'], 'dec': target['dec'], 'files': files}
+
+
+commands = {
+    'resolve': resolve,
+    'guidestars': guidestars,
+    'finder': finder,
+    'slitscan-table': slitscan_table,
+    'slitscan-scripts': slitscan_scripts,
+    'plan': plan,
+    'pa-sweep': pa_sweep,
+}
+
+
+#Schedule the whole target list over a night (see scheduler.py), writes one line per scheduled task in time order and then
+#a line listing the tasks that did not fit
+def schedule(records, args):
+    import scheduler
+    if args.date is None:
+        raise ValueError('schedule needs --date, the local date the night starts on')
+    targets, indices, errors = [], [], []
+    for index, record in enumerate(records):
+        try:
+            target = split_record(record)[0]
+            planner_lib.coords(target['ra'], target['dec']) #Check the coordinates so one bad line doesn't stop the whole schedule
+        except Exception as e:
+            errors.append({'index': index, 'error': type(e).__name__+': '+str(e)})
+            continue
+        for key in ('duration', 'pair_duration'): #Minutes for a target or each slitscan block pair, kept with the target
+            if key in record:
+                target[key] = record[key]
+        targets.append(target)
+        indices.append(index)
+    scheduled, unscheduled = scheduler.schedule(targets, args.date, max_airmass=args.max_airmass, step_minutes=args.step_minutes,
+        start_time=args.start_time)
+    for task in scheduled: #Number targets by their input line
+        task['target'] = indices[task['target']]
+    return errors + scheduled + [{'unscheduled': [{'target': indices[i], 'task': label} for i, label in unscheduled]}]
+
+
+#Commands that work on the whole target list at once instead of one record at a time
+list_commands = {
+    'schedule': schedule,
+}
+
+
+#Convert numpy types into things json can serialize
+def json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Object of type '+type(obj).__name__+' is not JSON serializable')
+
+
+#Read JSON records from a file, either one object per line or a single (possibly indented) JSON object like a save file
+def read_records(f):
+    text = f.read()
+    try:
+        return [json.loads(text)]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip() != '']
+
+
+#Read records from a CSV target list with a header line of target keys, tuple keys (e.g. dA) are given as "x y"
+#and use_proper_motion and use_slitscan as true/false, blank values are left out so the defaults are used
+def read_csv_records(f):
+    records = []
+    for row in csv.DictReader(f):
+        record = {}
+        for key, value in row.items():
+            if key is None or value is None or value.strip() == '':
+                continue
+            key, value = key.strip(), value.strip()
+            if isinstance(planner_lib.default_target_dictionary.get(key), tuple):
+                value = tuple(value.split())
+            elif isinstance(planner_lib.default_target_dictionary.get(key), bool):
+                value = value.lower() in ('true', 'yes', '1')
+            record[key] = value
+        records.append(record)
+    return records
+
+
+#Set up module settings from the command line, in this process or in each worker process
+def configure(args):
+    if args.simbad_table is not None: #Resolve names from a local table instead of SIMBAD (e.g. for tests or working offline)
+        import name_resolver
+        planner_lib.name_resolver = name_resolver.NameResolver(name_resolver.StandInService(filename=args.simbad_table))
+    for setting in args.guide_star_index:
+        survey, directory = setting.split('=', 1)
+        ds9_lib.guide_star_index_directories[check_guide_star_survey(survey)] = directory
+
+
+#Resolve the names of all the targets (for "plan" only the ones without coordinates) at once, so they are cached for the
+#lookups done for each target, if something goes wrong each target is looked up on its own like before
+def prefetch_names(records, only_missing_coordinates):
+    names = []
+    for record in records:
+        try:
+            target = split_record(record)[0]
+        except Exception: #Reported when the record is run
+            continue
+        if target['name'] != '' and not (only_missing_coordinates and target['ra'] != '' and target['dec'] != ''):
+            names.append(target['name'])
+    if len(names) > 0:
+        try:
+            planner_lib.simbad_lookup_names(names)
+        except Exception as e:
+            print('WARNING: Looking up all the target names at once failed ('+type(e).__name__+': '+str(e)+'), looking them up one at a time')
+
+
+#Run a command on one record, returns the output dictionary (or the error) and how long it took
+#Used directly or in worker processes, so anything printed goes to stderr to keep stdout valid JSON lines
+def run_record(command, record, index, args):
+    start_time = time.time()
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            result = commands[command](record, index, args)
+        except Exception as e: #Report the error for this record and move on to the next one
+            result = {'index': index, 'error': type(e).__name__+': '+str(e)}
+    return result, time.time() - start_time
+
+
+#Report progress on one record to stderr
+def report_progress(n_done, n_records, index, record, result, seconds):
+    name = record.get('name', record.get('target', {}).get('name', '')) or str(index)
+    status = result['error'] if 'error' in result else 'ok'
+    sys.stderr.write('[%i/%i] %s: %s (%.1f s)\n' % (n_done, n_records, name, status, seconds))
+    sys.stderr.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='IGRINS Observing Planner command line interface, reads and writes JSON lines.')
+    parser.add_argument('command', choices=list(commands.keys()) + list(list_commands.keys()), help='What to plan for each input line (or for "schedule", the whole list)')
+    parser.add_argument('--input', '-i', default=None, help='File to read JSON lines from (default: stdin)')
+    parser.add_argument('--output-dir', '-o', default=None, help='Directory to write slitscan tables or scripts into (default: write them into the JSON output)')
+    parser.add_argument('--region-file', default='IGRINS_svc_generated.reg', help='Region file to write for "finder", can use {index} and {name}')
+    parser.add_argument('--chart', default=None, help='Also draw finder charts without DS9 to this .png or .pdf file (needs astropy, matplotlib, and a cached or given "fits" image), can use {index} and {name}')
+    parser.add_argument('--archive', default=None, help='Write slitscan scripts into a single .zip, .tar, or .tar.gz archive with a manifest in --output-dir, can use {index} and {name}')
+    parser.add_argument('--table-format', choices=['sheet', 'columns', 'parquet'], default='sheet', help='Slitscan table layout: "sheet" CSV for the observing log, "columns" CSV with one column per value, or "parquet" (requires pyarrow)')
+    parser.add_argument('--threads', type=int, default=1, help='Number of threads for writing slitscan script files (helps on network disks)')
+    parser.add_argument('--date', default=None, help='Local date the night to schedule starts on (YYYY-MM-DD)')
+    parser.add_argument('--start-time', default=None, help='Re-plan a night from this UTC time on (YYYY-MM-DDTHH:MM)')
+    parser.add_argument('--max-airmass', type=float, default=2.0, help='Highest airmass to schedule targets at')
+    parser.add_argument('--step-minutes', type=float, default=5.0, help='Time step for scheduling (minutes)')
+    parser.add_argument('--pa-step', type=float, default=1.0, help='Step between PAs for "pa-sweep" (deg.)')
+    parser.add_argument('--ds9', action='store_true', help='Also display finder charts in DS9, and query guide star catalogs through DS9 when not cached (requires DS9 and XPA)')
+    parser.add_argument('--guide-star-index', action='append', default=[], metavar='SURVEY=DIRECTORY', help='Search a local catalog index (see catalog_index.py) for guide stars for a survey, can be given more than once')
+    parser.add_argument('--simbad-table', default=None, help='Resolve target names from this JSON file of {"name": [ra, dec, pmra, pmdec]} instead of SIMBAD')
+    parser.add_argument('--processes', '-p', type=int, default=1, help='Number of worker processes to plan targets in (output stays in input order)')
+    parser.add_argument('--progress', action='store_true', help='Report progress for each target on stderr (always on with --processes)')
+    parser.add_argument('-n', type=int, default=ds9_lib.n_gstars, help='Maximum number of guide stars to read from a catalog')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.processes > 1 and args.ds9:
+        parser.error('--ds9 can only be used with one process, there is only one DS9 to send commands to')
+    for setting in args.guide_star_index:
+        if '=' not in setting or setting.split('=', 1)[0] not in ds9_lib.guide_star_surveys:
+            parser.error('--guide-star-index needs SURVEY=DIRECTORY where SURVEY is one of: '+', '.join('"'+name+'"' for name in ds9_lib.guide_star_surveys))
+    configure(args)
+    stdout = sys.stdout
+    n_errors = 0
+    with contextlib.redirect_stdout(sys.stderr): #Anything the planning code prints goes to stderr so stdout stays valid JSON lines
+        if args.input is None:
+            records = read_records(sys.stdin)
+        else:
+            import project_file
+            if project_file.is_project_file(args.input): #Every target in a project file saved by the GUI
+                records = project_file.read_project_records(args.input)
+            else:
+                with open(args.input) as f:
+                    records = read_csv_records(f) if args.input.lower().endswith('.csv') else read_records(f)
+    if args.command in ('resolve', 'plan'): #Look up all the names in one SIMBAD request up front, looking up each target then doesn't need the network
+        with contextlib.redirect_stdout(sys.stderr):
+            prefetch_names(records, args.command == 'plan')
+    def write_result(result):
+        stdout.write(json.dumps(result, default=json_default)+'\n')
+        stdout.flush()
+    if args.command in list_commands:
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                results = list_commands[args.command](records, args)
+            except Exception as e:
+                results = [{'error': type(e).__name__+': '+str(e)}]
+        for result in results:
+            write_result(result)
+        return 1 if any('error' in result for result in results) else 0
+    if args.processes <= 1:
+        for index in range(len(records)):
+            result, seconds = run_record(args.command, records[index], index, args)
+            if args.progress:
+                report_progress(index + 1, len(records), index, records[index], result, seconds)
+            n_errors += 'error' in result
+            write_result(result)
+        return 1 if n_errors > 0 else 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.processes, initializer=configure, initargs=(args,)) as executor:
+        futures = {executor.submit(run_record, args.command, records[index], index, args): index for index in range(len(records))}
+        results = {}
+        next_index = 0
+        for n_done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            index = futures[future]
+            try:
+                result, seconds = future.result()
+            except Exception as e: #E.g. a worker process died
+                result, seconds = {'index': index, 'error': type(e).__name__+': '+str(e)}, 0.0
+            report_progress(n_done, len(records), index, records[index], result, seconds)
+            n_errors += 'error' in result
+            results[index] = result
+            while next_index in results: #Write results in input order as soon as all the ones before them are done
+                write_result(results.pop(next_index))
+                next_index += 1
+    return 1 if n_errors > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,549 @@
+#Planning core for the IGRINS Observing Planner
+#Everything here works on plain values (floats, ints, strings, lists, and dictionaries) instead of tkinter variables
+#so planning can be done without a display or a running DS9 (e.g. from planner_cli.py, cron jobs, or worker processes)
+
+import os
+import io
+import json
+import time
+import tarfile
+import zipfile
+import functools
+import concurrent.futures
+import numpy as np #Import numpy
+import ds9_lib #Import DS9 library for the sl/sw <-> dRA/dDec conversion helpers and region file creation
+from coordfuncs import *  #Import coordfuncs for handing spherical astronomy and coordinates
+
+rotator_zero_point = 193.0       #Instrument rotator zero point (Default East-West setting has PA = 90 deg.)
+
+
+#Default values for a target, same as what the GUI starts with and the keys saved in the JSON files
+default_target_dictionary = {
+    'ra': '',
+    'dec': '',
+    'dra': '0.0',
+    'ddec': '0.0',
+    'proper_motion': ('0.0', '0.0'),
+    'use_proper_motion': False,
+    'PA': '90.0',
+    'dA': ('-3.33', '0.0'),
+    'dB': ('3.33', '0.0'),
+    'dG': ('0.0', '0.0'),
+    'name': '',
+    'rotator_setting': '0.0',
+    'fov': '6.0',
+    'survey': '2MASS K-band',
+    'epoch': '2025.0',
+    'use_slitscan': False,
+    'scan_rotation': 'Default PA',
+    'scan_Nstep': '15',
+    'scan_dstep': '1.0',
+    'scan_perNod': '3',
+    'scan_Nrow': '1',
+    'scan_Ncol': '1',
+    'scan_drow': '15.0',
+    'scan_dcol': '15.0',
+    'scan_finder_row': '0',
+    'scan_finder_col': '0',
+    'scan_finder_pos': '0',
+    'scan_script_targetshortname': '',
+    'scan_script_off': ('0.0', '0.0'),
+}
+
+
+#Fill in any missing keys in a target dictionary (e.g. from a JSON save file or a line read by the CLI) with the defaults
+#Also takes a target_model.TargetData, whose values are already numbers instead of strings
+def fill_target_dictionary(dictionary):
+    filled = dict(default_target_dictionary)
+    filled.update(dictionary)
+    return filled
+
+
+#Calculate the instrument rotator setting for a given PA
+def calculate_rotator_setting(PA):
+    delta_PA = 90.0 - float(PA)  #Default instrument East-west setting is 90 degrees in PA
+    rotator_setting = rotator_zero_point - delta_PA  #Calculate setting to put the rotator at for a given PA
+    if rotator_setting > rotator_zero_point + 180.0: rotator_setting = rotator_setting - 360.0  #Force rotator to be +/- 180 deg from the default PA
+    return rotator_setting
+
+
+simbad = None #Simbad query object, only set up the first time a lookup is needed so importing this module stays light
+use_name_cache = True #Keep SIMBAD lookups in a local SQLite database so the same names are not looked up again
+name_cache_filename = os.path.join(os.path.expanduser('~'), '.igrins_observing_planner', 'simbad_cache.sqlite')
+name_cache_ttl_days = 30.0 #Days to keep using a cached SIMBAD lookup before looking it up again
+name_resolver = None #NameResolver object (see name_resolver.py), made by get_name_resolver() the first time it is needed
+
+
+#Return the Simbad query object, setting it up to also grab proper motions the first time it is used
+def get_simbad():
+    global simbad
+    if simbad is None:
+        from astroquery.simbad import Simbad
+        simbad = Simbad()
+        simbad.add_votable_fields('pmra', 'pmdec') #Add thing to grab from simbad
+    return simbad
+
+
+#Return the resolver for target names, which looks names up in SIMBAD many at a time and caches the results
+def get_name_resolver():
+    global name_resolver
+    if name_resolver is None:
+        import sqlite3
+        import name_resolver as name_resolver_module
+        cache = None
+        if use_name_cache:
+            try:
+                cache = name_resolver_module.NameCache(name_cache_filename, ttl=name_cache_ttl_days * 86400.0)
+            except (OSError, sqlite3.Error):
+                cache = None
+        name_resolver = name_resolver_module.NameResolver(name_resolver_module.SimbadService(get_simbad), cache)
+    return name_resolver
+
+
+#Lookup RA, Dec, and proper motion of a target by name from simbad, returns sexagesimal RA and Dec strings and proper motions in mas/yr
+#Raises LookupError if SIMBAD doesn't know the name
+def simbad_lookup(name):
+    return get_name_resolver().resolve_one(name)
+
+
+#Lookup many names at once (one SIMBAD request for all the ones not cached), returns a dictionary of name: (ra, dec, pmra, pmdec)
+#for the names that were found
+def simbad_lookup_names(names):
+    return get_name_resolver().resolve(names)
+
+
+#Calculate dRA and dDec (arcsec) and sl and sw (arcsec) of guide stars relative to a target for a given PA
+#gstar_ra and gstar_dec can be sexagesimal strings or decimal degrees
+def calculate_guide_star_offsets(target_ra, target_dec, PA, gstar_ra, gstar_dec):
+    target_coords = coords(target_ra, target_dec)
+    if len(gstar_ra) > 0 and all([isinstance(coord, str) for coord in list(gstar_ra) + list(gstar_dec)]): #Convert all sexigasimal coordinates at once
+        gstar_ra, gstar_dec = sex2deg_array(gstar_ra, units='hms'), sex2deg_array(gstar_dec, units='dms')
+    else:
+        gstar_ra = [sex2deg(ra, units='hms') if isinstance(ra, str) else ra for ra in gstar_ra]
+        gstar_dec = [sex2deg(dec, units='dms') if isinstance(dec, str) else dec for dec in gstar_dec]
+    gra, gdec, dra, ddec, sl, sw = ds9_lib.calculate_guide_star_positions(target_coords.ra.deg(), target_coords.dec.deg(), gstar_ra, gstar_dec, PA)
+    showcoords = coords_array(gra, gdec).showcoords()
+    offsets = []
+    for i in range(len(gra)):
+        ra, dec = showcoords[i].split()
+        offsets.append({'ra': ra, 'dec': dec, 'dra': dra[i], 'ddec': ddec[i], 'sl': sl[i], 'sw': sw[i]})
+    return offsets
+
+
+#Slitscan blocks, a read only structured array with one element per block (fields "row", "col", "pos", "sl", "sw") that can be
+#used like the list of dictionaries it replaced (e.g. scan_blocks[i]['sw'][j]), plus an index to look up the guide star sl and sw
+#for a row, column, and position without searching the blocks
+class ScanBlocks:
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.lookup_table = None #Built the first time get_sl_sw() is called
+    def __len__(self):
+        return len(self.blocks)
+    def __getitem__(self, i):
+        return self.blocks[i]
+    def __iter__(self):
+        return iter(self.blocks)
+    #Build a table of (row, col, pos) -> index of the first block and position in that block with that row, col, and pos
+    def build_lookup_table(self):
+        n_blocks, n_pos = self.blocks['pos'].shape
+        rows = np.repeat(self.blocks['row'], n_pos)
+        cols = np.repeat(self.blocks['col'], n_pos)
+        pos = self.blocks['pos'].ravel()
+        if n_blocks == 0:
+            self.lookup_table = np.zeros((0, 0, 0), dtype=np.int64)
+            self.offset = self.shape = (0, 0, 0)
+            return
+        self.offset = (rows.min(), cols.min(), pos.min()) #Rows and columns can be negative (e.g. -1 for an odd number of rows)
+        self.shape = (rows.max()-self.offset[0]+1, cols.max()-self.offset[1]+1, pos.max()-self.offset[2]+1)
+        keys = np.ravel_multi_index((rows-self.offset[0], cols-self.offset[1], pos-self.offset[2]), self.shape)
+        keys, first = np.unique(keys, return_index=True) #np.unique returns the index of the first occurance, to match searching the blocks in order
+        self.lookup_table = np.full(self.shape, -1, dtype=np.int64)
+        self.lookup_table.ravel()[keys] = first
+    #Return guidestar sl and sw for a given row, column, and position, or None if the slitscan does not have that position
+    def get_sl_sw(self, row=0, col=0, pos=0):
+        if self.lookup_table is None:
+            self.build_lookup_table()
+        row, col, pos = row-self.offset[0], col-self.offset[1], pos-self.offset[2]
+        if not (0 <= row < self.shape[0] and 0 <= col < self.shape[1] and 0 <= pos < self.shape[2]):
+            return None
+        i = self.lookup_table[row, col, pos]
+        if i < 0:
+            return None
+        block, j = divmod(int(i), self.blocks['pos'].shape[1])
+        return self.blocks['sl'][block], self.blocks['sw'][block, j]
+
+
+#Return the pattern of indices for filling out an odd row or column of n blocks by alternating, pattern is 2-0-3-1 for each 4 blocks
+def alternating_pattern(n):
+    patterns = {0: [], 1: [0], 2: [1, 0], 3: [1, 0, 2]}
+    return np.concatenate([(np.arange(0, n - n % 4, 4)[:, np.newaxis] + [2, 0, 3, 1]).ravel(), n - n % 4 + np.array(patterns[n % 4], dtype=int)]).astype(int)
+
+
+#Generate the slitscan blocks, returns a ScanBlocks array that defines each block
+#Each block has the block "row" and "col", the step positions "pos", and the guide star "sl" and "sw" for each position
+#Results are cached, so generating the same blocks again costs nothing (the blocks are read only)
+@functools.lru_cache(maxsize=32)
+def generate_slitscan_blocks(dg_sl, dg_sw, total_steps=15, perNod=3, nrows=1, ncols=1, drow=15.0, dcol=15.0, dstep=1.0, scan_rotation='Default PA'):
+    if scan_rotation != 'Default PA': #Swap number and distance traveled for rows and columns if in perpeindicular rotation
+        nrows, ncols = ncols, nrows
+        drow, dcol = dcol, drow
+    rows_start = ((nrows-1)/2) * drow #Calculate starting coordinate offsets
+    cols_start = -((ncols-1)/2) * dcol
+    steps_start = -((total_steps-1)/2) * dstep
+
+    rows = [np.zeros(0, dtype=int)]
+    cols = [np.zeros(0, dtype=int)]
+    #Generate block rows and columns pattern
+    if nrows >= 2 and ncols >=2: #Need at least 2x2 rows and cols to do the zig zag pattern
+        i, j = np.meshgrid(np.arange(0, nrows-1, 2), np.arange(0, ncols-1, 2), indexing='ij')
+        rows.append((i[:, :, np.newaxis] + [0, 1, 1, 0]).ravel()) #Do the zigzag between chunks of 4 rows and columns
+        cols.append((j[:, :, np.newaxis] + [0, 1, 0, 1]).ravel())
+    if nrows % 2 == 1: #If there are an odd number of rows, fill out the last row by alternating columns
+        cols.append(alternating_pattern(ncols))
+        rows.append(np.full(ncols, nrows-1))
+        nrows = nrows-1 #Note the last row is filled out now so no need to repeat it for the last column so we subtract 1 here
+    if ncols % 2 == 1:
+        rows.append(alternating_pattern(nrows))
+        cols.append(np.full(nrows, ncols-1))
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    #Generate step pattern within blocks
+    n_sets = int(total_steps / perNod)
+    steps = np.arange(n_sets)[:, np.newaxis] + n_sets*np.concatenate([np.arange(perNod), np.arange(perNod-1, -1, -1)])
+    steps_centers = steps_start + steps*dstep
+    #Organize into list of offs, blocks, and positions into "chunks" between offs
+    #Blocks are nodded between in pairs, for each pair go through each set of steps, if there are an odd number of blocks the last chunk mixes 3 blocks
+    n_blocks = len(rows)
+    if n_blocks % 2 == 1 and n_blocks > 1:
+        n_pairs = (n_blocks - 3) // 2
+    else:
+        n_pairs = n_blocks // 2
+    block_index = np.broadcast_to(2*np.arange(n_pairs)[:, np.newaxis, np.newaxis] + np.arange(2), (n_pairs, n_sets, 2)).ravel()
+    set_index = np.broadcast_to(np.arange(n_sets)[np.newaxis, :, np.newaxis], (n_pairs, n_sets, 2)).ravel()
+    if n_blocks % 2 == 1: #Last chunk has 3 blocks (or the only block)
+        n_last = 3 if n_blocks > 1 else 1
+        block_index = np.concatenate([block_index, np.broadcast_to(n_blocks - n_last + np.arange(n_last), (n_sets, n_last)).ravel()])
+        set_index = np.concatenate([set_index, np.broadcast_to(np.arange(n_sets)[:, np.newaxis], (n_sets, n_last)).ravel()])
+    blocks = np.zeros(len(block_index), dtype=[('row', int), ('col', int), ('pos', int, (2*perNod,)), ('sl', float), ('sw', float, (2*perNod,))])
+    row_center = rows_start - rows[block_index]*drow
+    col_center = cols_start + cols[block_index]*dcol
+    blocks['sw'] = (dg_sw + row_center)[:, np.newaxis] + steps_centers[set_index]
+    blocks['sl'] = dg_sl + col_center
+    blocks['pos'] = steps[set_index]
+    blocks['row'] = nrows - rows[block_index] - 1
+    blocks['col'] = ncols - cols[block_index] - 1
+    if scan_rotation == '+90 deg PA': #If perpendicular scan with PA at +90 deg compared to default (e.g. PA 90 is default so this would be PA of 180 deg)
+        blocks['row'], blocks['col'] = ncols - blocks['col'] - 1, blocks['row'].copy()
+    blocks.flags.writeable = False
+    return ScanBlocks(blocks)
+
+
+#Generate slitscan blocks using the values stored in a target dictionary and the guide star dG (sl, sw)
+def generate_slitscan_blocks_from_dictionary(target_dictionary, dg_sl=0.0, dg_sw=0.0):
+    d = fill_target_dictionary(target_dictionary)
+    return generate_slitscan_blocks(float(dg_sl), float(dg_sw),
+        total_steps=int(d['scan_Nstep']), perNod=int(d['scan_perNod']),
+        nrows=int(d['scan_Nrow']), ncols=int(d['scan_Ncol']),
+        drow=float(d['scan_drow']), dcol=float(d['scan_dcol']), dstep=float(d['scan_dstep']),
+        scan_rotation=d['scan_rotation'])
+
+
+#Return guidestar sl and sw for a given row, column, and position in a slitscan
+def get_scan_sl_sw(scan_blocks, row=0, col=0, pos=0):
+    return scan_blocks.get_sl_sw(row=row, col=col, pos=pos)
+
+
+#Build the slitscan observing plan as columns, one row per pair of blocks nodded between (the last row can have just one block)
+#Returns a dictionary of column name -> numpy array: "PA", "block_1" and "block_2" ("row-col", "" if no second block),
+#"pos_1" ... "pos_n" step positions, and "block_1_pos_k_sl", "block_1_pos_k_sw", "block_2_pos_k_sl", "block_2_pos_k_sw" guide star
+#positions for each of the 2n positions (nan if no second block)
+def generate_slitscan_table_columns(scan_blocks, PA):
+    blocks = scan_blocks.blocks
+    block_1 = blocks[0::2]
+    n_rows = len(block_1)
+    has_block_2 = np.arange(n_rows)*2+1 < len(blocks)
+    block_2 = np.zeros(n_rows, dtype=blocks.dtype)
+    block_2[has_block_2] = blocks[1::2]
+    n_positions = blocks['pos'].shape[1] // 2
+    columns = {'PA': np.full(n_rows, str(PA))}
+    columns['block_1'] = np.char.add(np.char.add(block_1['row'].astype(str), '-'), block_1['col'].astype(str))
+    columns['block_2'] = np.where(has_block_2, np.char.add(np.char.add(block_2['row'].astype(str), '-'), block_2['col'].astype(str)), '')
+    for j in range(n_positions):
+        columns['pos_'+str(j+1)] = block_1['pos'][:, j]
+    for name, block in (('block_1', block_1), ('block_2', block_2)):
+        for k in range(2*n_positions):
+            columns[name+'_pos_'+str(k+1)+'_sl'] = np.where(has_block_2, block['sl'], np.nan) if name == 'block_2' else block['sl']
+            columns[name+'_pos_'+str(k+1)+'_sw'] = np.where(has_block_2, block['sw'][:, k], np.nan) if name == 'block_2' else block['sw'][:, k]
+    return columns
+
+
+#Format an array of numbers the way the observing log table does ("%0.2f"), leaving nan as blank
+def format_table_numbers(values):
+    return np.where(np.isnan(values), '', np.char.mod('%0.2f', values))
+
+
+#Generate lines of a CSV table that can be imported into google sheets as an observing log plan
+def generate_slitscan_table(scan_blocks, PA):
+    lines = []
+    #Define header line
+    blank_line = ', , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , , '
+    header_line = 'PA, Night, Exp. time, Block 1, Block 2,'
+    n_positions = int(len(scan_blocks[0]['pos'])/2)
+    for j in range(n_positions):
+        header_line += 'Pos '+str(j+1)+', '
+    header_line += 'OFF, , '
+    for j in range(n_positions):
+        header_line += 'Block 1 Pos '+str(j)+', , '
+    for j in range(n_positions, 0, -1):
+        header_line += 'Block 1 Pos '+str(j)+', , '
+    header_line += 'OFF, , '
+    for j in range(n_positions):
+        header_line += 'Block 2 Pos '+str(j+1)+', , '
+    for j in range(n_positions, 0, -1):
+        header_line += 'Block 2 Pos '+str(j)+', , '
+    header_line += 'OFF, , Airmass, UT, Comments'
+    lines.append(header_line)
+    #Define observing plan, every line is filled in from the columns with one format string
+    columns = generate_slitscan_table_columns(scan_blocks, PA)
+    block_names = ['PA', 'block_1', 'block_2'] + ['pos_'+str(j+1) for j in range(n_positions)]
+    block_1_names = [name for k in range(2*n_positions) for name in ('block_1_pos_'+str(k+1)+'_sl', 'block_1_pos_'+str(k+1)+'_sw')]
+    block_2_names = [name for k in range(2*n_positions) for name in ('block_2_pos_'+str(k+1)+'_sl', 'block_2_pos_'+str(k+1)+'_sw')]
+    line_format = '%s, , , %s, %s, ' + '%i, '*n_positions #PA, Date of night and Exp time (left blank), Block 1, Block 2, Position J (usually 1 2 3 for example)
+    line_format += ', , ' + '%0.2f, %0.2f, '*(2*n_positions) #OFF, Block 1 Pos J
+    one_block_line_format = line_format + ', , ' + ', , '*(2*n_positions) + ', , , , , ' #Last line can have just one block, so just leave blanks
+    line_format += ', , ' + '%0.2f, %0.2f, '*(2*n_positions) + ', , , , , ' #OFF, Block 2 Pos J, OFF, and Airmass, UT, and Comments left blank
+    n_one_block = len(block_names) + len(block_1_names)
+    for values in zip(*[columns[name].tolist() for name in block_names + block_1_names + block_2_names]):
+        if values[2] == '': #Catch if last "chunk" has only one block
+            lines.append(one_block_line_format % values[:n_one_block]) #Store line in list
+        else:
+            lines.append(line_format % values)
+        lines.append(blank_line) #Insert blank line for later data entry
+    return lines
+
+
+#Write the slitscan observing plan to a file, the format is picked from the file name:
+#  .parquet - the columns from generate_slitscan_table_columns (needs pyarrow)
+#  anything else - CSV, either the observing log layout for google sheets (layout='sheet', same as generate_slitscan_table)
+#                  or just the columns with a header of column names and no blank lines (layout='columns')
+def write_slitscan_table(scan_blocks, PA, filename, layout='sheet'):
+    if filename.endswith('.parquet'):
+        import pyarrow
+        import pyarrow.parquet
+        columns = generate_slitscan_table_columns(scan_blocks, PA)
+        pyarrow.parquet.write_table(pyarrow.table(columns), filename)
+        return filename
+    if layout == 'sheet':
+        lines = generate_slitscan_table(scan_blocks, PA)
+    else:
+        columns = generate_slitscan_table_columns(scan_blocks, PA)
+        formatted = [format_table_numbers(column) if column.dtype.kind == 'f' else column.astype(str) for column in columns.values()]
+        lines = [','.join(columns.keys())] + [','.join(line) for line in zip(*[column.tolist() for column in formatted])]
+    with open(filename, 'w') as f:
+        f.write(''.join(f"{line}\n" for line in lines))
+    return filename
+
+
+#Generate script lines for moving the telescope by dra and ddec (arcsec), the telescope can only move <= 300 arcsec at a time so we do it in increments if we move further
+def generate_move_telescope_lines(dra, ddec):
+    lines = []
+    while dra > 300.0:
+        lines.append('MoveTelescope 300 0')
+        lines.append('WaitForSeconds 3')
+        dra = dra - 300.0
+    while dra < -300.0:
+        lines.append('MoveTelescope -300 0')
+        lines.append('WaitForSeconds 3')
+        dra = dra + 300.0
+    while ddec > 300.0:
+        lines.append('MoveTelescope 0 300')
+        lines.append('WaitForSeconds 3')
+        ddec = ddec - 300.0
+    while ddec < -300.0:
+        lines.append('MoveTelescope 0 -300')
+        lines.append('WaitForSeconds 3')
+        ddec = ddec + 300.0
+    lines.append('MoveTelescope '+str(dra)+' '+str(ddec))
+    lines.append('WaitForSeconds 3')
+    return lines
+
+
+#Generate instructions to go to the off which will form an independent script but also be appended to the end of a set of positions
+def generate_off_lines(targetshortname, off_dra, off_ddec):
+    off_lines = []
+    off_lines.append('SetObjName '+targetshortname+'_OFF')
+    off_lines.extend(generate_move_telescope_lines(float(off_dra), float(off_ddec))) #Moving telescope to off
+    off_lines.append('StartGuideBox') #Start and stop guiding to take a single image
+    off_lines.append('WaitForSeconds 1')
+    off_lines.append('StopAG')
+    off_lines.append('StartExposure')
+    off_lines.append('WaitForExposureEnds')
+    off_lines.extend(generate_move_telescope_lines(-float(off_dra), -float(off_ddec))) #Moving telescope back to on position
+    off_lines.append('StartGuideBox') #Start and stop guiding to take a single image
+    off_lines.append('WaitForSeconds 1')
+    off_lines.append('StopAG')
+    return off_lines
+
+
+#Generate the lines of the observing script for one slitscan block (row, col, step positions, guide star sl, and guide star sw
+#for each position, as plain python values), for each set of block positions 123321 with an off at the end
+def generate_slitscan_block_script_lines(row, col, pos, sl, sw, PA, targetshortname, off_lines, scan_rotation='Default PA'):
+    lines = []
+    lines.append('SetObjType TAR')
+    previous_sl = sl
+    previous_sw = sw[0]
+    lines.append('SetAGPos %0.2f'%sl +' %0.2f'%sw[0])
+    name = targetshortname+'_'+str(row)+'-'+str(col)+'-'
+    lines.append('SetObjName '+name+str(pos[0]))
+    text_to_say = 'To start the script for '+str(row)+'-'+str(col)+'-'+str(pos[0])+' (row-col-position), center the guide star on the autoguide position then click OK.'
+    text_to_say = text_to_say.replace(' ', r'\ ') #Note needed to replace spaces with \[space] for script to use full sentence
+    lines.append('WaitForYes '+text_to_say)
+    lines.extend(['StartGuideBox', 'WaitForSeconds 15', 'StartExposure', 'WaitForExposureEnds', 'StopAG', 'WaitForSeconds 3'])
+    n_pos = len(pos)
+    i = 1
+    while i < n_pos:
+        dra, ddec = ds9_lib.convert_from_sl_sw_to_dra_ddec(sl-previous_sl, sw[i]-previous_sw, float(PA))
+        previous_sl = sl
+        previous_sw = sw[i]
+        lines.append('SetObjName '+name+str(pos[i]))
+        lines.append('SetAGPos %0.2f'%sl +' %0.2f'%sw[i])
+        if not scan_rotation=='+90 deg PA':
+            lines.append('MoveTelescope %0.2f'%-dra +' %0.2f'%-ddec)
+        else:
+            lines.append('MoveTelescope %0.2f'%dra +' %0.2f'%ddec)
+        lines.extend(['WaitForSeconds 3', 'StartGuideBox', 'StartExposure', 'WaitForExposureEnds'])
+        if i < n_pos-1:
+            if pos[i] == pos[i+1]:
+                lines.extend(['StartExposure', 'WaitForExposureEnds'])
+                i = i+1
+        lines.extend(['StopAG', 'WaitForSeconds 3'])
+        i = i+1
+    lines.extend(off_lines) #Add going to the off to the end of the script
+    return lines
+
+
+#Yield (label, lines) for each observing script for a slitscan, one script at a time, where label is the script file name without
+#the ".script" extension.  Scripts are the OFF, then for each pair of blocks the two block scripts followed by a script that runs
+#both blocks one after the other (for convenience), so only the last two block scripts are ever kept around
+def iterate_slitscan_scripts(scan_blocks, PA, targetshortname, off_dra, off_ddec, scan_rotation='Default PA'):
+    off_lines = generate_off_lines(targetshortname, off_dra, off_ddec)
+    yield targetshortname+'_OFF', off_lines
+    blocks = scan_blocks.blocks
+    rows, cols, pos, sl, sw = blocks['row'].tolist(), blocks['col'].tolist(), blocks['pos'].tolist(), blocks['sl'].tolist(), blocks['sw'].tolist() #Plain python values are much quicker to format
+    previous_label, previous_lines = None, None
+    for i in range(len(blocks)):
+        label = targetshortname+'_'+str(rows[i])+'-'+str(cols[i])+'-'+str(pos[i][0])
+        lines = generate_slitscan_block_script_lines(rows[i], cols[i], pos[i], sl[i], sw[i], PA, targetshortname, off_lines, scan_rotation)
+        yield label, lines
+        if i % 2 == 1: #Script for running the pair of blocks
+            yield previous_label+label[len(targetshortname):], previous_lines+lines
+        previous_label, previous_lines = label, lines
+
+
+#Generate the observing scripts for a slitscan
+#Returns a list of (label, lines) with the OFF script first, then the script for each block, then the scripts for each pair of blocks
+def generate_slitscan_scripts(scan_blocks, PA, targetshortname, off_dra, off_ddec, scan_rotation='Default PA'):
+    scripts = list(iterate_slitscan_scripts(scan_blocks, PA, targetshortname, off_dra, off_ddec, scan_rotation))
+    block_scripts = [script for i, script in enumerate(scripts[1:]) if i % 3 != 2] #Every third script after the OFF is a pair
+    pair_scripts = scripts[3::3]
+    return scripts[:1] + block_scripts + pair_scripts
+
+
+#Return the text of a script from its lines
+def script_text(lines):
+    return ''.join(f"{line}\n" for line in lines)
+
+
+#Write (label, lines) scripts from generate_slitscan_scripts or iterate_slitscan_scripts, returns list of file paths written
+#By default each script is written to its own file in parent_dir, n_threads files at a time (more threads help on network or slow disks)
+#If archive is given (a file name ending in .zip, .tar, .tar.gz, or .tgz), all the scripts are written into that single archive
+#in parent_dir instead, along with a manifest.json listing each script's file, label, number of lines, and size in bytes
+def write_slitscan_scripts(scripts, parent_dir, archive=None, n_threads=1):
+    if archive is not None:
+        return [write_slitscan_script_archive(scripts, os.path.join(parent_dir, archive))]
+    def write_script(label, lines):
+        path = parent_dir+'/'+label+'.script'
+        with open(path, 'w') as f:
+            f.write(script_text(lines))
+        return path
+    if n_threads <= 1:
+        return [write_script(label, lines) for label, lines in scripts]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor: #File writes release the GIL so slow disks are used in parallel
+        futures = [executor.submit(write_script, label, lines) for label, lines in scripts]
+        return [future.result() for future in futures]
+
+
+#Write (label, lines) scripts into a single zip or tar archive with a manifest.json, returns the path of the archive
+def write_slitscan_script_archive(scripts, path):
+    manifest = []
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf: #Scripts are very repetitive so compress well
+            for label, lines in scripts:
+                text = script_text(lines).encode()
+                zf.writestr(label+'.script', text)
+                manifest.append({'file': label+'.script', 'label': label, 'lines': text.count(b'\n'), 'bytes': len(text)})
+            zf.writestr('manifest.json', json.dumps(manifest, indent=4))
+        return path
+    mode = 'w:gz' if path.endswith('.tar.gz') or path.endswith('.tgz') else 'w'
+    with tarfile.open(path, mode) as tf:
+        def add(name, data):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            tf.addfile(info, io.BytesIO(data))
+        for label, lines in scripts:
+            text = script_text(lines).encode()
+            add(label+'.script', text)
+            manifest.append({'file': label+'.script', 'label': label, 'lines': text.count(b'\n'), 'bytes': len(text)})
+        add('manifest.json', json.dumps(manifest, indent=4).encode())
+    return path
+
+
+#Calculate where to center the finder chart and where the guide star is, accounting for proper motion and slitscan positions
+#Returns a coords object for the center of the finder chart, delta_PA, and the guide star dra, ddec, sl, and sw to plot
+def calculate_finder_chart_center(target_ra, target_dec, PA, guidestar_dra=0.0, guidestar_ddec=0.0, guidestar_sl=0.0, guidestar_sw=0.0,
+        use_proper_motion=False, proper_motion=(0.0, 0.0), epoch=2000.0,
+        use_slitscan=False, scan_blocks=None, scan_finder_row=0, scan_finder_col=0, scan_finder_pos=0, scan_rotation='Default PA'):
+    delta_PA = 90.0 - float(PA)  #Default instrument East-west setting is 90 degrees in PA
+    ra = sex2deg(target_ra, units='hms') #Convert to decimal degrees so we can easily add and subtract
+    dec = sex2deg(target_dec, units='dms')
+    if use_proper_motion: #Use target proper motion to set slit center
+        proper_motion_ra_distance_arcsec = float(proper_motion[0]) * 1e-3 * (float(epoch)-2000.0)
+        proper_motion_dec_distance_arcsec = float(proper_motion[1]) * 1e-3 * (float(epoch)-2000.0)
+        ra += proper_motion_ra_distance_arcsec / cos(radians(dec)) / 3600.0
+        dec += proper_motion_dec_distance_arcsec / 3600.
+    if use_slitscan: #Adjust coordinates if using slitscan
+        guidestar_sl, guidestar_sw = get_scan_sl_sw(scan_blocks, int(scan_finder_row), int(scan_finder_col), int(scan_finder_pos))
+        guidestar_slitscan_dra, guidestar_slitscan_ddec = ds9_lib.convert_from_sl_sw_to_dra_ddec(guidestar_sl, guidestar_sw, float(PA))
+        if not scan_rotation=='+90 deg PA':
+            ra += (guidestar_dra-guidestar_slitscan_dra) / cos(radians(dec)) / 3600.0
+            dec += (guidestar_ddec-guidestar_slitscan_ddec) / 3600.
+            guidestar_dra =  guidestar_slitscan_dra
+            guidestar_ddec = guidestar_slitscan_ddec
+        else:
+            ra += (guidestar_dra+guidestar_slitscan_dra) / cos(radians(dec)) / 3600.0
+            dec += (guidestar_ddec+guidestar_slitscan_ddec) / 3600.
+            guidestar_dra =  -guidestar_slitscan_dra
+            guidestar_ddec = -guidestar_slitscan_ddec
+    return coords(ra, dec), delta_PA, guidestar_dra, guidestar_ddec, guidestar_sl, guidestar_sw
+
+
+#Calculate the finder chart center and write the DS9 region file for a target and guide star stored as dictionaries
+#Returns the same values as calculate_finder_chart_center along with the scan blocks used
+def prepare_finder_chart(target_dictionary, guidestar_dictionary, region_filename='IGRINS_svc_generated.reg'):
+    target = fill_target_dictionary(target_dictionary)
+    guidestar = fill_target_dictionary(guidestar_dictionary)
+    scan_blocks = generate_slitscan_blocks_from_dictionary(target, guidestar['dG'][0], guidestar['dG'][1])
+    obj_coords, delta_PA, guidestar_dra, guidestar_ddec, guidestar_sl, guidestar_sw = calculate_finder_chart_center(
+        target['ra'], target['dec'], target['PA'],
+        guidestar_dra=float(guidestar['dra']), guidestar_ddec=float(guidestar['ddec']),
+        guidestar_sl=float(guidestar['dG'][0]), guidestar_sw=float(guidestar['dG'][1]),
+        use_proper_motion=target['use_proper_motion'], proper_motion=target['proper_motion'], epoch=target['epoch'],
+        use_slitscan=target['use_slitscan'], scan_blocks=scan_blocks,
+        scan_finder_row=target['scan_finder_row'], scan_finder_col=target['scan_finder_col'], scan_finder_pos=target['scan_finder_pos'],
+        scan_rotation=target['scan_rotation'])
+    ds9_lib.create_region(obj_coords, delta_PA, ds9_lib.plate_scale, guidestar_dra=guidestar_dra, guidestar_ddec=guidestar_ddec,
+        guidestar_sl=guidestar_sl, guidestar_sw=guidestar_sw, mirror_field=ds9_lib.mirror_field,
+        show_scan=target['use_slitscan'], scan_blocks=scan_blocks, scan_plus_90_deg=target['scan_rotation']=='+90 deg PA',
+        filename=region_filename, max_deviation=ds9_lib.svc_outline_tolerance_for_fov(target['fov']))
+    return obj_coords, delta_PA, guidestar_dra, guidestar_ddec, guidestar_sl, guidestar_sw, scan_blocks
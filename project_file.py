@@ -0,0 +1,293 @@
+#Project files: many targets, each with its guide stars and slitscan settings, in one file that is quick to open and to save
+#
+#A project file is JSON lines:
+#   {"format": "igrins_observing_planner_project", "version": 1, "generation": 3}     header
+#   {"id": "0", "record": {"target": {...}, "guidestar": [{...}, ...]}}                one line per target, the record is the same
+#   {"id": "1", "record": {...}}                                                         as a JSON save file from the GUI
+#   {"index": [["0", offset, length, name], ...], "current": "0"}                       footer
+#The footer says where each target's line is, so opening a project only reads the header and footer, and a target's line is
+#only read and parsed when it is asked for (Project.get).
+#Changes are not written into the project file.  put() and delete() append one line for each target that changed to a journal
+#next to it (project file name + ".journal"), so saving costs time for what changed and not for the whole project, and a crash
+#loses at most the line being written.  Opening a project replays its journal.  Once the journal grows past compact_ratio of the
+#project file (and at least compact_min_bytes), compact() writes a new project file with the changes in (copying the lines of
+#targets that did not change without parsing them), swaps it in, and starts a new journal.  The journal starts with the
+#generation of the project file it applies to, so a journal left over from a compaction that was interrupted is ignored.
+
+import os
+import json
+
+
+format_name = 'igrins_observing_planner_project'
+format_version = 1 #Version written, files with a newer version are not read
+compact_ratio = 0.5 #Compact once the journal is this big compared to the project file...
+compact_min_bytes = 1 << 20 #...and at least this many bytes
+sync_journal = False #fsync the journal after every change (safer on power loss, slower on some disks)
+project_extension = '.igrins'
+
+
+#Canonical JSON text of a record, used to write it and to tell if it changed
+def record_text(record):
+    return json.dumps(record, sort_keys=True, separators=(',', ':'))
+
+
+#Target name of a record for listing targets without loading them
+def record_name(record):
+    target = record.get('target', record)
+    return str(target.get('name', '')) if isinstance(target, dict) else ''
+
+
+#Check if a file is a project file (and not e.g. a JSON save file)
+def is_project_file(filename):
+    try:
+        with open(filename, 'rb') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return False
+    return isinstance(header, dict) and header.get('format') == format_name
+
+
+#Read the last line of a file opened in binary mode
+def read_last_line(f):
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    position = end
+    data = b''
+    while position > 0:
+        step = min(65536, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+        newline = data.rfind(b'\n', 0, len(data) - 1) #Ignore the newline at the very end
+        if newline >= 0:
+            return data[newline + 1:]
+    return data
+
+
+class Project:
+    def __init__(self, filename, read_only=False):
+        self.filename = filename
+        self.journal_filename = filename + '.journal'
+        self.read_only = read_only #Only read the project, without touching its files
+        self.journal = None
+        if not os.path.exists(filename) and not read_only: #New project
+            write_project(filename, [])
+        self.read_snapshot()
+        self.read_journal()
+        self.n_journaled = 0 #Number of changes written to the journal since opening
+        self.n_compactions = 0
+
+    def read_snapshot(self):
+        with open(self.filename, 'rb') as f:
+            header = json.loads(f.readline())
+            if not isinstance(header, dict) or header.get('format') != format_name:
+                raise ValueError(self.filename+' is not an IGRINS Observing Planner project file')
+            if int(header.get('version', 0)) > format_version:
+                raise ValueError(self.filename+' was written by a newer version of the observing planner (project format version '+str(header['version'])+')')
+            footer = json.loads(read_last_line(f))
+        self.generation = int(header['generation'])
+        self.order = [] #Target ids in order
+        self.names = {} #id: target name
+        self.locations = {} #id: (offset, length) of the target's line in the project file
+        for id, offset, length, name in footer['index']:
+            self.order.append(id)
+            self.names[id] = name
+            self.locations[id] = (offset, length)
+        self.current = footer.get('current')
+        self.changed = {} #id: record text for targets changed since the project file was written, None if deleted
+        self.fingerprints = {} #id: hash of the record text last read or written, so put() can skip targets that did not change
+        self.snapshot_bytes = os.path.getsize(self.filename)
+
+    #Replay the journal, dropping a line cut off by a crash and a journal that belongs to an older project file
+    def read_journal(self):
+        entries = []
+        good_bytes = 0
+        stale = True
+        if os.path.exists(self.journal_filename):
+            with open(self.journal_filename, 'rb') as f:
+                lines = f.read().split(b'\n')
+            for i, line in enumerate(lines):
+                if i == len(lines) - 1: #Anything after the last newline was cut off
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if i == 0:
+                    stale = entry.get('generation') != self.generation
+                    if stale:
+                        break
+                else:
+                    entries.append(entry)
+                good_bytes += len(line) + 1
+        if self.read_only:
+            self.journal_bytes = good_bytes
+        elif stale: #Start a new journal for this project file
+            self.journal = open(self.journal_filename, 'wb')
+            self.journal.write((json.dumps({'generation': self.generation}) + '\n').encode())
+            self.journal.flush()
+            self.journal_bytes = self.journal.tell()
+        else:
+            self.journal = open(self.journal_filename, 'r+b')
+            self.journal.truncate(good_bytes)
+            self.journal.seek(good_bytes)
+            self.journal_bytes = good_bytes
+        for entry in entries:
+            self.apply(entry)
+
+    def apply(self, entry):
+        if 'put' in entry:
+            id = entry['put']
+            if id not in self.names:
+                self.order.append(id)
+            text = record_text(entry['record'])
+            self.changed[id] = text
+            self.names[id] = record_name(entry['record'])
+            self.fingerprints[id] = hash(text)
+        elif 'delete' in entry:
+            id = entry['delete']
+            if id in self.names:
+                self.order.remove(id)
+                del self.names[id]
+                self.changed[id] = None
+                self.fingerprints.pop(id, None)
+        if 'current' in entry:
+            self.current = entry['current']
+
+    def write_journal(self, entry):
+        if self.read_only:
+            raise IOError(self.filename+' was opened read only')
+        self.apply(entry)
+        self.journal.write((json.dumps(entry, sort_keys=True, separators=(',', ':')) + '\n').encode())
+        self.journal.flush()
+        if sync_journal:
+            os.fsync(self.journal.fileno())
+        self.journal_bytes = self.journal.tell()
+        self.n_journaled += 1
+        if self.journal_bytes > max(compact_min_bytes, compact_ratio * self.snapshot_bytes):
+            self.compact()
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, id):
+        return id in self.names
+
+    #Target ids in order
+    def ids(self):
+        return list(self.order)
+
+    #List of (id, target name) in order, without loading any targets
+    def targets(self):
+        return [(id, self.names[id]) for id in self.order]
+
+    #Return the record of target id (a new dictionary each time)
+    def get(self, id):
+        if id not in self.names:
+            raise KeyError(id)
+        text = self.changed.get(id)
+        if text is None:
+            offset, length = self.locations[id]
+            with open(self.filename, 'rb') as f:
+                f.seek(offset)
+                text = record_text(json.loads(f.read(length))['record'])
+        self.fingerprints[id] = hash(text)
+        return json.loads(text)
+
+    #Save the record of target id, only written if it is different from what was last read or saved, returns if it was written
+    def put(self, id, record):
+        id = str(id)
+        text = record_text(record)
+        if id in self.names and self.fingerprints.get(id) == hash(text):
+            return False
+        self.write_journal({'put': id, 'record': record})
+        return True
+
+    #Add a new target, returns its id
+    def add(self, record):
+        numbers = [int(id) for id in self.names if id.isdigit()]
+        id = str(max(numbers) + 1 if len(numbers) > 0 else 0)
+        self.put(id, record)
+        return id
+
+    def delete(self, id):
+        if id in self.names:
+            self.write_journal({'delete': id, 'current': None if self.current == id else self.current})
+
+    #Remember which target is being worked on, so it is the one opened next time
+    def set_current(self, id):
+        if id != self.current:
+            self.write_journal({'current': id})
+
+    #Write a new project file with everything in the journal in it, and start a new journal
+    def compact(self):
+        temporary_filename = self.filename + '.tmp'
+        lines = []
+        with open(self.filename, 'rb') as f:
+            for id in self.order:
+                if self.changed.get(id) is not None:
+                    lines.append((id, None, self.changed[id]))
+                else:
+                    offset, length = self.locations[id]
+                    f.seek(offset)
+                    lines.append((id, f.read(length), None))
+        self.locations = self.write_snapshot(temporary_filename, self.generation + 1, lines, self.names, self.current)
+        os.replace(temporary_filename, self.filename)
+        self.generation += 1
+        self.changed = {}
+        self.snapshot_bytes = os.path.getsize(self.filename)
+        self.journal.close()
+        self.journal = open(self.journal_filename, 'wb')
+        self.journal.write((json.dumps({'generation': self.generation}) + '\n').encode())
+        self.journal.flush()
+        self.journal_bytes = self.journal.tell()
+        self.n_compactions += 1
+
+    #Write a project file from a list of (id, line, record text), where line is the target's line copied from the old project
+    #file (or None to write it from the record text), returns the id: (offset, length) of each line
+    @staticmethod
+    def write_snapshot(filename, generation, lines, names, current):
+        locations = {}
+        index = []
+        with open(filename, 'wb') as f:
+            f.write((json.dumps({'format': format_name, 'version': format_version, 'generation': generation}) + '\n').encode())
+            for id, line, text in lines:
+                if line is None:
+                    line = ('{"id":' + json.dumps(id) + ',"record":' + text + '}').encode()
+                offset = f.tell()
+                f.write(line + b'\n')
+                locations[id] = (offset, len(line))
+                index.append([id, offset, len(line), names[id]])
+            f.write((json.dumps({'index': index, 'current': current}) + '\n').encode())
+            f.flush()
+            os.fsync(f.fileno())
+        return locations
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+#Read every record in a project file, in order (e.g. to plan all its targets with planner_cli.py)
+def read_project_records(filename):
+    project = Project(filename, read_only=True)
+    try:
+        return [project.get(id) for id in project.ids()]
+    finally:
+        project.close()
+
+
+#Make a new project file from a list of records (e.g. JSON save files), replacing the file if it is already there
+def write_project(filename, records, current=None):
+    lines = [(str(i), None, record_text(record)) for i, record in enumerate(records)]
+    names = {str(i): record_name(record) for i, record in enumerate(records)}
+    Project.write_snapshot(filename, 0, lines, names, current)
+    if os.path.exists(filename + '.journal'):
+        os.remove(filename + '.journal')
@@ -0,0 +1,90 @@
+#Small dependency graph for values derived from the planner state, so each one is only recomputed when its inputs change
+#
+#Sources are read with a function (e.g. the get of a tkinter StringVar).  Derived values are computed by a function of
+#sources and other derived values, and are remembered along with the input values they were computed from, so get()
+#only recomputes a derived value if one of its inputs is different from last time.
+#changed() can be called on every keystroke (e.g. as a tkinter trace_add callback).  It (re)starts a timer so a burst of
+#changes causes a single update() once things go quiet, which gets every watched derived value and calls its watchers
+#if the value changed.
+
+
+#Check if two values are the same, falling back on identity for things like numpy arrays that don't compare to a single bool
+def same(a, b):
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except (ValueError, TypeError):
+        return False
+
+
+#Check if two tuples of input values are the same
+def same_inputs(a, b):
+    return a is not None and len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+
+
+class Graph:
+    def __init__(self, delay=250, schedule=None, cancel=None):
+        self.delay = delay #Debounce delay in ms
+        self.schedule = schedule #schedule(delay, function) runs function after delay ms and returns a handle, e.g. tkinter's window.after
+        self.cancel = cancel #cancel(handle) cancels a scheduled function, e.g. tkinter's window.after_cancel
+        self.sources = {} #name: function that returns the value
+        self.nodes = {} #name: (list of input names, function of the input values)
+        self.values = {} #name: (input values, value) from the last time a derived value was computed
+        self.watchers = {} #name: list of functions called with the new value when it changes
+        self.notified = {} #name: value the watchers were last called with
+        self.timer = None
+        self.n_computed = 0 #Number of times a derived value was computed
+        self.n_reused = 0 #Number of times a derived value was reused because its inputs did not change
+
+    def source(self, name, getter):
+        self.sources[name] = getter
+
+    def derived(self, name, inputs, function):
+        self.nodes[name] = (list(inputs), function)
+        self.values.pop(name, None)
+
+    #Call function with the new value whenever update() finds the derived value changed
+    def watch(self, name, function):
+        self.watchers.setdefault(name, []).append(function)
+
+    #Return the current value of a source or derived value, recomputing derived values only if their inputs changed
+    def get(self, name):
+        if name in self.sources:
+            return self.sources[name]()
+        inputs, function = self.nodes[name]
+        input_values = tuple(self.get(input) for input in inputs)
+        if name in self.values and same_inputs(self.values[name][0], input_values):
+            self.n_reused += 1
+            return self.values[name][1]
+        value = function(*input_values)
+        self.values[name] = (input_values, value)
+        self.n_computed += 1
+        return value
+
+    #Something changed, update the watched values once changes stop for delay ms (or right away if there is no scheduler)
+    #Takes and ignores any arguments so it can be used directly as a tkinter trace_add callback
+    def changed(self, *args):
+        if self.schedule is None:
+            self.update()
+            return
+        if self.timer is not None:
+            self.cancel(self.timer)
+        self.timer = self.schedule(self.delay, self.update)
+
+    #Get every watched value and call its watchers if it changed
+    def update(self):
+        self.timer = None
+        for name, watchers in self.watchers.items():
+            try:
+                value = self.get(name)
+            except ValueError: #Inputs not valid yet (e.g. half typed number), leave things as they are until they are
+                continue
+            if name in self.notified and same(self.notified[name], value):
+                continue
+            self.notified[name] = value
+            for watcher in watchers:
+                watcher(value)
+
+    def stats(self):
+        return {'computed': self.n_computed, 'reused': self.n_reused}
@@ -0,0 +1,127 @@
+#Night scheduler: orders targets and their slitscan block pairs across a night by airmass, slew, and rotator changes
+#
+#Each target is split into tasks: one per pair of slitscan blocks (the same pairs iterate_slitscan_scripts writes pair
+#scripts for, so a task's label is the name of the script to run) or a single task if it is not a slitscan.  Tasks of a
+#target are done in order.  Starting at the beginning of the night (or a given time, for re-planning during the night),
+#the scheduler greedily picks the next task with the lowest cost out of the next task of every target:
+#  - airmass: how much worse the mean airmass over the task is than the best airmass the target still gets tonight
+#  - overhead: time to slew the telescope and turn the rotator, which happen together, plus time to acquire a new target
+#    (the rotator can't wrap around, settings go from rotator_zero_point - 180 to + 180, so it turns the long way round)
+#  - urgency: a bonus for targets that need most of the observable time they have left
+#Observability comes from observability.py for every target and time step at once, so each pick is a few array operations
+#over the targets and re-planning a few hundred targets takes a small fraction of a second.
+
+import numpy as np
+import observability
+import planner_lib
+
+
+slew_rate = 1.0 #Telescope slew rate in deg/s (per axis)
+rotator_rate = 2.0 #Instrument rotator rate in deg/s
+acquisition_seconds = 180.0 #Time to acquire and set up on a new target after a slew
+default_target_minutes = 30.0 #Time for a target that is not a slitscan, if the target has no "duration" (minutes)
+default_pair_minutes = 20.0 #Time for each pair of slitscan blocks, if the target has no "pair_duration" (minutes)
+airmass_weight = 20.0 #Minutes of overhead worth 1.0 of extra airmass
+urgency_weight = 10.0 #Minutes of overhead worth observing a target that needs all the observable time it has left
+
+
+#Split a target dictionary into tasks, returns a list of (label, block indices, minutes)
+def target_tasks(target):
+    if not target['use_slitscan']:
+        return [(target['name'] or target['scan_script_targetshortname'], (), float(target.get('duration', default_target_minutes)))]
+    minutes = float(target.get('pair_duration', default_pair_minutes))
+    blocks = planner_lib.generate_slitscan_blocks_from_dictionary(target).blocks
+    labels = [target['scan_script_targetshortname']+'_'+str(row)+'-'+str(col)+'-'+str(pos[0])
+        for row, col, pos in zip(blocks['row'].tolist(), blocks['col'].tolist(), blocks['pos'].tolist())]
+    tasks = []
+    for i in range(0, len(labels), 2):
+        if i + 1 < len(labels): #Pair of blocks, labelled like its pair script
+            tasks.append((labels[i]+labels[i + 1][len(target['scan_script_targetshortname']):], (i, i + 1), minutes))
+        else: #Odd block out at the end
+            tasks.append((labels[i], (i,), minutes / 2.0))
+    return tasks
+
+
+#Seconds to get from one pointing and rotator setting to another, the telescope and rotator move at the same time
+def overhead_seconds(ra, dec, rotator_setting, to_ra, to_dec, to_rotator_setting):
+    slew = np.maximum(np.abs((np.asarray(to_ra) - ra + 180.0) % 360.0 - 180.0), np.abs(np.asarray(to_dec) - dec)) / slew_rate
+    rotate = np.abs(np.asarray(to_rotator_setting) - rotator_setting) / rotator_rate
+    return np.maximum(slew, rotate)
+
+
+#Schedule target dictionaries (filled like planner_lib.fill_target_dictionary) over the night starting on date
+#start_time (datetime64, UTC) re-plans from that time on, and completed maps target index to how many of its tasks are done
+#Returns a list of scheduled tasks (dictionaries, in time order) and a list of (target index, label) of tasks left out
+def schedule(targets, date, max_airmass=2.0, max_hour_angle=None, step_minutes=5.0, twilight=-12.0, start_time=None, completed=None,
+        latitude=None, longitude=None):
+    targets = [planner_lib.fill_target_dictionary(target) for target in targets]
+    times, dark = observability.night_times(date, step_minutes=step_minutes, twilight=twilight, latitude=latitude, longitude=longitude)
+    ra, dec = observability.target_ra_dec(targets)
+    rotator_settings = np.array([planner_lib.calculate_rotator_setting(target['PA']) for target in targets])
+    tasks = [target_tasks(target) for target in targets]
+    n_targets, n_times = len(targets), len(times)
+    result = observability.observability(ra, dec, times, latitude=latitude, longitude=longitude)
+    up = observability.observable(result, max_airmass=max_airmass, max_hour_angle=max_hour_angle, dark=dark)
+    airmass = np.where(up, result['airmass'], 0.0)
+    #Running sums along the night so the number of observable steps and mean airmass over any window is a subtraction
+    up_sum = np.concatenate([np.zeros((n_targets, 1)), np.cumsum(up, axis=1)], axis=1)
+    airmass_sum = np.concatenate([np.zeros((n_targets, 1)), np.cumsum(airmass, axis=1)], axis=1)
+    best_airmass = np.minimum.accumulate(np.where(up, result['airmass'], np.inf)[:, ::-1], axis=1)[:, ::-1] #Best airmass from each step on
+    best_airmass = np.concatenate([best_airmass, np.full((n_targets, 1), np.inf)], axis=1)
+    next_task = np.zeros(n_targets, dtype=int)
+    if completed is not None:
+        for i, n_done in completed.items():
+            next_task[int(i)] = int(n_done)
+    n_tasks = np.array([len(target_task_list) for target_task_list in tasks])
+    step_seconds = step_minutes * 60.0
+    task_steps_table = np.zeros((n_targets, n_tasks.max(initial=0) + 1), dtype=int) #Time steps each task takes, by target and task
+    for i in range(n_targets):
+        task_steps_table[i, :n_tasks[i]] = [int(np.ceil(task[2] * 60.0 / step_seconds)) for task in tasks[i]]
+    steps_needed_table = np.cumsum(task_steps_table[:, ::-1], axis=1)[:, ::-1] #Time steps for a task and all the ones after it
+    step = 0 if start_time is None else int(np.searchsorted(times, np.datetime64(start_time, 's')))
+    while step < n_times and not dark[step]: #Start when it gets dark
+        step += 1
+    current = None #Index of the target the telescope is on
+    current_ra, current_dec, current_rotator = 0.0, 0.0, 0.0
+    scheduled = []
+    while step < n_times and np.any(next_task < n_tasks):
+        waiting = np.flatnonzero(next_task < n_tasks)
+        task_steps = task_steps_table[waiting, next_task[waiting]]
+        if current is None: #Nothing to slew from at the start of the night, only count acquiring the target
+            overhead = np.full(len(waiting), acquisition_seconds)
+        else:
+            overhead = overhead_seconds(current_ra, current_dec, current_rotator, ra[waiting], dec[waiting], rotator_settings[waiting])
+            overhead = np.where(waiting == current, 0.0, overhead + acquisition_seconds) #Next pair on the same target needs no slew
+        start = step + np.ceil(overhead / step_seconds).astype(int)
+        end = start + task_steps
+        feasible = end <= n_times
+        start_c, end_c = np.minimum(start, n_times), np.minimum(end, n_times)
+        feasible &= (up_sum[waiting, end_c] - up_sum[waiting, start_c]) == task_steps #Observable the whole time
+        if not np.any(feasible): #Nothing can be observed now, wait a step
+            step += 1
+            continue
+        mean_airmass = (airmass_sum[waiting, end_c] - airmass_sum[waiting, start_c]) / np.maximum(task_steps, 1)
+        steps_left = up_sum[waiting, -1] - up_sum[waiting, start_c] #Observable steps the target has left tonight
+        steps_needed = steps_needed_table[waiting, next_task[waiting]]
+        cost = airmass_weight * (mean_airmass - best_airmass[waiting, start_c]) + overhead / 60.0 \
+            - urgency_weight * np.minimum(steps_needed / np.maximum(steps_left, 1), 1.0)
+        cost = np.where(feasible, cost, np.inf)
+        k = int(np.argmin(cost))
+        i = int(waiting[k])
+        label, blocks, minutes = tasks[i][next_task[i]]
+        scheduled.append({
+            'target': i,
+            'name': targets[i]['name'],
+            'task': label,
+            'blocks': list(blocks),
+            'start': str(times[start[k]]),
+            'end': str(times[end[k]]) if end[k] < n_times else str(times[-1] + np.timedelta64(int(step_seconds), 's')),
+            'airmass': float(mean_airmass[k]),
+            'overhead_seconds': float(overhead[k]),
+            'rotator_setting': float(rotator_settings[i]),
+        })
+        next_task[i] += 1
+        current, current_ra, current_dec, current_rotator = i, ra[i], dec[i], rotator_settings[i]
+        step = int(end[k])
+    unscheduled = [(i, tasks[i][j][0]) for i in range(n_targets) for j in range(next_task[i], n_tasks[i])]
+    return scheduled, unscheduled
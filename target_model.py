@@ -0,0 +1,141 @@
+#Plain data model of a target (or a guide star) for holding many of them at once, e.g. for batch planning
+#
+#TargetData keeps the same values as planner_lib.default_target_dictionary (and the JSON save files), but as typed fields in
+#__slots__: numbers are floats and ints parsed once when the target is read instead of strings parsed on every use, and there
+#are no tkinter variables, so thousands of targets fit in one process.  The GUI only has tkinter variables for the target and
+#guide star it is showing, and copies them to and from TargetData (Target.load and Target.store).
+#TargetData can be used like a read only dictionary (data['PA'], data.get('duration', 30.0), dict(data)), so it can be given
+#to anything that takes a target dictionary.  Keys that are not target fields (e.g. "duration" or "catalog" from the CLI) are
+#kept in extra, so reading and writing a dictionary keeps them.
+
+import warnings
+import collections.abc
+
+
+#Field name, type, and default, in the order of planner_lib.default_target_dictionary
+#"pair" fields are a tuple of two floats, e.g. (sl, sw)
+fields = (
+    ('ra', str, ''),
+    ('dec', str, ''),
+    ('dra', float, 0.0),
+    ('ddec', float, 0.0),
+    ('proper_motion', 'pair', (0.0, 0.0)),
+    ('use_proper_motion', bool, False),
+    ('PA', float, 90.0),
+    ('dA', 'pair', (-3.33, 0.0)),
+    ('dB', 'pair', (3.33, 0.0)),
+    ('dG', 'pair', (0.0, 0.0)),
+    ('name', str, ''),
+    ('rotator_setting', float, 0.0),
+    ('fov', float, 6.0),
+    ('survey', str, '2MASS K-band'),
+    ('epoch', float, 2025.0),
+    ('use_slitscan', bool, False),
+    ('scan_rotation', str, 'Default PA'),
+    ('scan_Nstep', int, 15),
+    ('scan_dstep', float, 1.0),
+    ('scan_perNod', int, 3),
+    ('scan_Nrow', int, 1),
+    ('scan_Ncol', int, 1),
+    ('scan_drow', float, 15.0),
+    ('scan_dcol', float, 15.0),
+    ('scan_finder_row', int, 0),
+    ('scan_finder_col', int, 0),
+    ('scan_finder_pos', int, 0),
+    ('scan_script_targetshortname', str, ''),
+    ('scan_script_off', 'pair', (0.0, 0.0)),
+)
+field_names = tuple(name for name, kind, default in fields)
+field_types = {name: kind for name, kind, default in fields}
+field_defaults = {name: default for name, kind, default in fields}
+
+
+#Convert a value (e.g. a string from a save file or a tkinter entry) to a field's type, raises ValueError if it can't be
+def convert(kind, value):
+    if kind == 'pair':
+        if isinstance(value, str):
+            value = value.split()
+        first, second = value
+        return (float(first), float(second))
+    if kind is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ('true', 'yes', '1')
+        return bool(value)
+    if kind is int:
+        return int(float(value)) #Allow "15.0"
+    if kind is float:
+        return float(value)
+    return str(value)
+
+
+#Write a field's value the way the JSON save files have it (numbers as strings)
+def format_value(kind, value):
+    if kind == 'pair':
+        return (repr(value[0]), repr(value[1]))
+    if kind is float:
+        return repr(value)
+    if kind is int:
+        return str(value)
+    return value
+
+
+class TargetData(collections.abc.Mapping):
+    __slots__ = field_names + ('extra',)
+
+    def __init__(self, **values):
+        for name, kind, default in fields:
+            object.__setattr__(self, name, default)
+        self.extra = {}
+        self.update(values)
+
+    #Make a TargetData from a target dictionary (e.g. from a JSON save file or the CLI), missing keys get the defaults
+    #Values that can't be read are left at the default with a warning, like the GUI does when loading a save file
+    @classmethod
+    def from_dictionary(cls, dictionary):
+        data = cls()
+        data.update(dictionary)
+        return data
+
+    #Set fields from a dictionary, converting each value to the field's type
+    def update(self, values):
+        for name, value in values.items():
+            if name not in field_types:
+                self.extra[name] = value
+                continue
+            try:
+                object.__setattr__(self, name, convert(field_types[name], value))
+            except (ValueError, TypeError):
+                warnings.warn('Warning: Having trouble reading in "'+name+'" ('+repr(value)+'), using '+repr(getattr(self, name)))
+
+    #Set a field, converting the value to the field's type
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value if name == 'extra' else convert(field_types[name], value))
+
+    #Dictionary like the JSON save files have, with the extra keys
+    def to_dictionary(self):
+        dictionary = {name: format_value(kind, getattr(self, name)) for name, kind, default in fields}
+        dictionary.update(self.extra)
+        return dictionary
+
+    def copy(self):
+        data = TargetData()
+        for name in field_names:
+            object.__setattr__(data, name, getattr(self, name))
+        data.extra = dict(self.extra)
+        return data
+
+    #Read only dictionary access to the typed values
+    def __getitem__(self, key):
+        if key in field_types:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __iter__(self):
+        yield from field_names
+        yield from self.extra
+
+    def __len__(self):
+        return len(field_names) + len(self.extra)
+
+    def __repr__(self):
+        return 'TargetData(' + ', '.join(name+'='+repr(getattr(self, name)) for name in field_names if getattr(self, name) != field_defaults[name]) + ')'
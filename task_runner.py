@@ -0,0 +1,164 @@
+#Run slow work (DS9 commands, SkyView image fetches, catalog searches, SIMBAD lookups) on worker threads so the GUI stays live
+#
+#submit(key, function, ...) calls function(task) on the worker thread for its lane and returns the Task.  Work in the same lane
+#runs one at a time in the order it was submitted (e.g. everything that talks to DS9 goes in the "ds9" lane so commands from
+#two tasks never get mixed together), different lanes run at the same time.
+#Results come back on the GUI thread: while anything is running, poll() is scheduled every poll_interval ms with schedule
+#(e.g. tkinter's window.after) and calls on_done(result) or on_error(exception) for every task that finished, so those can set
+#tkinter variables, which function itself must not touch.  track() does the same for a Future made somewhere else (e.g.
+#NameResolver.resolve_async).
+#Submitting a key that is already waiting or running does not start it again, the task already going is returned, so clicking
+#a button twice does the work once.  cancel() stops a task that has not started yet and drops the result of one that has (a
+#DS9 command or a download can't be stopped halfway, but nothing is done with what it returns), function can check
+#task.cancelled() to stop early.  on_status is called with a line like "Finder chart: running 3 s" whenever it changes.
+
+import time
+import threading
+import traceback
+import concurrent.futures
+
+
+class Task:
+    def __init__(self, key, label, on_done=None, on_error=None):
+        self.key = key
+        self.label = label
+        self.on_done = on_done
+        self.on_error = on_error
+        self.future = None
+        self.message = 'waiting' #What the task is doing, shown in the status line
+        self.start_time = None #time.time() when it started running
+        self.cancel_event = threading.Event()
+
+    #Say what the task is doing (can be called from the worker thread)
+    def report(self, message):
+        self.message = str(message)
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    #Status of the task for the status line
+    def status(self):
+        if self.start_time is None:
+            return self.label + ': ' + self.message
+        return self.label + ': ' + self.message + ' ' + str(int(time.time() - self.start_time)) + ' s'
+
+
+class TaskRunner:
+    def __init__(self, schedule, poll_interval=50, on_status=None):
+        self.schedule = schedule #schedule(delay, function) runs function after delay ms on the GUI thread, e.g. tkinter's window.after
+        self.poll_interval = poll_interval #ms between checks for finished tasks
+        self.on_status = on_status #Called with the status line when it changes
+        self.executors = {} #lane: single worker thread executor
+        self.tasks = {} #key: Task waiting, running, or finished but not handed back yet
+        self.polling = False
+        self.last_status = None
+        self.n_submitted = 0 #Number of tasks started
+        self.n_coalesced = 0 #Number of submits that were already waiting or running
+
+    #Return the task still going for key, or None
+    def running(self, key):
+        task = self.tasks.get(key)
+        if task is None or task.cancelled():
+            return None
+        return task
+
+    #Run function(task) on the worker thread for lane, unless a task with the same key is still going
+    def submit(self, key, function, lane='default', label=None, on_done=None, on_error=None):
+        task = self.running(key)
+        if task is not None:
+            self.n_coalesced += 1
+            return task
+        task = Task(key, str(key) if label is None else label, on_done, on_error)
+        if lane not in self.executors:
+            self.executors[lane] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-'+str(lane))
+        def run():
+            if task.cancelled():
+                raise concurrent.futures.CancelledError()
+            task.start_time = time.time()
+            task.report('running')
+            return function(task)
+        task.future = self.executors[lane].submit(run)
+        return self.add(task)
+
+    #Hand back the result of a Future made somewhere else (e.g. NameResolver.resolve_async) like a submitted task
+    def track(self, key, future, label=None, on_done=None, on_error=None):
+        task = self.running(key)
+        if task is not None:
+            self.n_coalesced += 1
+            return task
+        task = Task(key, str(key) if label is None else label, on_done, on_error)
+        task.future = future
+        task.start_time = time.time()
+        task.report('running')
+        return self.add(task)
+
+    def add(self, task):
+        self.n_submitted += 1
+        self.tasks[task.key] = task
+        self.update_status()
+        if not self.polling:
+            self.polling = True
+            self.schedule(self.poll_interval, self.poll)
+        return task
+
+    #Cancel the task for key, or every task if key is None
+    def cancel(self, key=None):
+        keys = list(self.tasks) if key is None else [key]
+        for key in keys:
+            task = self.tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+        self.update_status()
+
+    #Hand back every finished task's result, and check back later if any are still going (runs on the GUI thread)
+    def poll(self):
+        for key, task in list(self.tasks.items()):
+            if not task.future.done():
+                continue
+            del self.tasks[key]
+            try:
+                result = task.future.result()
+            except concurrent.futures.CancelledError:
+                continue
+            except Exception as e:
+                if task.on_error is not None:
+                    self.hand_back(task.on_error, e)
+                else:
+                    print('ERROR: '+task.label+' failed: '+type(e).__name__+': '+str(e))
+                continue
+            if task.on_done is not None:
+                self.hand_back(task.on_done, result)
+        self.update_status()
+        if len(self.tasks) > 0:
+            self.schedule(self.poll_interval, self.poll)
+        else:
+            self.polling = False
+
+    #Call on_done or on_error, printing anything that goes wrong so it doesn't stop the other tasks being handed back
+    def hand_back(self, function, value):
+        try:
+            function(value)
+        except Exception:
+            traceback.print_exc()
+
+    #Status line of everything that is going, '' if nothing
+    def status(self):
+        return ', '.join(task.status() for task in self.tasks.values())
+
+    def update_status(self):
+        status = self.status()
+        if status != self.last_status:
+            self.last_status = status
+            if self.on_status is not None:
+                self.on_status(status)
+
+    #Stop the worker threads, dropping anything that has not started yet
+    def shutdown(self):
+        self.cancel()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
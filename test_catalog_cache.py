@@ -0,0 +1,131 @@
+#Check the guide star catalog cache (catalog_cache.py) and how query_guide_star_catalog uses it
+#Run with: python -m pytest test_catalog_cache.py
+
+import os
+import random
+
+import pytest
+
+import catalog_cache
+import ds9
+import ds9_lib
+
+
+header = '\t'.join('c'+str(i) for i in range(10)) + '\n'
+
+
+#Catalog lines (header first) of n stars spread over a box, like a 2MASS catalog exported by DS9 with K mag. in column 9
+def catalog_lines(ra_min, ra_max, dec_min, dec_max, n=100, seed=1):
+    generator = random.Random(seed)
+    return [header] + ['%r\t%r' % (generator.uniform(ra_min, ra_max), generator.uniform(dec_min, dec_max)) + '\t'*8 + '%.2f\n' % generator.uniform(6.0, 14.0)
+        for i in range(n)]
+
+
+def stars_in(lines, ra_min, ra_max, dec_min, dec_max):
+    return sorted(line for line in lines[1:] if ra_min <= float(line.split('\t')[0]) <= ra_max and dec_min <= float(line.split('\t')[1]) <= dec_max)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return catalog_cache.CatalogCache(str(tmp_path / 'cache'))
+
+
+def test_hit_after_storing_the_covering_box(cache):
+    search_box = (83.72, 83.78, 21.97, 22.03)
+    assert cache.lookup('2MASS point source', 14.0, *search_box) is None
+    query_box = cache.covering_box(*search_box)
+    lines = catalog_lines(*query_box)
+    cache.store('2MASS point source', 14.0, lines, *query_box)
+    cached = cache.lookup('2MASS point source', 14.0, *search_box)
+    assert cached[0] == header
+    assert sorted(cached[1:]) == stars_in(lines, *search_box)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.lookup('Gaia DR2', 14.0, *search_box) is None #Other catalogs and mag. limits are kept apart
+    assert cache.lookup('2MASS point source', 15.0, *search_box) is None
+
+
+def test_partly_covered_tiles_are_not_stored(cache):
+    search_box = (83.72, 83.78, 21.97, 22.03)
+    cache.store('2MASS point source', 14.0, catalog_lines(*search_box), *search_box) #Doesn't cover all of the tiles at its edges
+    assert cache.lookup('2MASS point source', 14.0, *search_box) is None
+
+
+def test_failed_query_is_not_stored(cache):
+    query_box = cache.covering_box(83.72, 83.78, 21.97, 22.03)
+    for lines in ([], ['\n'], catalog_lines(*query_box)[1:]): #Nothing exported, or no header
+        with pytest.raises(ValueError):
+            cache.store('2MASS point source', 14.0, lines, *query_box)
+    assert cache.n_bytes == cache.size() == 0
+
+
+def test_empty_field_is_a_hit(cache):
+    search_box = (83.72, 83.78, 21.97, 22.03)
+    query_box = cache.covering_box(*search_box)
+    cache.store('2MASS point source', 14.0, [header], *query_box)
+    assert cache.lookup('2MASS point source', 14.0, *search_box) == [header]
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path):
+    cache = catalog_cache.CatalogCache(str(tmp_path / 'cache'), max_bytes=1e9)
+    boxes = [(ra, ra + 0.01, 21.97, 21.98) for ra in (10.0, 20.0, 30.0)]
+    for i, box in enumerate(boxes):
+        query_box = cache.covering_box(*box)
+        cache.store('2MASS point source', 14.0, catalog_lines(*query_box, n=50, seed=i), *query_box)
+        for band, j in cache.tiles_for_box(*box): #Make the tiles stored first look the least recently used
+            os.utime(cache.tile_filename('2MASS point source', 14.0, band, j), (1000.0 + i, 1000.0 + i))
+    assert cache.n_bytes == cache.size()
+    cache.lookup('2MASS point source', 14.0, *boxes[0]) #Now the most recently used
+    cache.max_bytes = cache.n_bytes - 1
+    cache.evict()
+    assert cache.n_bytes == cache.size() <= cache.max_bytes
+    assert cache.lookup('2MASS point source', 14.0, *boxes[0]) is not None
+    assert cache.lookup('2MASS point source', 14.0, *boxes[1]) is None
+    assert cache.lookup('2MASS point source', 14.0, *boxes[2]) is not None
+
+
+def test_store_evicts_when_over_max_bytes(tmp_path):
+    cache = catalog_cache.CatalogCache(str(tmp_path / 'cache'), max_bytes=3000)
+    for ra in (10.0, 20.0, 30.0, 40.0):
+        query_box = cache.covering_box(ra, ra + 0.01, 21.97, 21.98)
+        cache.store('2MASS point source', 14.0, catalog_lines(*query_box, n=50), *query_box)
+        assert cache.n_bytes == cache.size() <= 3000
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ds9, 'transport', None)
+    monkeypatch.setattr(ds9, 'verbose', False)
+    monkeypatch.setattr(ds9_lib, 'current_working_directory', str(tmp_path) + '/')
+    monkeypatch.setattr(ds9_lib, 'use_catalog_cache', True)
+    monkeypatch.setattr(ds9_lib, 'catalog_cache', None)
+    monkeypatch.setattr(ds9_lib, 'catalog_cache_directory', str(tmp_path / 'cache'))
+    monkeypatch.setattr(ds9_lib, 'guide_star_index_directories', {})
+    backend = ds9.use('fake')
+    yield backend
+    ds9.transport = None
+
+
+def test_search_uses_the_cache(fake):
+    search_box = ds9_lib.guide_star_search_box(83.75, 22.0)
+    query_box = ds9_lib.get_catalog_cache().covering_box(*search_box)
+    lines = catalog_lines(*query_box, n=300)
+    fake.catalog_export = ''.join([lines[0]] + sorted(lines[1:], key=lambda line: float(line.split('\t')[9]))) #DS9 sorts by K mag.
+    first = ds9_lib.query_guide_star_catalog('2MASS point source', search_box, 10)
+    n_commands = len(fake.commands)
+    second = ds9_lib.query_guide_star_catalog('2MASS point source', search_box, 10)
+    assert len(fake.commands) == n_commands #Answered from the cache without DS9
+    for first_column, second_column in zip(first, second):
+        assert list(first_column) == list(second_column)
+    assert list(first[2]) == sorted(first[2]) #Brightest first either way
+
+
+def test_failed_search_is_not_cached(fake):
+    search_box = ds9_lib.guide_star_search_box(83.75, 22.0)
+    with open('tmp.dat', 'w') as f: #Left over from searching another field
+        f.write(''.join(catalog_lines(10.0, 10.1, -5.0, -4.9)))
+    fake.catalog_export = None #DS9 can't reach the catalog server so exports nothing
+    with pytest.raises(IOError):
+        ds9_lib.query_guide_star_catalog('2MASS point source', search_box, 10)
+    assert not os.path.exists('tmp.dat')
+    assert ds9_lib.get_catalog_cache().lookup('2MASS point source', ds9_lib.gstar_mag_limit, *search_box) is None
@@ -0,0 +1,59 @@
+#Check the local guide star catalog index (catalog_index.py), including boxes and cones that wrap around RA = 0
+#Run with: python -m pytest test_catalog_index.py
+
+import numpy as np
+import pytest
+
+import catalog_index
+
+
+@pytest.fixture
+def stars():
+    generator = np.random.default_rng(1)
+    n = 2000
+    ra = np.concatenate([generator.uniform(359.5, 360.0, n), generator.uniform(0.0, 0.5, n), generator.uniform(0.0, 360.0, n)])
+    dec = np.concatenate([generator.uniform(-0.5, 0.5, 2*n), generator.uniform(-90.0, 90.0, n)])
+    mag = generator.uniform(6.0, 18.0, 3*n)
+    return ra % 360.0, dec, mag
+
+
+@pytest.fixture
+def index(stars):
+    return catalog_index.CatalogIndex(*stars, survey='Gaia DR2')
+
+
+#Number of stars in a box found by checking every star, ra_ranges are (low, high) pairs that don't wrap
+def in_box(stars, ra_ranges, dec_min, dec_max, mag_limit=None):
+    ra, dec, mag = stars
+    keep = (dec >= dec_min) & (dec <= dec_max) & np.any([(ra >= low) & (ra <= high) for low, high in ra_ranges], axis=0)
+    if mag_limit is not None:
+        keep &= mag <= mag_limit
+    return keep.sum()
+
+
+@pytest.mark.parametrize('ra_min, ra_max', [(359.9, 0.1), (-0.1, 0.1)])
+def test_box_across_ra_zero(index, stars, ra_min, ra_max):
+    found = index.box(ra_min, ra_max, -0.2, 0.2)
+    ra = index.ra[found]
+    assert (ra > 359.0).any() and (ra < 1.0).any() #Stars from both sides of RA = 0
+    assert ((ra >= 359.9) | (ra <= 0.1)).all()
+    assert len(found) == in_box(stars, [(359.9, 360.0), (0.0, 0.1)], -0.2, 0.2)
+    assert len(index.box(ra_min, ra_max, -0.2, 0.2, mag_limit=12.0)) == in_box(stars, [(359.9, 360.0), (0.0, 0.1)], -0.2, 0.2, mag_limit=12.0)
+
+
+def test_box_not_across_ra_zero(index, stars):
+    found = index.box(0.1, 0.3, -0.2, 0.2)
+    assert len(found) == in_box(stars, [(0.1, 0.3)], -0.2, 0.2) > 0
+    assert ((index.ra[found] >= 0.1) & (index.ra[found] <= 0.3)).all()
+
+
+def test_cone_across_ra_zero_after_loading(index, tmp_path):
+    index.save(str(tmp_path / 'gaia_index'))
+    loaded = catalog_index.CatalogIndex.load(str(tmp_path / 'gaia_index'))
+    assert len(loaded) == len(index) and loaded.survey == 'Gaia DR2'
+    found = loaded.brightest(loaded.cone(359.95, 0.0, 0.1, mag_limit=14.0), k=20)
+    ra, dec, mag, pmra, pmdec = loaded.stars(found)
+    assert len(found) == 20 and list(mag) == sorted(mag)
+    assert (ra > 359.0).any() and (ra < 1.0).any()
+    separation = np.hypot(((ra - 359.95 + 180.0) % 360.0 - 180.0) * np.cos(np.radians(dec)), dec)
+    assert (separation <= 0.1 + 1e-6).all() and (mag <= 14.0).all()
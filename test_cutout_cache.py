@@ -0,0 +1,69 @@
+#Check the finder chart image cache (cutout_cache.py): hits, cropping a smaller field out of a cached image, and checking images saved from DS9
+#Run with: python -m pytest test_cutout_cache.py
+
+import os
+
+import numpy as np
+import pytest
+
+import cutout_cache
+
+fits = pytest.importorskip('astropy.io.fits')
+wcs_module = pytest.importorskip('astropy.wcs')
+
+
+#Save a blank FITS image centered on ra, dec (degrees) with a FOV of fov (arcmin) and n pixels on a side, like one saved from DS9
+def save_image(path, ra, dec, fov, n):
+    wcs = wcs_module.WCS(naxis=2)
+    wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    wcs.wcs.crval = [ra, dec]
+    wcs.wcs.crpix = [(n + 1) / 2.0, (n + 1) / 2.0]
+    wcs.wcs.cdelt = [-fov / 60.0 / n, fov / 60.0 / n]
+    fits.PrimaryHDU(np.arange(n*n, dtype=np.float32).reshape(n, n), wcs.to_header()).writeto(path, overwrite=True)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return cutout_cache.CutoutCache(str(tmp_path / 'cutouts'))
+
+
+def test_exact_hit(cache):
+    assert cache.lookup('2MASS K-band', 83.75, 22.0, 6.0) is None
+    path = cache.filename('2MASS K-band', 83.75, 22.0, 6.0)
+    save_image(path, 83.75, 22.0, 6.0, 360)
+    assert cache.lookup('2MASS K-band', 83.75, 22.0, '6.0') == path
+    assert (cache.hits, cache.crops, cache.misses) == (1, 0, 1)
+
+
+def test_smaller_field_is_cropped(cache):
+    save_image(cache.filename('2MASS K-band', 83.75, 22.0, 6.0, 360), 83.75, 22.0, 6.0, 360) #1 arcsec pixels
+    ra, dec = 83.75 + 0.5 / 60.0 / np.cos(np.radians(22.0)), 22.0 - 0.5 / 60.0 #Half an arcmin off center
+    path = cache.lookup('2MASS K-band', ra, dec, 3.0)
+    assert path is not None and cache.crops == 1
+    assert cache.matches(path, ra, dec, 3.0)
+    with fits.open(path) as hdulist:
+        assert hdulist[0].data.shape == (180, 180)
+    assert cache.lookup('2MASS K-band', ra, dec, 3.0) == path #The crop is kept in the cache
+    assert cache.hits == 1 and cache.crops == 1
+    assert cache.lookup('2MASS K-band', 83.75, 22.05, 3.0) is None #Not covered by the cached image
+    assert cache.lookup('POSS2 IR', ra, dec, 3.0) is None #Another survey
+
+
+def test_add_checks_the_field(cache):
+    saved_image = cache.filename('2MASS K-band', 83.75, 22.0, 6.0) + '.tmp'
+    save_image(saved_image, 83.75, 22.0, 6.0, 360)
+    assert cache.add(saved_image, '2MASS K-band', 83.75, 22.0, 6.0) == cache.filename('2MASS K-band', 83.75, 22.0, 6.0)
+    assert not os.path.exists(saved_image)
+    for ra, dec, fov in ((10.0, -5.0, 6.0), (83.75, 22.0, 3.0)): #The image of the last field DS9 had, at another place or size
+        saved_image = cache.filename('2MASS K-band', ra, dec, fov) + '.tmp'
+        save_image(saved_image, 83.75, 22.0, 6.0, 360)
+        assert cache.add(saved_image, '2MASS K-band', ra, dec, fov) is None
+        assert not os.path.exists(saved_image)
+    assert [entry[1:4] for entry in cache.entries()] == [(83.75, 22.0, 6.0)]
+
+
+def test_add_across_ra_zero(cache):
+    saved_image = cache.filename('2MASS K-band', 359.999, 0.0, 6.0) + '.tmp'
+    save_image(saved_image, 0.001, 0.0, 6.0, 360) #Center reported on the other side of RA = 0
+    assert cache.add(saved_image, '2MASS K-band', 359.999, 0.0, 6.0) is not None
+    assert cache.add(cache.filename('2MASS K-band', 1.0, 0.0, 6.0) + '.tmp', '2MASS K-band', 1.0, 0.0, 6.0) is None #Nothing saved
@@ -0,0 +1,82 @@
+#Check the commands the planner sends to DS9, through the fake DS9 backend so no DS9 or display is needed
+#Run with: python -m pytest test_ds9_fake.py
+
+import pytest
+
+import ds9
+import ds9_lib
+import coordfuncs
+
+
+target_ra, target_dec = '05:35:00.00', '+22:00:00.0'
+catalog_export = '\n'.join([ #2MASS catalog exported by DS9 with RA, Dec., and K-mag in columns 0, 1, and 9, brightest first
+    '\t'.join('c'+str(i) for i in range(12)),
+    '\t'.join(['83.7510', '22.0050'] + ['']*7 + ['8.50', '', '']),
+    '\t'.join(['83.7480', '21.9910'] + ['']*7 + ['10.25', '', '']),
+    '\t'.join(['83.7565', '22.0120'] + ['']*7 + ['12.75', '', '']),
+]) + '\n'
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ds9, 'transport', None)
+    monkeypatch.setattr(ds9, 'verbose', False)
+    monkeypatch.setattr(ds9_lib, 'current_working_directory', str(tmp_path) + '/')
+    monkeypatch.setattr(ds9_lib, 'use_catalog_cache', False)
+    monkeypatch.setattr(ds9_lib, 'use_cutout_cache', False)
+    monkeypatch.setattr(ds9_lib, 'guide_star_index_directories', {})
+    backend = ds9.use('fake')
+    yield backend
+    ds9.transport = None
+
+
+def test_finder_chart_is_sent_in_one_batch(fake, tmp_path):
+    obj_coords = coordfuncs.coord_query(target_ra+' '+target_dec)
+    with ds9.batch():
+        ds9_lib.make_finder_chart_in_ds9(obj_coords, 45.0, survey='2MASS K-band', fov='6.0')
+        assert fake.commands == [] #Nothing is sent until the outer batch ends
+    commands = fake.commands
+    assert commands[0] == 'single'
+    assert commands.index('skyview open') < commands.index('skyview close') < commands.index('regions delete all')
+    region_loads = [command for command in commands if command.startswith('regions /')]
+    assert region_loads == ['regions ' + str(tmp_path) + '/IGRINS_svc_generated.reg'] #The whole FOV is loaded as one region file
+    assert (tmp_path / 'IGRINS_svc_generated.reg').read_text().count('polygon') == 1
+    assert commands[-3:] == ['zoom to fit', 'zoom 1.8', 'mode pointer']
+    assert fake.n_calls == len(commands) == ds9.transport.n_sent
+
+
+def test_repeated_commands_are_dropped(fake):
+    with ds9.batch():
+        ds9.set('scale log')
+        ds9.set('scale log')
+        ds9.set('zoom 1.8')
+        ds9.set('zoom 1.8') #Zooms are relative so both are sent
+    assert fake.commands == ['scale log', 'zoom 1.8', 'zoom 1.8']
+    assert ds9.transport.n_dropped == 1
+
+
+def test_guide_star_search(fake):
+    fake.catalog_export = catalog_export
+    ranked = ds9_lib.search_for_guide_stars(target_ra, target_dec, ds9_lib.n_gstars, 45.0, '2MASS K-band', False, 2025.0)
+    assert len(ranked) == 3
+    assert sorted(star['mag'] for star in ranked) == [8.5, 10.25, 12.75]
+    commands = fake.commands
+    #The export is flushed to DS9 (so tmp.dat is written) before it is read, and the catalog is only closed after
+    assert commands.index('catalog 2mass') < commands.index('catalog retrieve') < commands.index("catalog sort 'Kmag' incr")
+    export = commands.index('catalog export tsv ' + ds9_lib.current_working_directory + 'tmp.dat')
+    assert export < commands.index('catalog clear') < commands.index('catalog close')
+    #All the guide star markers go to DS9 in one regions upload
+    assert [command for command in commands if command == 'regions'] == ['regions']
+    assert len(fake.regions) == 3 and all('tag={guidestars}' in region for region in fake.regions)
+    assert commands[-2:] == ['regions group guidestars movefront', 'mode region']
+
+
+def test_default_backend(monkeypatch):
+    monkeypatch.setenv('IGRINS_DS9_BACKEND', 'fake')
+    assert ds9.default_backend() == 'fake'
+    monkeypatch.delenv('IGRINS_DS9_BACKEND')
+    monkeypatch.setattr(ds9.importlib.util, 'find_spec', lambda name: object() if name == 'pyds9' else None)
+    assert ds9.default_backend() == 'pyds9'
+    monkeypatch.setattr(ds9.importlib.util, 'find_spec', lambda name: None)
+    assert ds9.default_backend() == 'xpa'
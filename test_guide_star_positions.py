@@ -0,0 +1,45 @@
+#Check guide star offsets from a target (ds9_lib.calculate_guide_star_positions), including across RA = 0
+#Run with: python -m pytest test_guide_star_positions.py
+
+import numpy as np
+import pytest
+
+import ds9_lib
+import planner_lib
+
+
+@pytest.mark.parametrize('target_ra, star_ra, expected_dra', [
+    (0.0, 0.01, 36.0), #Same side of RA = 0
+    (359.995, 0.005, 36.0), #Star just past RA = 0 from the target
+    (0.005, 359.995, -36.0), #Star just before RA = 0 from the target
+    (0.005, -0.005, -36.0), #Star RA given as negative
+    (180.0, 180.01, 36.0),
+])
+def test_offset_across_ra_zero(target_ra, star_ra, expected_dra):
+    gra, gdec, dra, ddec, sl, sw = ds9_lib.calculate_guide_star_positions(target_ra, 0.0, [star_ra], [0.0], 90.0)
+    assert dra[0] == pytest.approx(expected_dra, abs=1e-6)
+    assert ddec[0] == pytest.approx(0.0, abs=1e-9)
+    assert 0.0 <= gra[0] < 360.0
+
+
+def test_offsets_near_ra_zero_at_high_dec():
+    target_ra, target_dec = 359.99, 60.0
+    star_ra = np.array([359.98, 0.0, 0.01])
+    star_dec = np.array([60.0, 60.01, 59.99])
+    gra, gdec, dra, ddec, sl, sw = ds9_lib.calculate_guide_star_positions(target_ra, target_dec, star_ra, star_dec, 45.0)
+    assert np.all(np.abs(dra) < 60.0) and np.all(np.abs(ddec) < 60.0) #All within an arcmin, none sent the long way around
+    assert dra[0] < 0.0 < dra[1] < dra[2]
+    assert np.allclose(np.hypot(sl, sw), np.hypot(dra, ddec)) #Rotating to the slit keeps the distance
+
+
+def test_proper_motion_across_ra_zero():
+    gra, gdec, dra, ddec, sl, sw = ds9_lib.calculate_guide_star_positions(0.0, 0.0, [0.0], [0.0], 90.0,
+        gpra=[-1000.0], gpdec=[0.0], use_proper_motion=True, epoch=2010.0) #Moves 10 arcsec west, past RA = 0
+    assert dra[0] == pytest.approx(-10.0)
+    assert gra[0] == pytest.approx(360.0 - 10.0 / 3600.0)
+
+
+def test_sexagesimal_offsets_across_ra_zero():
+    offsets = planner_lib.calculate_guide_star_offsets('23:59:59.50', '+10:00:00.0', 90.0, ['00:00:00.50'], ['+10:00:10.0'])
+    assert offsets[0]['dra'] == pytest.approx(15.0 * np.cos(np.radians(10.0)), rel=1e-4)
+    assert offsets[0]['ddec'] == pytest.approx(10.0)
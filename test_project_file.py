@@ -0,0 +1,118 @@
+#Check project files (project_file.py): the journal, replaying it after a crash, and compaction
+#Run with: python -m pytest test_project_file.py
+
+import os
+import shutil
+
+import pytest
+
+import project_file
+
+
+def record(name, PA='90.0'):
+    return {'target': {'name': name, 'PA': PA}, 'guidestar': [{'survey': 'Gaia DR2'}]}
+
+
+@pytest.fixture
+def filename(tmp_path):
+    filename = str(tmp_path / 'targets.igrins')
+    project_file.write_project(filename, [record('M 1'), record('M 42'), record('NGC 7027')], current='1')
+    return filename
+
+
+def contents(filename):
+    with project_file.Project(filename, read_only=True) as project:
+        return [(id, project.get(id)) for id in project.ids()], project.current
+
+
+def test_open_reads_only_the_index(filename):
+    with project_file.Project(filename) as project:
+        assert project.targets() == [('0', 'M 1'), ('1', 'M 42'), ('2', 'NGC 7027')]
+        assert project.current == '1'
+        assert project.get('2') == record('NGC 7027')
+        assert not project.put('2', record('NGC 7027')) #Unchanged so not written
+        assert project.n_journaled == 0
+
+
+def test_changes_are_replayed_from_the_journal(filename):
+    with project_file.Project(filename) as project:
+        assert project.put('1', record('M 42', PA='45.0'))
+        new_id = project.add(record('M 31'))
+        project.delete('0')
+        project.set_current(new_id)
+    assert new_id == '3'
+    targets, current = contents(filename)
+    assert targets == [('1', record('M 42', PA='45.0')), ('2', record('NGC 7027')), ('3', record('M 31'))]
+    assert current == '3'
+
+
+def test_cut_off_journal_line_is_dropped(filename):
+    with project_file.Project(filename) as project:
+        project.put('0', record('M 1', PA='10.0'))
+        project.put('1', record('M 42', PA='20.0'))
+    with open(filename + '.journal', 'ab') as f: #A crash part way through writing the next change
+        f.write(b'{"put":"2","record":{"target":{"name":"NGC 70')
+    with project_file.Project(filename) as project:
+        assert project.get('0') == record('M 1', PA='10.0')
+        assert project.get('1') == record('M 42', PA='20.0')
+        assert project.get('2') == record('NGC 7027')
+        project.put('2', record('NGC 7027', PA='30.0')) #Written after the good lines, the cut off line is gone
+    targets, current = contents(filename)
+    assert [target['target']['PA'] for id, target in targets] == ['10.0', '20.0', '30.0']
+    with open(filename + '.journal', 'rb') as f:
+        assert f.read().count(b'\n') == 4 #Generation line and three changes
+
+
+def test_changes_survive_compaction(filename):
+    with project_file.Project(filename) as project:
+        project.put('1', record('M 42', PA='45.0'))
+        project.delete('2')
+        added = project.add(record('M 31'))
+        generation = project.generation
+        project.compact()
+        assert project.generation == generation + 1
+        assert project.changed == {}
+        assert project.get('1') == record('M 42', PA='45.0') #Read from the new project file
+        project.put('0', record('M 1', PA='0.0')) #Journaled against the new project file
+    targets, current = contents(filename)
+    assert targets == [('0', record('M 1', PA='0.0')), ('1', record('M 42', PA='45.0')), (added, record('M 31'))]
+    assert current == '1'
+
+
+def test_journal_of_an_older_project_file_is_ignored(filename):
+    with project_file.Project(filename) as project:
+        project.put('0', record('M 1', PA='10.0'))
+        shutil.copy(filename + '.journal', filename + '.old_journal')
+        project.compact()
+    os.replace(filename + '.old_journal', filename + '.journal') #Like a crash after the new project file was swapped in but before the new journal
+    with project_file.Project(filename) as project:
+        assert project.n_journaled == 0 and len(project.changed) == 0
+        assert project.get('0') == record('M 1', PA='10.0') #The change is in the project file
+        project.put('2', record('NGC 7027', PA='30.0'))
+    assert contents(filename)[0][2] == ('2', record('NGC 7027', PA='30.0'))
+
+
+def test_journal_compacts_itself(filename, monkeypatch):
+    monkeypatch.setattr(project_file, 'compact_min_bytes', 0)
+    with project_file.Project(filename) as project:
+        for i in range(20):
+            project.put(str(i % 3), record('M '+str(i), PA=str(float(i))))
+        assert project.n_compactions > 0
+        assert project.journal_bytes <= project_file.compact_ratio * project.snapshot_bytes
+    targets, current = contents(filename)
+    assert [target['target']['name'] for id, target in targets] == ['M 18', 'M 19', 'M 17']
+
+
+def test_read_only_does_not_touch_the_files(filename):
+    assert project_file.read_project_records(filename) == [record('M 1'), record('M 42'), record('NGC 7027')]
+    assert not os.path.exists(filename + '.journal')
+    with project_file.Project(filename, read_only=True) as project:
+        with pytest.raises(IOError):
+            project.put('0', record('M 1', PA='1.0'))
+
+
+def test_is_project_file(filename, tmp_path):
+    assert project_file.is_project_file(filename)
+    save_file = tmp_path / 'save.json'
+    save_file.write_text('{"target": {}, "guidestar": []}')
+    assert not project_file.is_project_file(str(save_file))
@@ -0,0 +1,54 @@
+#Check that simplifying the SVC outline (ds9_lib.get_simplified_scam_outline) keeps it within tolerance of the full outline
+#Run with: python -m pytest test_svc_outline.py
+
+import numpy as np
+import pytest
+
+import ds9_lib
+
+
+#Largest distance from each point (x, y) to the closed polygon (poly_x, poly_y)
+def max_distance_to_polygon(x, y, poly_x, poly_y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    start_x, start_y = np.asarray(poly_x, dtype=float), np.asarray(poly_y, dtype=float)
+    end_x, end_y = np.roll(start_x, -1), np.roll(start_y, -1)
+    distance = np.full(len(x), np.inf)
+    for x1, y1, x2, y2 in zip(start_x, start_y, end_x, end_y): #Distance to each edge, keeping the closest
+        dx, dy = x2 - x1, y2 - y1
+        length_squared = dx*dx + dy*dy
+        t = 0.0 if length_squared == 0.0 else np.clip(((x - x1)*dx + (y - y1)*dy) / length_squared, 0.0, 1.0)
+        distance = np.minimum(distance, np.hypot(x - x1 - t*dx, y - y1 - t*dy))
+    return distance.max()
+
+
+@pytest.mark.parametrize('max_deviation', ds9_lib.svc_outline_tolerances)
+def test_simplified_outline_within_tolerance(max_deviation):
+    poly_x, poly_y = ds9_lib.load_scam_outline()
+    simple_x, simple_y = ds9_lib.get_simplified_scam_outline(max_deviation)
+    assert 3 <= len(simple_x) < len(poly_x)
+    assert max_distance_to_polygon(poly_x, poly_y, simple_x, simple_y) <= max_deviation
+
+
+@pytest.mark.parametrize('max_deviation', ds9_lib.svc_outline_tolerances)
+@pytest.mark.parametrize('rotation, plate_scale, mirror_field', [(0.0, 0.119, False), (37.5, 0.119, False), (123.4, 0.25, False), (271.0, 0.06, True)])
+def test_svc_polygon_within_tolerance(max_deviation, rotation, plate_scale, mirror_field):
+    full_x, full_y = ds9_lib.get_svc_polygon(rotation, plate_scale, mirror_field)
+    simple_x, simple_y = ds9_lib.get_svc_polygon(rotation, plate_scale, mirror_field, max_deviation)
+    assert len(simple_x) < len(full_x)
+    assert max_distance_to_polygon(full_x, full_y, simple_x, simple_y) * 3600.0 <= max_deviation * (1.0 + 1e-9) #Polygons are in degrees
+
+
+@pytest.mark.parametrize('max_deviation', [None, 0, 0.0])
+def test_no_tolerance_keeps_full_outline(max_deviation):
+    poly_x, poly_y = ds9_lib.load_scam_outline()
+    simple_x, simple_y = ds9_lib.get_simplified_scam_outline(max_deviation)
+    assert np.array_equal(simple_x, poly_x) and np.array_equal(simple_y, poly_y)
+
+
+def test_tolerance_for_fov():
+    assert ds9_lib.svc_outline_tolerance_for_fov(1.0) is None #Too small a FOV to simplify at all
+    for fov in (3.0, 6.0, 12.0, 60.0):
+        tolerance = ds9_lib.svc_outline_tolerance_for_fov(fov)
+        assert tolerance in ds9_lib.svc_outline_tolerances
+        assert tolerance <= 0.5 * fov * 60.0 / ds9_lib.svc_outline_pixels_per_fov